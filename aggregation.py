@@ -0,0 +1,88 @@
+from collections import defaultdict
+
+from columnar import COUNT_COLUMNS, ColumnarTable, to_amount, to_number
+from pagination import parse_filters, sort_key
+from schema import AMOUNT_COLUMNS, DIMENSION_COLUMNS
+
+FUNCTIONS = ('sum', 'avg')
+
+COUNT = 'count'
+
+
+def measure_columns(fieldnames):
+    # Columns that can be summed: every module column that is not a dimension
+    return [name for name in fieldnames if name not in DIMENSION_COLUMNS]
+
+
+def default_measures(fieldnames):
+    counts = [name for name in fieldnames if name in COUNT_COLUMNS]
+    return counts or measure_columns(fieldnames)
+
+
+def parse_aggregate_args(args, fieldnames):
+    # group_by, measure, function and filter from a request's arguments,
+    # checked against the module's fieldnames.
+    # group_by and measure may be repeated or comma-separated. Raises
+    # ValueError naming the first thing that is wrong.
+    group_by = _names(args.getlist('group_by'))
+    measures = _names(args.getlist('measure')) or default_measures(fieldnames)
+    function = args.get('function', 'sum').strip().lower()
+
+    dimensions = [name for name in fieldnames if name in DIMENSION_COLUMNS]
+    for name in group_by:
+        if name not in dimensions:
+            raise ValueError('cannot group by %r (choose from: %s)'
+                             % (name, ', '.join(dimensions) or 'none'))
+    allowed = measure_columns(fieldnames)
+    for name in measures:
+        if name not in allowed:
+            raise ValueError('cannot aggregate %r (choose from: %s)' % (name, ', '.join(allowed)))
+    if function not in FUNCTIONS:
+        raise ValueError('unknown function %r (expected one of %s)' % (function, ', '.join(FUNCTIONS)))
+    return group_by, measures, function, parse_filters(args.getlist('filter'), fieldnames)
+
+
+def aggregate(rows, group_by, measures, function='sum', filters=None):
+    # One result row per distinct combination of the group_by columns, with
+    # the number of rows in the group under 'count' and each measure summed
+    # (or averaged) over them. Cells that are not whole numbers count as 0,
+    # except in AMOUNT_COLUMNS, which are summed as decimals.
+    # A ColumnarTable is grouped and summed column by column; plain lists of
+    # row dicts take the row-by-row path.
+    if isinstance(rows, ColumnarTable):
+        positions = rows.matching(filters) if filters else None
+        totals = rows.totals(group_by, measures, positions, AMOUNT_COLUMNS)
+    else:
+        readers = [to_amount if name in AMOUNT_COLUMNS else to_number for name in measures]
+        grouped = defaultdict(lambda: [0, [0] * len(measures)])
+        for row in rows:
+            if filters and any(row.get(name, '') != value for name, value in filters.items()):
+                continue
+            entry = grouped[tuple(row.get(name, '') for name in group_by)]
+            entry[0] += 1
+            sums = entry[1]
+            for index, (name, reader) in enumerate(zip(measures, readers)):
+                sums[index] += reader(row.get(name, ''))
+        totals = [(key, count, sums) for key, (count, sums) in grouped.items()]
+    return finish(group_by, measures, function, totals)
+
+
+def finish(group_by, measures, function, totals):
+    # Result rows, ordered by their group values, from (key, count, sums).
+    # Amounts come out as floats rounded to the cent.
+    results = []
+    for key, count, sums in sorted(totals, key=lambda item: [sort_key(value) for value in item[0]]):
+        result = dict(zip(group_by, key))
+        result[COUNT] = count
+        for name, total in zip(measures, sums):
+            value = round(total / count, 2) if function == 'avg' else total
+            result[name] = float(round(value, 2)) if name in AMOUNT_COLUMNS else value
+        results.append(result)
+    return results
+
+
+def _names(values):
+    names = []
+    for value in values:
+        names.extend(name.strip() for name in value.split(',') if name.strip())
+    return names
@@ -1,502 +1,617 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, abort, \
+    Response, stream_with_context
+from markupsafe import Markup
+from werkzeug.http import is_resource_modified
+import atexit
+import click
 import csv
 import os
+import time
+from datetime import datetime, timezone
+
+from aggregation import parse_aggregate_args
+from bulk_import import FORMATS, detect_format, import_stream
+from columnar import record_values
+import consistency
+import export
+from fragment_cache import FragmentCache
+from metrics import describe_phases, registry
+from pagination import fetch_page, page_request
+import reports
+from schema import MODULES
+from snapshots import SnapshotError, SnapshotStore
+from storage import CsvStorage, SqliteStorage, StaleRecordError, create_storage, storage_fieldnames
 
 app = Flask(__name__)
 app.config['DATA_FOLDER'] = 'data'
 app.secret_key = 'your_secret_key_here_change_this'  # Required for flash messages
+# 'csv' (one file per module in DATA_FOLDER) or 'sqlite'
+app.config['STORAGE_BACKEND'] = os.environ.get('STORAGE_BACKEND', 'csv')
+app.config['SQLITE_PATH'] = os.environ.get('SQLITE_PATH')  # defaults to DATA_FOLDER/institutional.db
+app.config['TABLE_CACHE_MAX_TABLES'] = 32
+app.config['TABLE_CACHE_MAX_ROWS'] = 1000000
+# Edits and deletes go to a per-table journal that is compacted into the CSV
+app.config['EDIT_JOURNAL'] = True
+app.config['JOURNAL_COMPACT_ENTRIES'] = 500
+app.config['JOURNAL_COMPACT_BYTES'] = 1024 * 1024
+# fsync every commit; concurrent writes to one table share a single commit
+app.config['FSYNC_WRITES'] = True
+app.config['GROUP_COMMIT'] = True
+# 'synchronous': a form post returns once its write is on disk. 'batch' and
+# 'interval' queue the write and return at once; a writer thread applies
+# the queue in batches and pages show queued changes until they land.
+# 'batch' commits (and fsyncs) whatever is queued as soon as it can;
+# 'interval' collects writes for WRITE_BEHIND_INTERVAL_MS first, so disk is
+# at most that far behind. Queued writes are flushed when the process exits
+# normally. Edits and deletes made against a revision (as the module forms
+# make them) are written at once either way, so that a conflict with another
+# worker is refused in the request rather than found by the writer thread.
+app.config['WRITE_DURABILITY'] = os.environ.get('WRITE_DURABILITY', 'synchronous')
+app.config['WRITE_BEHIND_INTERVAL_MS'] = 50
+app.config['WRITE_BEHIND_MAX_PENDING'] = 10000
+# A queued batch that fails WRITE_BEHIND_MAX_ATTEMPTS times in a row is given
+# up on: its writes are appended to WRITE_BEHIND_DEAD_LETTER (defaults to
+# DATA_FOLDER/write_behind_failed.jsonl) for someone to apply by hand, as
+# are any still queued after waiting WRITE_BEHIND_CLOSE_TIMEOUT seconds for
+# them at exit
+app.config['WRITE_BEHIND_MAX_ATTEMPTS'] = 5
+app.config['WRITE_BEHIND_DEAD_LETTER'] = None
+app.config['WRITE_BEHIND_CLOSE_TIMEOUT'] = 10
+# Module tables are rendered one page at a time
+app.config['PAGE_SIZE'] = 50
+app.config['PAGE_SIZE_MAX'] = 500
+# Tables made up mostly of head counts are cached column by column with
+# typed integer arrays instead of one dict of strings per row
+app.config['COLUMNAR_TABLES'] = ['student_enrollment', 'examination_results', 'staff_info',
+                                 'scholarships']
+# With several worker processes on the CSV backend, SHARED_TABLES=1 publishes
+# each parsed columnar table as a memory-mapped image in SHARED_TABLE_FOLDER
+# (defaults to DATA_FOLDER/shared; a tmpfs such as /dev/shm keeps it off disk)
+# that every worker maps instead of parsing and holding its own copy
+app.config['SHARED_TABLES'] = os.environ.get('SHARED_TABLES') == '1'
+app.config['SHARED_TABLE_FOLDER'] = os.environ.get('SHARED_TABLE_FOLDER')
+# Rows a worker edits or appends are kept beside the mapped image, and the
+# other workers catch up from the image and the end of the CSV; a table is
+# published again once this many of its rows have changed since its image
+# (or when its journal is compacted)
+app.config['SHARED_TABLE_REPUBLISH_ROWS'] = 1000
+# Distinct /aggregate queries whose results are kept until their table changes
+app.config['AGGREGATE_CACHE_SIZE'] = 256
+# Bulk imports append this many rows per write and list at most this many bad lines
+app.config['BULK_IMPORT_BATCH_ROWS'] = 5000
+app.config['BULK_IMPORT_MAX_ERRORS'] = 1000
+# Exports are streamed this many rows at a time, gzipped at this level when
+# the client accepts it (1 is several times faster than 6 for ~20% more bytes)
+app.config['EXPORT_CHUNK_ROWS'] = 1000
+app.config['EXPORT_GZIP_LEVEL'] = 1
+# Rendered table bodies kept per page window until their table changes
+app.config['FRAGMENT_CACHE_ENTRIES'] = 256
+app.config['FRAGMENT_CACHE_BYTES'] = 64 * 2 ** 20
+# Per-route latency, storage phases, bytes and cache hit rates are served at
+# /metrics in the Prometheus text format; requests slower than
+# SLOW_REQUEST_MS are logged with a breakdown by phase (None turns that off)
+app.config['METRICS'] = True
+app.config['SLOW_REQUEST_MS'] = 1000
+# Snapshots freeze every module under a label such as "2025-26", storing
+# only the rows changed since the previous one (SNAPSHOT_FOLDER defaults to
+# DATA_FOLDER/snapshots). Snapshotted tables read back are kept in memory,
+# up to this many (a table per module per snapshot)
+app.config['SNAPSHOT_FOLDER'] = None
+app.config['SNAPSHOT_CACHE_SIZE'] = 36
+# The consolidated report (/report, flask report) keeps each module's
+# section in REPORT_CACHE_FOLDER (defaults to DATA_FOLDER/reports) until
+# that module's table changes; stale sections are rebuilt this many at a time
+app.config['REPORT_CACHE_FOLDER'] = None
+app.config['REPORT_WORKERS'] = 4
+
+# Columns of each module's table, in the order its CSV file stores them
+MODULE_FIELDNAMES = {name: module.fieldnames for name, module in MODULES.items()}
+
+MODULE_TABLES = list(MODULE_FIELDNAMES)
+
+# Text shown in front of a column's values in the module tables
+CELL_PREFIXES = {'median_salary': '₹'}
 
 # Ensure data folder exists
 os.makedirs(app.config['DATA_FOLDER'], exist_ok=True)
 
-def read_csv(filename):
-    filepath = os.path.join(app.config['DATA_FOLDER'], filename)
-    if not os.path.exists(filepath):
-        return []
-    with open(filepath, 'r', newline='', encoding='utf-8') as file:
-        reader = csv.DictReader(file)
-        # Strip whitespace from all values
-        return [{key.strip(): value.strip() for key, value in row.items()} for row in reader]
-
-def write_csv(filename, data, fieldnames):
-    filepath = os.path.join(app.config['DATA_FOLDER'], filename)
-    with open(filepath, 'w', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(data)
-
-def append_csv(filename, data, fieldnames):
-    filepath = os.path.join(app.config['DATA_FOLDER'], filename)
-    file_exists = os.path.exists(filepath)
-    with open(filepath, 'a', newline='', encoding='utf-8') as file:
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(data)
-
-def delete_record(filename, index, fieldnames):
-    records = read_csv(filename)
-    if 0 <= index < len(records):
-        records.pop(index)
-        write_csv(filename, records, fieldnames)
-        return True
-    return False
-
-def update_record(filename, index, new_data, fieldnames):
-    records = read_csv(filename)
-    if 0 <= index < len(records):
-        records[index] = new_data
-        write_csv(filename, records, fieldnames)
-        return True
-    return False
+# Every route reads and writes module tables through this backend
+storage = create_storage(app.config)
+atexit.register(lambda: storage.close(app.config['WRITE_BEHIND_CLOSE_TIMEOUT']))
+
+fragments = FragmentCache(max_entries=app.config['FRAGMENT_CACHE_ENTRIES'],
+                          max_bytes=app.config['FRAGMENT_CACHE_BYTES'])
+
+registry.enabled = app.config['METRICS']
+
+snapshots = SnapshotStore(app.config['SNAPSHOT_FOLDER']
+                          or os.path.join(app.config['DATA_FOLDER'], 'snapshots'),
+                          cache_size=app.config['SNAPSHOT_CACHE_SIZE'],
+                          fsync=app.config['FSYNC_WRITES'])
+
+report_sections = reports.SectionCache(app.config['REPORT_CACHE_FOLDER']
+                                       or os.path.join(app.config['DATA_FOLDER'], 'reports'))
+
+@app.before_request
+def start_timing():
+    if registry.enabled:
+        registry.begin_request()
+
+@app.after_request
+def record_timing(response):
+    # Streamed responses (exports) are timed up to their first byte
+    seconds, phases = registry.end_request(request.endpoint or 'none', request.method,
+                                           response.status_code)
+    slow_ms = app.config['SLOW_REQUEST_MS']
+    if seconds is not None and slow_ms is not None and seconds * 1000 >= slow_ms:
+        app.logger.warning('slow request: %s %s -> %d in %s', request.method,
+                           request.full_path.rstrip('?'), response.status_code,
+                           describe_phases(seconds, phases))
+    return response
+
+@app.cli.command('migrate-sqlite')
+def migrate_sqlite():
+    """Import every module's CSV file into the SQLite database."""
+    source = CsvStorage(app.config)
+    target = SqliteStorage(app.config)
+    for table in MODULE_TABLES:
+        fieldnames = source.fieldnames(table)
+        if not fieldnames:
+            click.echo('%-20s no CSV, skipped' % table)
+            continue
+        rows = source.read(table)
+        target.write(table, rows, fieldnames)
+        click.echo('%-20s %d rows' % (table, len(rows)))
+    click.echo('Imported into %s' % target.database_path())
+
+@app.cli.command('check-totals')
+@click.argument('tables', nargs=-1)
+@click.option('--repair', is_flag=True, help='Store the worked-out totals for rows that disagree.')
+@click.option('--jobs', default=1, show_default=True, help='Worker processes to split tables across.')
+@click.option('--limit', default=20, show_default=True, help='Rows to list per table.')
+def check_totals(tables, repair, jobs, limit):
+    """Check every total column against the columns it adds up."""
+    tables = list(tables) or [table for table in MODULE_TABLES if MODULES[table].totals]
+    unknown = [table for table in tables if table not in MODULES]
+    if unknown:
+        raise click.BadParameter('unknown module: %s' % ', '.join(unknown))
+    failed = False
+    for check in consistency.check_tables(storage, tables, jobs):
+        click.echo('%-20s %8d rows %6d wrong %6d unreadable %7.2fs' % (
+            check.table, check.rows, len(check.wrong), len(check.unreadable), check.seconds))
+        for entry in check.wrong[:limit]:
+            click.echo('    %s: %s' % (entry['id'], ', '.join(
+                '%s is %d, parts add up to %d' % (total, stored, expected)
+                for total, (stored, expected) in entry['totals'].items())))
+        for cell in check.unreadable[:limit]:
+            click.echo('    %(id)s: %(column)s is %(value)r, not a whole number' % cell)
+        if repair and check.wrong:
+            consistency.repair(storage, check)
+            click.echo('    repaired %d, skipped %d changed since the check'
+                       % (check.repaired, check.skipped))
+        failed = failed or check.unreadable or len(check.wrong) > check.repaired
+    storage.close()
+    if failed:
+        raise SystemExit(1)
+
+def take_snapshot(label):
+    # Freeze every module as it is now, queued writes included
+    storage.flush()
+    chunk_rows = app.config['EXPORT_CHUNK_ROWS']
+    tables = {}
+    for table in MODULE_TABLES:
+        fieldnames = storage_fieldnames(MODULE_FIELDNAMES[table])
+        tables[table] = (fieldnames, storage.stream(table, fieldnames, chunk_rows))
+    return snapshots.create(label, tables)
+
+@app.cli.group('snapshot')
+def snapshot_cli():
+    """Freeze the module tables under a label, and list or compare snapshots."""
+
+@snapshot_cli.command('create')
+@click.argument('label')
+def snapshot_create(label):
+    """Freeze every module's table under LABEL, e.g. 2025-26."""
+    try:
+        entry = take_snapshot(label)
+    except SnapshotError as error:
+        raise click.ClickException(str(error))
+    finally:
+        storage.close()
+    for table, counts in entry['tables'].items():
+        click.echo('%-20s %8d rows %6d added %6d changed %6d removed' % (
+            table, counts['rows'], counts['added'], counts['changed'], counts['removed']))
+    click.echo('Snapshot %s: %d bytes of changes since %s'
+               % (label, entry['bytes'], entry['parent'] or 'nothing'))
+
+@snapshot_cli.command('list')
+def snapshot_list():
+    """List snapshots, oldest first."""
+    for entry in snapshots.list():
+        click.echo('%-12s %s %8d rows %10d bytes' % (
+            entry['label'], entry['created'],
+            sum(counts['rows'] for counts in entry['tables'].values()), entry['bytes']))
+
+@snapshot_cli.command('diff')
+@click.argument('old')
+@click.argument('new')
+@click.option('--table', 'tables', multiple=True, help='Module to compare (default: all).')
+@click.option('--limit', default=20, show_default=True, help='Rows to list per table.')
+def snapshot_diff(old, new, tables, limit):
+    """Show the rows added, removed and changed between snapshots OLD and NEW."""
+    unknown = [table for table in tables if table not in MODULES]
+    if unknown:
+        raise click.BadParameter('unknown module: %s' % ', '.join(unknown))
+    try:
+        diff = snapshots.diff(old, new, list(tables) or MODULE_TABLES)
+    except SnapshotError as error:
+        raise click.ClickException(str(error))
+    for table, changes in diff.items():
+        click.echo('%-20s %6d added %6d changed %6d removed' % (
+            table, len(changes['added']), len(changes['changed']), len(changes['removed'])))
+        for row in changes['added'][:limit]:
+            click.echo('    + %s' % row['id'])
+        for record_id in changes['removed'][:limit]:
+            click.echo('    - %s' % record_id)
+        for change in changes['changed'][:limit]:
+            click.echo('    ~ %s: %s' % (change['id'], ', '.join(
+                '%s %r -> %r' % (name, was, now) for name, (was, now) in change['columns'].items())))
+
+def report_chunks(format, sections):
+    # The report as bytes: the printable page, its figures as CSV, or a zip
+    # of both
+    def page():
+        generated = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M UTC')
+        yield render_template('report.html', sections=sections, generated=generated).encode('utf-8')
+
+    def figures():
+        return export.csv_chunks([list(reports.csv_rows(sections))], reports.CSV_FIELDNAMES)
+
+    if format == 'html':
+        return page()
+    if format == 'csv':
+        return figures()
+    return export.zip_chunks([('report.html', page()), ('report.csv', figures())])
+
+@app.cli.command('report')
+@click.option('--format', 'format', default='html', show_default=True,
+              type=click.Choice(list(reports.FORMATS)))
+@click.option('--output', help='File to write (default: report.FORMAT).')
+@click.option('--jobs', default=1, show_default=True,
+              help='Worker processes to build changed sections in.')
+def report_command(format, output, jobs):
+    """Write the consolidated report, rebuilding only sections whose module changed."""
+    began = time.perf_counter()
+    try:
+        sections, rebuilt = reports.build_report(storage, report_sections, jobs, processes=True)
+    finally:
+        storage.close()
+    for section in sections:
+        click.echo('%-20s %s' % (section['table'], 'rebuilt in %.2fs' % section['seconds']
+                                 if section['table'] in rebuilt else 'cached'))
+    output = output or 'report.%s' % format
+    with open(output, 'wb') as file:
+        for chunk in report_chunks(format, sections):
+            file.write(chunk)
+    click.echo('Wrote %s (%d of %d sections rebuilt) in %.2fs'
+               % (output, len(rebuilt), len(sections), time.perf_counter() - began))
+
+def update_from_form(table, data, fieldnames):
+    # Edit forms post the record's id and the revision they were rendered
+    # from; an edit made against an older revision is refused, not applied
+    try:
+        found = storage.update(table, request.form['id'], data, fieldnames,
+                               rev=request.form.get('rev'))
+    except StaleRecordError:
+        flash('This record was changed by someone else. Reload the page and try again.', 'error')
+        return False
+    if not found:
+        flash('Record not found. It may have been deleted.', 'error')
+    return found
+
+def delete_from_form(table, fieldnames):
+    try:
+        found = storage.delete(table, request.form['id'], fieldnames,
+                               rev=request.form.get('rev'))
+    except StaleRecordError:
+        flash('This record was changed by someone else. Reload the page and try again.', 'error')
+        return False
+    if not found:
+        flash('Record not found. It may have been deleted.', 'error')
+    return found
+
+def render_page(template, **context):
+    # render_template, timed as the 'render' phase
+    with registry.phase('render'):
+        return render_template(template, **context)
+
+def module_cells(rows, fieldnames):
+    # What each table cell shows: the module's own values, with any
+    # CELL_PREFIXES in front
+    prefixes = [CELL_PREFIXES.get(name, '') for name in fieldnames]
+    if not any(prefixes):
+        return [row[:len(fieldnames)] for row in rows]
+    return [[prefix + value for prefix, value in zip(prefixes, row)] for row in rows]
+
+def render_module(table, fieldnames):
+    # A module page for the window the request asks for. The table body is
+    # rendered once per window and table version, then served from the
+    # fragment cache (with the pager it was rendered with) until the table
+    # changes; the version is read first so a write racing the render only
+    # costs an extra render.
+    number, size, sort, descending, filters = page_request(
+        request.args, fieldnames, app.config['PAGE_SIZE'], app.config['PAGE_SIZE_MAX'])
+    key = (table, number, size, sort, descending, tuple(sorted(filters.items())))
+    version = storage.version(table)
+    cached = fragments.get(key, version)
+    if cached is None:
+        page = fetch_page(storage, table, request.args, fieldnames,
+                          app.config['PAGE_SIZE'], app.config['PAGE_SIZE_MAX'])
+        columns = storage_fieldnames(fieldnames)
+        rows = record_values(page.items, columns)
+        table_body = Markup(render_page(
+            '_table_body.html', cells=module_cells(rows, fieldnames),
+            record_data={'fields': columns, 'rows': rows}))
+        cached = (page.detached(), table_body)
+        fragments.put(key, version, cached, len(table_body))
+    page, table_body = cached
+    return render_page(table + '.html', page=page, table_body=table_body)
 
 @app.route('/')
 def index():
-    # Calculate real statistics from CSV files
-    stats = {
-        'total_students': 0,
-        'faculty_members': 0,
-        'active_programmes': 0,
-        'departments': 0
-    }
-    
-    # Count students from student_enrollment.csv
-    enrollment_records = read_csv('student_enrollment.csv')
-    for record in enrollment_records:
-        try:
-            stats['total_students'] += int(record.get('total_male', 0) or 0)
-            stats['total_students'] += int(record.get('total_female', 0) or 0)
-            stats['total_students'] += int(record.get('total_transgender', 0) or 0)
-        except (ValueError, KeyError):
-            pass
-    
-    # Count faculty from staff_info.csv (only teaching staff)
-    staff_records = read_csv('staff_info.csv')
-    for record in staff_records:
-        if record.get('staff_type', '').lower() == 'teaching':
-            try:
-                stats['faculty_members'] += int(record.get('total_male', 0) or 0)
-                stats['faculty_members'] += int(record.get('total_female', 0) or 0)
-                stats['faculty_members'] += int(record.get('total_transgender', 0) or 0)
-            except (ValueError, KeyError):
-                pass
-    
-    # Count active programmes
-    programme_records = read_csv('programmes.csv')
-    stats['active_programmes'] = len(programme_records)
+    # Totals are maintained incrementally; only tables changed outside the
+    # app since the last request get re-summed
+    stats = storage.dashboard()
     
-    # Count departments
-    department_records = read_csv('departments.csv')
-    stats['departments'] = len(department_records)
-    
-    return render_template('index.html', stats=stats)
+    return render_page('index.html', stats=stats)
 
-# NSS Enrollment Routes
-@app.route('/nss_enrollment', methods=['GET', 'POST'])
-def nss_enrollment():
-    fieldnames = ['male', 'female', 'total']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        if action == 'add':
-            data = {
-                'male': request.form['male'],
-                'female': request.form['female'],
-                'total': request.form['total']
-            }
-            append_csv('nss_enrollment.csv', data, fieldnames)
-            flash('Record added successfully!', 'success')
-        
-        elif action == 'edit':
-            index = int(request.form['index'])
-            data = {
-                'male': request.form['male'],
-                'female': request.form['female'],
-                'total': request.form['total']
-            }
-            update_record('nss_enrollment.csv', index, data, fieldnames)
-            flash('Record updated successfully!', 'success')
-        
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('nss_enrollment.csv', index, fieldnames)
-            flash('Record deleted successfully!', 'success')
-        
-        return redirect(url_for('nss_enrollment'))
-    
-    records = read_csv('nss_enrollment.csv')
-    return render_template('nss_enrollment.html', records=records)
+def save_from_form(module):
+    # Add, edit or delete one record from a module page's form. Added and
+    # edited rows go through the module's compiled parser first; a form
+    # with bad values is refused as a whole, with what is wrong flashed.
+    table = module.name
+    action = request.form.get('action', 'add')
 
-# Hostels Routes
-@app.route('/hostels', methods=['GET', 'POST'])
-def hostels():
-    fieldnames = ['sno', 'name', 'type', 'capacity', 'students_residing']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        if action == 'add':
-            data = {
-                'sno': request.form['sno'],
-                'name': request.form['name'],
-                'type': request.form['type'],
-                'capacity': request.form['capacity'],
-                'students_residing': request.form['students_residing']
-            }
-            append_csv('hostels.csv', data, fieldnames)
-            flash('Hostel added successfully!', 'success')
-        
-        elif action == 'edit':
-            index = int(request.form['index'])
-            data = {
-                'sno': request.form['sno'],
-                'name': request.form['name'],
-                'type': request.form['type'],
-                'capacity': request.form['capacity'],
-                'students_residing': request.form['students_residing']
-            }
-            update_record('hostels.csv', index, data, fieldnames)
-            flash('Hostel updated successfully!', 'success')
-        
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('hostels.csv', index, fieldnames)
-            flash('Hostel deleted successfully!', 'success')
-        
-        return redirect(url_for('hostels'))
-    
-    records = read_csv('hostels.csv')
-    return render_template('hostels.html', records=records)
+    if action == 'delete':
+        if delete_from_form(table, module.fieldnames):
+            flash('%s deleted successfully!' % module.noun, 'success')
+        return
+    if action not in ('add', 'edit'):
+        return
 
-# Departments Routes
-@app.route('/departments', methods=['GET', 'POST'])
-def departments():
-    fieldnames = ['sno', 'department_name']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        if action == 'add':
-            data = {
-                'sno': request.form['sno'],
-                'department_name': request.form['department_name']
-            }
-            append_csv('departments.csv', data, fieldnames)
-            flash('Department added successfully!', 'success')
-        
-        elif action == 'edit':
-            index = int(request.form['index'])
-            data = {
-                'sno': request.form['sno'],
-                'department_name': request.form['department_name']
-            }
-            update_record('departments.csv', index, data, fieldnames)
-            flash('Department updated successfully!', 'success')
-        
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('departments.csv', index, fieldnames)
-            flash('Department deleted successfully!', 'success')
-        
-        return redirect(url_for('departments'))
-    
-    records = read_csv('departments.csv')
-    return render_template('departments.html', records=records)
-
-# Programmes Routes
-@app.route('/programmes', methods=['GET', 'POST'])
-def programmes():
-    fieldnames = ['sno', 'level', 'program_name', 'year_of_start', 'course_duration', 
-                  'entry_qualification', 'medium_instruction', 'sanctioned_intake',
-                  'approved_intake_ews', 'approved_intake_sc', 'approved_intake_st', 
-                  'approved_intake_obc', 'approved_intake_general', 'approved_intake_total']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'sno': request.form.get('sno', '').strip(),
-            'level': request.form.get('level', '').strip(),
-            'program_name': request.form.get('program_name', '').strip(),
-            'year_of_start': request.form.get('year_of_start', '').strip(),
-            'course_duration': request.form.get('course_duration', '').strip(),
-            'entry_qualification': request.form.get('entry_qualification', '').strip(),
-            'medium_instruction': request.form.get('medium_instruction', '').strip(),
-            'sanctioned_intake': request.form.get('sanctioned_intake', '').strip(),
-            'approved_intake_ews': request.form.get('approved_intake_ews', '').strip(),
-            'approved_intake_sc': request.form.get('approved_intake_sc', '').strip(),
-            'approved_intake_st': request.form.get('approved_intake_st', '').strip(),
-            'approved_intake_obc': request.form.get('approved_intake_obc', '').strip(),
-            'approved_intake_general': request.form.get('approved_intake_general', '').strip(),
-            'approved_intake_total': request.form.get('approved_intake_total', '').strip()
-        }
-        
-        if action == 'add':
-            append_csv('programmes.csv', data, fieldnames)
-            flash('Programme added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('programmes.csv', index, data, fieldnames)
-            flash('Programme updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('programmes.csv', index, fieldnames)
-            flash('Programme deleted successfully!', 'success')
-        
-        return redirect(url_for('programmes'))
-    
-    records = read_csv('programmes.csv')
-    return render_template('programmes.html', records=records)
-
-# Student Enrollment Routes
-@app.route('/student_enrollment', methods=['GET', 'POST'])
-def student_enrollment():
-    fieldnames = ['sno', 'category', 'general_male', 'general_female', 'general_transgender',
-                  'ews_male', 'ews_female', 'ews_transgender', 'sc_male', 'sc_female', 'sc_transgender',
-                  'st_male', 'st_female', 'st_transgender', 'obc_male', 'obc_female', 'obc_transgender',
-                  'total_male', 'total_female', 'total_transgender']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'sno': request.form.get('sno', '').strip(),
-            'category': request.form.get('category', '').strip(),
-            'general_male': request.form.get('general_male', '0').strip(),
-            'general_female': request.form.get('general_female', '0').strip(),
-            'general_transgender': request.form.get('general_transgender', '0').strip(),
-            'ews_male': request.form.get('ews_male', '0').strip(),
-            'ews_female': request.form.get('ews_female', '0').strip(),
-            'ews_transgender': request.form.get('ews_transgender', '0').strip(),
-            'sc_male': request.form.get('sc_male', '0').strip(),
-            'sc_female': request.form.get('sc_female', '0').strip(),
-            'sc_transgender': request.form.get('sc_transgender', '0').strip(),
-            'st_male': request.form.get('st_male', '0').strip(),
-            'st_female': request.form.get('st_female', '0').strip(),
-            'st_transgender': request.form.get('st_transgender', '0').strip(),
-            'obc_male': request.form.get('obc_male', '0').strip(),
-            'obc_female': request.form.get('obc_female', '0').strip(),
-            'obc_transgender': request.form.get('obc_transgender', '0').strip(),
-            'total_male': request.form.get('total_male', '0').strip(),
-            'total_female': request.form.get('total_female', '0').strip(),
-            'total_transgender': request.form.get('total_transgender', '0').strip()
-        }
-        
-        if action == 'add':
-            append_csv('student_enrollment.csv', data, fieldnames)
-            flash('Enrollment record added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('student_enrollment.csv', index, data, fieldnames)
-            flash('Enrollment record updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('student_enrollment.csv', index, fieldnames)
-            flash('Enrollment record deleted successfully!', 'success')
-        
-        return redirect(url_for('student_enrollment'))
-    
-    records = read_csv('student_enrollment.csv')
-    return render_template('student_enrollment.html', records=records)
-
-# Examination Results Routes
-@app.route('/examination_results', methods=['GET', 'POST'])
-def examination_results():
-    fieldnames = ['sno', 'prog', 'year', 'month', 'category', 
-                  'general_male', 'general_female', 'general_transgender',
-                  'ews_male', 'ews_female', 'ews_transgender',
-                  'sc_male', 'sc_female', 'sc_transgender',
-                  'st_male', 'st_female', 'st_transgender',
-                  'obc_male', 'obc_female', 'obc_transgender',
-                  'total_male', 'total_female', 'total_transgender']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'sno': request.form.get('sno', '').strip(),
-            'prog': request.form.get('prog', '').strip(),
-            'year': request.form.get('year', '').strip(),
-            'month': request.form.get('month', '').strip(),
-            'category': request.form.get('category', '').strip(),
-            'general_male': request.form.get('general_male', '0').strip(),
-            'general_female': request.form.get('general_female', '0').strip(),
-            'general_transgender': request.form.get('general_transgender', '0').strip(),
-            'ews_male': request.form.get('ews_male', '0').strip(),
-            'ews_female': request.form.get('ews_female', '0').strip(),
-            'ews_transgender': request.form.get('ews_transgender', '0').strip(),
-            'sc_male': request.form.get('sc_male', '0').strip(),
-            'sc_female': request.form.get('sc_female', '0').strip(),
-            'sc_transgender': request.form.get('sc_transgender', '0').strip(),
-            'st_male': request.form.get('st_male', '0').strip(),
-            'st_female': request.form.get('st_female', '0').strip(),
-            'st_transgender': request.form.get('st_transgender', '0').strip(),
-            'obc_male': request.form.get('obc_male', '0').strip(),
-            'obc_female': request.form.get('obc_female', '0').strip(),
-            'obc_transgender': request.form.get('obc_transgender', '0').strip(),
-            'total_male': request.form.get('total_male', '0').strip(),
-            'total_female': request.form.get('total_female', '0').strip(),
-            'total_transgender': request.form.get('total_transgender', '0').strip()
-        }
-        
-        if action == 'add':
-            append_csv('examination_results.csv', data, fieldnames)
-            flash('Result record added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('examination_results.csv', index, data, fieldnames)
-            flash('Result record updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('examination_results.csv', index, fieldnames)
-            flash('Result record deleted successfully!', 'success')
-        
-        return redirect(url_for('examination_results'))
-    
-    records = read_csv('examination_results.csv')
-    return render_template('examination_results.html', records=records)
+    data, problems = module.parse(request.form)
+    if problems:
+        flash('%s not saved: %s' % (module.noun, '; '.join(problems)), 'error')
+    elif action == 'add':
+        storage.append(table, data, module.fieldnames)
+        flash('%s added successfully!' % module.noun, 'success')
+    elif update_from_form(table, data, module.fieldnames):
+        flash('%s updated successfully!' % module.noun, 'success')
 
-# Placement Routes
-@app.route('/placement', methods=['GET', 'POST'])
-def placement():
-    fieldnames = ['male_placed', 'female_placed', 'total_placed', 'median_salary']
-    
+# One page per module at /<table> (its endpoint is the table name): GET
+# shows a window of the table, POST saves the form and comes back to it
+def module_page(table):
+    module = MODULES[table]
     if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'male_placed': request.form.get('male_placed', '0').strip(),
-            'female_placed': request.form.get('female_placed', '0').strip(),
-            'total_placed': request.form.get('total_placed', '0').strip(),
-            'median_salary': request.form.get('median_salary', '0').strip()
-        }
-        
-        if action == 'add':
-            append_csv('placement.csv', data, fieldnames)
-            flash('Placement record added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('placement.csv', index, data, fieldnames)
-            flash('Placement record updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('placement.csv', index, fieldnames)
-            flash('Placement record deleted successfully!', 'success')
-        
-        return redirect(url_for('placement'))
-    
-    records = read_csv('placement.csv')
-    return render_template('placement.html', records=records)
-
-# Staff Information Routes
-@app.route('/staff_info', methods=['GET', 'POST'])
-def staff_info():
-    fieldnames = ['staff_type', 'category', 'subcategory',
-                  'general_male', 'general_female', 'general_transgender',
-                  'ews_male', 'ews_female', 'ews_transgender',
-                  'sc_male', 'sc_female', 'sc_transgender',
-                  'st_male', 'st_female', 'st_transgender',
-                  'obc_male', 'obc_female', 'obc_transgender',
-                  'total_male', 'total_female', 'total_transgender']
-    
-    if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'staff_type': request.form.get('staff_type', '').strip(),
-            'category': request.form.get('category', '').strip(),
-            'subcategory': request.form.get('subcategory', '').strip(),
-            'general_male': request.form.get('general_male', '0').strip(),
-            'general_female': request.form.get('general_female', '0').strip(),
-            'general_transgender': request.form.get('general_transgender', '0').strip(),
-            'ews_male': request.form.get('ews_male', '0').strip(),
-            'ews_female': request.form.get('ews_female', '0').strip(),
-            'ews_transgender': request.form.get('ews_transgender', '0').strip(),
-            'sc_male': request.form.get('sc_male', '0').strip(),
-            'sc_female': request.form.get('sc_female', '0').strip(),
-            'sc_transgender': request.form.get('sc_transgender', '0').strip(),
-            'st_male': request.form.get('st_male', '0').strip(),
-            'st_female': request.form.get('st_female', '0').strip(),
-            'st_transgender': request.form.get('st_transgender', '0').strip(),
-            'obc_male': request.form.get('obc_male', '0').strip(),
-            'obc_female': request.form.get('obc_female', '0').strip(),
-            'obc_transgender': request.form.get('obc_transgender', '0').strip(),
-            'total_male': request.form.get('total_male', '0').strip(),
-            'total_female': request.form.get('total_female', '0').strip(),
-            'total_transgender': request.form.get('total_transgender', '0').strip()
-        }
-        
-        if action == 'add':
-            append_csv('staff_info.csv', data, fieldnames)
-            flash('Staff record added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('staff_info.csv', index, data, fieldnames)
-            flash('Staff record updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('staff_info.csv', index, fieldnames)
-            flash('Staff record deleted successfully!', 'success')
-        
-        return redirect(url_for('staff_info'))
-    
-    records = read_csv('staff_info.csv')
-    return render_template('staff_info.html', records=records)
-
-# Scholarships Routes
-@app.route('/scholarships', methods=['GET', 'POST'])
-def scholarships():
-    fieldnames = ['scholarship_scheme', 'category',
-                  'general_male', 'general_female', 'general_transgender',
-                  'ews_male', 'ews_female', 'ews_transgender',
-                  'sc_male', 'sc_female', 'sc_transgender',
-                  'st_male', 'st_female', 'st_transgender',
-                  'obc_male', 'obc_female', 'obc_transgender',
-                  'total_male', 'total_female', 'total_transgender']
-    
+        save_from_form(module)
+        return redirect(url_for(table, **request.args.to_dict(flat=False)))
+    return render_module(table, module.fieldnames)
+
+for _table in MODULE_TABLES:
+    app.add_url_rule('/' + _table, _table, module_page, methods=['GET', 'POST'],
+                     defaults={'table': _table})
+
+# Grouped totals for any module, as JSON, e.g.
+#   /aggregate/examination_results?group_by=prog,year&measure=total_female&function=sum
+@app.route('/aggregate/<table>')
+def aggregate(table):
+    if table not in MODULE_TABLES:
+        abort(404)
+    fieldnames = MODULE_FIELDNAMES[table]
+    try:
+        group_by, measures, function, filters = parse_aggregate_args(request.args, fieldnames)
+    except ValueError as error:
+        return jsonify({'error': str(error)}), 400
+    rows = storage.aggregate(table, group_by, measures, function, filters)
+    return jsonify({'table': table, 'group_by': group_by, 'measures': measures,
+                    'function': function, 'filters': filters, 'rows': rows})
+
+# Bulk import: POST a CSV or JSON-lines file, either as the "file" field of a
+# multipart form or as the raw request body, e.g.
+#   curl -H 'Content-Type: text/csv' --data-binary @results.csv /examination_results/import
+# Valid rows are appended in one transaction; the response lists rejected lines.
+@app.route('/<table>/import', methods=['POST'])
+def bulk_import(table):
+    if table not in MODULE_FIELDNAMES:
+        abort(404)
+    if request.mimetype == 'multipart/form-data':
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': 'no file uploaded (expected a "file" field)'}), 400
+        stream = upload.stream
+        format = detect_format(upload.filename, upload.mimetype,
+                               request.form.get('format') or request.args.get('format'))
+    else:
+        stream = request.stream
+        format = detect_format(None, request.mimetype, request.args.get('format'))
+    if format not in FORMATS:
+        return jsonify({'error': 'unknown upload format (expected one of %s)' % ', '.join(FORMATS)}), 400
+
+    try:
+        report = import_stream(storage, MODULES[table], stream, format,
+                               app.config['BULK_IMPORT_BATCH_ROWS'],
+                               app.config['BULK_IMPORT_MAX_ERRORS'])
+    except (UnicodeDecodeError, csv.Error) as error:
+        return jsonify({'error': 'could not read upload: %s' % error, 'imported': 0}), 400
+    return jsonify(report.to_dict())
+
+def export_response(tables, format, content_type, filename, body, compressible=True):
+    # Stream body() as a download, unless the client already has this
+    # version of the tables. The ETag and Last-Modified come from the
+    # tables' signatures, so answering 304 never reads the data itself.
+    # Signatures describe what is on disk, so queued writes land first.
+    for table in tables:
+        storage.flush(table)
+    gzip = compressible and request.accept_encodings['gzip'] > 0
+    signatures = [(table, storage.signature(table)) for table in tables]
+    etag = export.entity_tag(signatures, format, gzip)
+    times = [storage.modified(table) for table in tables]
+    times = [time for time in times if time is not None]
+    modified = datetime.fromtimestamp(max(times), timezone.utc) if times else None
+    return download_response(etag, modified, content_type, filename, body, gzip)
+
+def download_response(etag, modified, content_type, filename, body, gzip):
+    if not is_resource_modified(request.environ, etag, last_modified=modified):
+        response = Response(status=304)
+    else:
+        chunks = body()
+        if gzip:
+            chunks = export.gzipped(chunks, app.config['EXPORT_GZIP_LEVEL'])
+        response = Response(stream_with_context(chunks), content_type=content_type)
+        response.headers['Content-Disposition'] = 'attachment; filename=%s' % filename
+        if gzip:
+            response.headers['Content-Encoding'] = 'gzip'
+    response.set_etag(etag)
+    if modified is not None:
+        response.last_modified = modified
+    response.vary.add('Accept-Encoding')
+    return response
+
+# Export one module as CSV (default) or JSON lines: /<table>/export?format=jsonl
+@app.route('/<table>/export')
+def export_table(table):
+    if table not in MODULE_FIELDNAMES:
+        abort(404)
+    format = request.args.get('format', 'csv').strip().lower()
+    if format not in export.FORMATS:
+        return jsonify({'error': 'unknown export format (expected one of %s)'
+                        % ', '.join(export.FORMATS)}), 400
+    fieldnames = storage_fieldnames(MODULE_FIELDNAMES[table])
+
+    def body():
+        chunks = storage.stream(table, fieldnames, app.config['EXPORT_CHUNK_ROWS'])
+        if format == 'csv':
+            return export.csv_chunks(chunks, fieldnames)
+        return export.jsonl_chunks(chunks, fieldnames)
+
+    return export_response([table], format, export.FORMATS[format],
+                           '%s.%s' % (table, format), body)
+
+# Export every module at once: JSON lines tagged with their table (default),
+# or ?format=zip for a zip of one CSV per module
+@app.route('/export')
+def export_bundle():
+    format = request.args.get('format', 'jsonl').strip().lower()
+    if format not in export.BUNDLE_FORMATS:
+        return jsonify({'error': 'unknown export format (expected one of %s)'
+                        % ', '.join(export.BUNDLE_FORMATS)}), 400
+    chunk_rows = app.config['EXPORT_CHUNK_ROWS']
+
+    def tables():
+        for table in MODULE_TABLES:
+            fieldnames = storage_fieldnames(MODULE_FIELDNAMES[table])
+            yield table, fieldnames, storage.stream(table, fieldnames, chunk_rows)
+
+    def body():
+        if format == 'zip':
+            return export.zip_chunks(('%s.csv' % table, export.csv_chunks(chunks, fieldnames))
+                                     for table, fieldnames, chunks in tables())
+        return (data for table, fieldnames, chunks in tables()
+                for data in export.jsonl_chunks(chunks, fieldnames, table))
+
+    return export_response(MODULE_TABLES, format, export.BUNDLE_FORMATS[format],
+                           'modules.%s' % format, body, compressible=format != 'zip')
+
+# Snapshots, oldest first; POST a label to freeze every module under it
+@app.route('/snapshots', methods=['GET', 'POST'])
+def snapshot_index():
     if request.method == 'POST':
-        action = request.form.get('action', 'add')
-        
-        data = {
-            'scholarship_scheme': request.form.get('scholarship_scheme', '').strip(),
-            'category': request.form.get('category', '').strip(),
-            'general_male': request.form.get('general_male', '0').strip(),
-            'general_female': request.form.get('general_female', '0').strip(),
-            'general_transgender': request.form.get('general_transgender', '0').strip(),
-            'ews_male': request.form.get('ews_male', '0').strip(),
-            'ews_female': request.form.get('ews_female', '0').strip(),
-            'ews_transgender': request.form.get('ews_transgender', '0').strip(),
-            'sc_male': request.form.get('sc_male', '0').strip(),
-            'sc_female': request.form.get('sc_female', '0').strip(),
-            'sc_transgender': request.form.get('sc_transgender', '0').strip(),
-            'st_male': request.form.get('st_male', '0').strip(),
-            'st_female': request.form.get('st_female', '0').strip(),
-            'st_transgender': request.form.get('st_transgender', '0').strip(),
-            'obc_male': request.form.get('obc_male', '0').strip(),
-            'obc_female': request.form.get('obc_female', '0').strip(),
-            'obc_transgender': request.form.get('obc_transgender', '0').strip(),
-            'total_male': request.form.get('total_male', '0').strip(),
-            'total_female': request.form.get('total_female', '0').strip(),
-            'total_transgender': request.form.get('total_transgender', '0').strip()
-        }
-        
-        if action == 'add':
-            append_csv('scholarships.csv', data, fieldnames)
-            flash('Scholarship record added successfully!', 'success')
-        elif action == 'edit':
-            index = int(request.form['index'])
-            update_record('scholarships.csv', index, data, fieldnames)
-            flash('Scholarship record updated successfully!', 'success')
-        elif action == 'delete':
-            index = int(request.form['index'])
-            delete_record('scholarships.csv', index, fieldnames)
-            flash('Scholarship record deleted successfully!', 'success')
-        
-        return redirect(url_for('scholarships'))
-    
-    records = read_csv('scholarships.csv')
-    return render_template('scholarships.html', records=records)
+        try:
+            entry = take_snapshot(request.form.get('label', '').strip())
+        except SnapshotError as error:
+            return jsonify({'error': str(error)}), 400
+        return jsonify(entry), 201
+    return jsonify({'snapshots': snapshots.list()})
+
+# One module as frozen in a snapshot, as CSV (default) or JSON lines.
+# Snapshots never change, so the ETag only depends on which one it is.
+@app.route('/snapshots/<label>/<table>/export')
+def export_snapshot(label, table):
+    if table not in MODULE_FIELDNAMES:
+        abort(404)
+    try:
+        entry = snapshots.entry(label)
+    except SnapshotError:
+        abort(404)
+    format = request.args.get('format', 'csv').strip().lower()
+    if format not in export.FORMATS:
+        return jsonify({'error': 'unknown export format (expected one of %s)'
+                        % ', '.join(export.FORMATS)}), 400
+    gzip = request.accept_encodings['gzip'] > 0
+    etag = export.entity_tag(('snapshot', label, entry['created']), table, format, gzip)
+    modified = datetime.fromisoformat(entry['created'])
+
+    def body():
+        fieldnames, rows = snapshots.rows(label, table)
+        fieldnames = fieldnames or storage_fieldnames(MODULE_FIELDNAMES[table])
+        chunk_rows = app.config['EXPORT_CHUNK_ROWS']
+        chunks = (rows[start:start + chunk_rows] for start in range(0, len(rows), chunk_rows))
+        if format == 'csv':
+            return export.csv_chunks(chunks, fieldnames)
+        return export.jsonl_chunks(chunks, fieldnames)
+
+    return download_response(etag, modified, export.FORMATS[format],
+                             '%s-%s.%s' % (table, label, format), body, gzip)
+
+# Rows added, removed and changed between two snapshots, listing at most
+# ?limit= of each per module: /snapshots/2024-25/diff/2025-26?table=hostels
+@app.route('/snapshots/<old>/diff/<new>')
+def snapshot_diff_page(old, new):
+    tables = request.args.getlist('table') or MODULE_TABLES
+    if any(table not in MODULE_FIELDNAMES for table in tables):
+        abort(404)
+    limit = request.args.get('limit', 100, type=int)
+    try:
+        diff = snapshots.diff(old, new, tables)
+    except SnapshotError:
+        abort(404)
+    return jsonify({'old': old, 'new': new, 'tables': {
+        table: {'added': len(changes['added']), 'removed': len(changes['removed']),
+                'changed': len(changes['changed']), 'added_rows': changes['added'][:limit],
+                'removed_ids': changes['removed'][:limit],
+                'changed_rows': changes['changed'][:limit]}
+        for table, changes in diff.items()}})
+
+# The consolidated report over every module: a printable page (default),
+# ?format=csv for its figures or ?format=zip for both. Only sections whose
+# module changed since they were last built are built again.
+@app.route('/report')
+def report():
+    format = request.args.get('format', 'html').strip().lower()
+    if format not in reports.FORMATS:
+        return jsonify({'error': 'unknown report format (expected one of %s)'
+                        % ', '.join(reports.FORMATS)}), 400
+    sections, _ = reports.build_report(storage, report_sections, app.config['REPORT_WORKERS'])
+    etag = export.entity_tag(reports.report_tag(sections), 'report', format)
+    if format == 'html':
+        response = Response(b''.join(report_chunks(format, sections)),
+                            content_type=reports.FORMATS[format])
+        response.set_etag(etag)
+        return response.make_conditional(request)
+    return download_response(etag, None, reports.FORMATS[format], 'report.%s' % format,
+                             lambda: report_chunks(format, sections), gzip=False)
+
+# Prometheus scrape target: request and phase latency histograms, rows
+# parsed, bytes read and written, and the caches' hit rates
+@app.route('/metrics')
+def metrics():
+    if not registry.enabled:
+        abort(404)
+    caches = storage.cache_stats()
+    caches['fragment'] = fragments.stats()
+    caches['snapshot'] = snapshots.stats()
+    caches['report'] = report_sections.stats()
+    return Response(registry.render(caches), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
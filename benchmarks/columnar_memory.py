@@ -0,0 +1,116 @@
+# Memory and scan-time comparison of the two ways a count table can sit in
+# the table cache: the list of string dicts the CSV reader produces, and a
+# ColumnarTable with typed count columns.
+#
+# Rows are shaped like student_enrollment and both representations are
+# parsed from the same CSV text, so the list-of-dicts figure is what the
+# cache held before.
+#
+#   python benchmarks/columnar_memory.py --rows 100000
+
+import argparse
+import csv
+import gc
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from columnar import COUNT_COLUMNS, ColumnarTable  # noqa: E402
+from storage import new_record_id, storage_fieldnames  # noqa: E402
+
+FIELDNAMES = storage_fieldnames(['sno', 'category'] + COUNT_COLUMNS)
+CATEGORIES = ['Regular', 'Distance', 'Part-time', 'Evening']
+
+
+def _csv_text(count, seed=1):
+    random.seed(seed)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=FIELDNAMES)
+    writer.writeheader()
+    for number in range(count):
+        row = {'sno': str(number + 1), 'category': random.choice(CATEGORIES)}
+        for name in COUNT_COLUMNS:
+            row[name] = str(random.randrange(500))
+        row['id'] = new_record_id()
+        row['rev'] = '1'
+        writer.writerow(row)
+    return buffer.getvalue()
+
+
+def _parsed(text):
+    # As CsvStorage._csv_rows yields them
+    for row in csv.DictReader(io.StringIO(text)):
+        yield {key.strip(): value.strip() for key, value in row.items()}
+
+
+def _measure(build):
+    # Bytes still allocated once build() returns
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def _timed(function, repeat=3):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return value, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Columnar vs list-of-dicts memory benchmark')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    text = _csv_text(args.rows)
+    dicts, dict_bytes = _measure(lambda: list(_parsed(text)))
+    table, table_bytes = _measure(lambda: ColumnarTable.from_rows(FIELDNAMES, _parsed(text)))
+    assert len(table) == len(dicts) and dict(table[-1]) == dicts[-1]
+    _, dict_load = _timed(lambda: list(_parsed(text)), repeat=1)
+    _, table_load = _timed(lambda: ColumnarTable.from_rows(FIELDNAMES, _parsed(text)), repeat=1)
+
+    print('%d rows, %d columns (%d counts)' % (args.rows, len(FIELDNAMES), len(COUNT_COLUMNS)))
+    print('%-16s %8.1f MiB  %6.0f bytes/row  loaded in %.2fs' % (
+        'list of dicts', dict_bytes / 2 ** 20, dict_bytes / args.rows, dict_load))
+    print('%-16s %8.1f MiB  %6.0f bytes/row  loaded in %.2fs  (%.1fx smaller)' % (
+        'columnar', table_bytes / 2 ** 20, table_bytes / args.rows, table_load,
+        dict_bytes / table_bytes))
+
+    def dict_sum():
+        total = 0
+        for row in dicts:
+            total += int(row['total_male']) + int(row['total_female']) + int(row['total_transgender'])
+        return total
+
+    def columnar_sum():
+        return (sum(table.column('total_male')) + sum(table.column('total_female'))
+                + sum(table.column('total_transgender')))
+
+    def dict_filter():
+        return [position for position, row in enumerate(dicts) if row['category'] == 'Evening']
+
+    def columnar_filter():
+        return table.matching({'category': 'Evening'})
+
+    for label, slow, fast in (('headcount sum', dict_sum, columnar_sum),
+                              ('category filter', dict_filter, columnar_filter)):
+        expected, slow_time = _timed(slow)
+        value, fast_time = _timed(fast)
+        assert value == expected
+        print('%-16s %8.1f ms -> %6.1f ms  (%.1fx)' % (
+            label, slow_time * 1000, fast_time * 1000, slow_time / fast_time))
+
+
+if __name__ == '__main__':
+    main()
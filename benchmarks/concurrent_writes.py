@@ -0,0 +1,104 @@
+# Write throughput under contention: several worker processes, each with
+# several threads, POST adds and edits to the same table through Flask's test
+# client. The run is repeated with group commit off (one lock and fsync per
+# request) and on, and the throughput of both is printed. That no write is
+# lost is checked by tests/test_concurrent_writes.py.
+#
+#   python benchmarks/concurrent_writes.py --processes 4 --threads 8 --requests 25
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+FIELDNAMES = ['sno', 'name', 'type', 'capacity', 'students_residing']
+
+
+def _owner_row(worker, thread):
+    return {'sno': 'owner-%d-%d' % (worker, thread), 'name': 'Hostel', 'type': 'Boys',
+            'capacity': '1000', 'students_residing': '0'}
+
+
+def _worker(worker, threads, requests, data_folder, group_commit, start, owner_ids):
+    import threading
+
+    app_module.app.config['DATA_FOLDER'] = data_folder
+    app_module.app.config['GROUP_COMMIT'] = group_commit
+    failures = []
+
+    def run(thread):
+        client = app_module.app.test_client()
+        owner = _owner_row(worker, thread)
+        record_id = owner_ids[owner['sno']]
+        for i in range(requests):
+            response = client.post('/hostels', data={
+                'action': 'add', 'sno': 'add-%d-%d-%d' % (worker, thread, i), 'name': 'New',
+                'type': 'Girls', 'capacity': '10', 'students_residing': '1'})
+            edit = dict(owner, action='edit', id=record_id, students_residing=str(i + 1))
+            response2 = client.post('/hostels', data=edit)
+            if response.status_code != 302 or response2.status_code != 302:
+                failures.append((response.status_code, response2.status_code))
+
+    start.wait()
+    pool = [threading.Thread(target=run, args=(t,)) for t in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if failures:
+        raise SystemExit('%d failed requests in worker %d' % (len(failures), worker))
+
+
+def run_mode(processes, threads, requests, group_commit):
+    data_folder = tempfile.mkdtemp(prefix='idms-stress-')
+    try:
+        app_module.app.config['DATA_FOLDER'] = data_folder
+        seed = [_owner_row(p, t) for p in range(processes) for t in range(threads)]
+        app_module.storage.write('hostels', seed, FIELDNAMES)
+        owner_ids = {row['sno']: row['id'] for row in app_module.storage.read('hostels')}
+
+        context = multiprocessing.get_context('fork')
+        start = context.Barrier(processes + 1)
+        workers = [context.Process(target=_worker,
+                                   args=(p, threads, requests, data_folder, group_commit, start,
+                                         owner_ids))
+                   for p in range(processes)]
+        for w in workers:
+            w.start()
+        start.wait()
+        began = time.perf_counter()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - began
+        if any(w.exitcode for w in workers):
+            raise SystemExit('a worker process failed')
+        return elapsed
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent write throughput')
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=25, help='add+edit pairs per thread')
+    args = parser.parse_args()
+
+    total = args.processes * args.threads * args.requests * 2
+    results = {}
+    for label, group_commit in (('per-request', False), ('group-commit', True)):
+        elapsed = run_mode(args.processes, args.threads, args.requests, group_commit)
+        results[label] = total / elapsed
+        print('%-13s %6d writes in %6.2fs  %8.1f writes/s' % (label, total, elapsed, total / elapsed))
+    print('speedup: %.2fx' % (results['group-commit'] / results['per-request']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# Speed of the total-column check (consistency.py) over whole tables. The
+# four head-count modules are generated with --rows rows each (as
+# benchmarks/suite.py generates them) and --wrong rows per table get a
+# total that is one off. Each table is then loaded and checked from a cold
+# start in one process and with the tables split across --jobs worker
+# processes, checked again from the cache, and finally repaired.
+#
+#   python benchmarks/consistency_check.py --rows 200000 --jobs 2
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+import consistency  # noqa: E402
+from suite import generate  # noqa: E402
+
+TABLES = ['student_enrollment', 'examination_results', 'staff_info', 'scholarships']
+
+
+def _break_totals(storage, table, wrong, rng):
+    # Make wrong rows' total_male one more than their parts add up to
+    rows = storage.read(table)
+    changes = []
+    for row in rng.sample(rows, min(wrong, len(rows))):
+        data = dict(row)
+        data['total_male'] = str(int(data['total_male']) + 1)
+        changes.append((row['id'], data, row['rev']))
+    # Straight to the backend, as an outside edit would be
+    storage.update_many(table, changes, app_module.MODULE_FIELDNAMES[table])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Total-column check throughput')
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--wrong', type=int, default=100, help='rows per table with a bad total')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='idms-consistency-')
+    try:
+        generate(data_folder, args.rows, 1, TABLES, args.backend)
+        config = dict(app_module.app.config, DATA_FOLDER=data_folder,
+                      STORAGE_BACKEND=args.backend, SQLITE_PATH=None)
+        storage = app_module.create_storage(config)
+        rng = random.Random(1)
+        for table in TABLES:
+            _break_totals(storage, table, args.wrong, rng)
+
+        for jobs in sorted({1, args.jobs}):
+            # A fresh storage each time, so every table is parsed from disk
+            fresh = app_module.create_storage(config)
+            began = time.perf_counter()
+            checks = consistency.check_tables(fresh, TABLES, jobs)
+            elapsed = time.perf_counter() - began
+            if jobs == 1:
+                serial = fresh
+            rows = sum(check.rows for check in checks)
+            print('load and check, %d job(s): %7.2fs  %9d rows/s  %d wrong' % (
+                jobs, elapsed, rows / elapsed, sum(len(check.wrong) for check in checks)))
+
+        # The single-process run left the tables cached; this is the check
+        # on its own
+        began = time.perf_counter()
+        checks = consistency.check_tables(serial, TABLES)
+        elapsed = time.perf_counter() - began
+        print('check, cached tables:     %7.2fs  %9d rows/s' % (elapsed, rows / elapsed))
+
+        began = time.perf_counter()
+        for check in checks:
+            consistency.repair(storage, check)
+        print('repair:                   %7.2fs  %d rows' % (
+            time.perf_counter() - began, sum(check.repaired for check in checks)))
+        remaining = consistency.check_tables(storage, TABLES)
+        print('wrong after repair: %d' % sum(len(check.wrong) for check in remaining))
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+# Throughput of the export routes over a synthetic examination_results table:
+# each format is downloaded in full through Flask's test client, then again
+# with the ETag from the first download, which should come back 304 without
+# reading the table.
+#
+#   python benchmarks/export_throughput.py --rows 100000
+#   STORAGE_BACKEND=sqlite python benchmarks/export_throughput.py
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from schema import CASTES, GENDERS  # noqa: E402
+
+TABLE = 'examination_results'
+
+DOWNLOADS = [
+    ('csv', '', {}),
+    ('jsonl', '?format=jsonl', {}),
+    ('csv, gzip', '', {'Accept-Encoding': 'gzip'}),
+    ('jsonl, gzip', '?format=jsonl', {'Accept-Encoding': 'gzip'}),
+]
+
+
+def _rows(count, seed=1):
+    random.seed(seed)
+    for number in range(count):
+        row = {'sno': str(number + 1), 'prog': random.choice(['BA', 'BSc', 'MA']),
+               'year': random.choice(['2023', '2024']), 'month': random.choice(['May', 'Dec']),
+               'category': random.choice(['Regular', 'Distance'])}
+        for gender in GENDERS:
+            for caste in CASTES:
+                row['%s_%s' % (caste, gender)] = str(random.randrange(50))
+            row['total_%s' % gender] = str(random.randrange(250))
+        yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export throughput')
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='idms-export-')
+    try:
+        app_module.app.config['DATA_FOLDER'] = data_folder
+        app_module.storage = app_module.create_storage(app_module.app.config)
+        app_module.storage.append_many(TABLE, _rows(args.rows), app_module.MODULE_FIELDNAMES[TABLE])
+        client = app_module.app.test_client()
+        url = '/%s/export' % TABLE
+        # Warm the table cache so the first timing is the export alone
+        app_module.storage.read(TABLE)
+
+        for label, query, headers in DOWNLOADS:
+            began = time.perf_counter()
+            size = 0
+            response = client.get(url + query, headers=headers, buffered=False)
+            for chunk in response.response:
+                size += len(chunk)
+            response.close()
+            elapsed = time.perf_counter() - began
+
+            etag = response.headers['ETag']
+            began = time.perf_counter()
+            again = client.get(url + query, headers=dict(headers, **{'If-None-Match': etag}))
+            conditional = time.perf_counter() - began
+            print('%-12s %8.1f MiB  %6.2fs  %8d rows/s   repeat: %d in %.2f ms' % (
+                label, size / 2 ** 20, elapsed, args.rows / elapsed, again.status_code,
+                conditional * 1000))
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
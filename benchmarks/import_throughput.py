@@ -0,0 +1,93 @@
+# Throughput of the bulk import route: a synthetic examination_results file
+# is POSTed through Flask's test client, as CSV and as JSON lines, into an
+# empty data folder. A few rows are deliberately broken so the error report
+# path is exercised too. Each format is imported --repeat times and the
+# fastest run is reported.
+#
+#   python benchmarks/import_throughput.py --rows 100000
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from schema import CASTES, GENDERS  # noqa: E402
+
+TABLE = 'examination_results'
+
+
+def _rows(count, broken, seed=1):
+    random.seed(seed)
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    for number in range(count):
+        row = {'sno': str(number + 1), 'prog': random.choice(['BA', 'BSc', 'MA']),
+               'year': random.choice(['2023', '2024']), 'month': random.choice(['May', 'Dec']),
+               'category': random.choice(['Regular', 'Distance'])}
+        for gender in GENDERS:
+            total = 0
+            for caste in CASTES:
+                value = random.randrange(50)
+                row['%s_%s' % (caste, gender)] = str(value)
+                total += value
+            row['total_%s' % gender] = str(total)
+        if number % (count // broken or count) == 1:
+            row['total_male'] = str(int(row['total_male']) + 1)
+        yield {name: row[name] for name in fieldnames}
+
+
+def _payload(format, count, broken):
+    buffer = io.StringIO()
+    if format == 'csv':
+        writer = csv.DictWriter(buffer, fieldnames=app_module.MODULE_FIELDNAMES[TABLE])
+        writer.writeheader()
+        writer.writerows(_rows(count, broken))
+    else:
+        for row in _rows(count, broken):
+            buffer.write(json.dumps(row) + '\n')
+    return buffer.getvalue().encode('utf-8')
+
+
+def _import(body, content_type):
+    # One import into an empty data folder: (report, rows stored afterwards)
+    data_folder = tempfile.mkdtemp(prefix='idms-import-')
+    try:
+        app_module.app.config['DATA_FOLDER'] = data_folder
+        client = app_module.app.test_client()
+        response = client.post('/%s/import' % TABLE, data=body, content_type=content_type)
+        stored = len(app_module.create_storage(app_module.app.config).read(TABLE))
+        return response.get_json(), stored
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk import throughput')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--broken', type=int, default=10, help='rows with a wrong total')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    for format, content_type in (('csv', 'text/csv'), ('jsonl', 'application/x-ndjson')):
+        body = _payload(format, args.rows, args.broken)
+        report = None
+        for _ in range(args.repeat):
+            run, stored = _import(body, content_type)
+            if report is None or run['seconds'] < report['seconds']:
+                report = run
+        print('%-6s %7d rows  %7d imported  %4d rejected  %6.2fs  %8d rows/s  (%d stored)' % (
+            format, report['rows'], report['imported'], report['rejected'], report['seconds'],
+            report['rows_per_second'], stored))
+        if report['errors']:
+            print('       first error: line %(line)d: %(errors)s' % report['errors'][0])
+
+
+if __name__ == '__main__':
+    main()
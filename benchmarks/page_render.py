@@ -0,0 +1,90 @@
+# Response size and render time of the module pages for a synthetic
+# 10k-row table, through Flask's test client. With the table already
+# cached, each page is timed on its first fetch and then as the best of
+# --repeat more. "all rows" raises PAGE_SIZE_MAX so the whole table is one
+# page.
+#
+#   python benchmarks/page_render.py --rows 10000
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from columnar import COUNT_COLUMNS  # noqa: E402
+
+TABLES = ['student_enrollment', 'examination_results', 'staff_info', 'scholarships']
+
+TEXT = {
+    'category': ['Regular', 'Distance'],
+    'prog': ['BA', 'BSc', 'MA', 'MSc'],
+    'year': ['2023', '2024'],
+    'month': ['May', 'December'],
+    'staff_type': ['Teaching', 'Non-Teaching'],
+    'subcategory': ['Permanent', 'Contract'],
+    'scholarship_scheme': ['Post-Matric', 'Merit-cum-Means', "Chief Minister's"],
+}
+
+
+def _rows(fieldnames, count, seed=1):
+    random.seed(seed)
+    for number in range(count):
+        row = {}
+        for name in fieldnames:
+            if name in COUNT_COLUMNS:
+                row[name] = str(random.randrange(500))
+            elif name == 'sno':
+                row[name] = str(number + 1)
+            else:
+                row[name] = random.choice(TEXT[name])
+        yield row
+
+
+def _timed(client, url, repeat):
+    began = time.perf_counter()
+    client.get(url)
+    first = time.perf_counter() - began
+    best, response = None, None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    assert response.status_code == 200, response.status_code
+    return len(response.data), first, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Module page render benchmark')
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='idms-render-')
+    try:
+        config = app_module.app.config
+        config['DATA_FOLDER'] = data_folder
+        config['PAGE_SIZE_MAX'] = args.rows
+        app_module.storage = app_module.create_storage(config)
+        client = app_module.app.test_client()
+        for table in TABLES:
+            fieldnames = app_module.MODULE_FIELDNAMES[table]
+            app_module.storage.append_many(table, _rows(fieldnames, args.rows), fieldnames)
+            app_module.storage.read(table)
+            for label, query, count in (('page of %d' % config['PAGE_SIZE'], '', config['PAGE_SIZE']),
+                                        ('all rows', '?page_size=%d' % args.rows, args.rows)):
+                size, first, best = _timed(client, '/%s%s' % (table, query), args.repeat)
+                print('%-20s %-12s %10d bytes  %6.0f bytes/row  first %8.1f ms  then %8.1f ms' % (
+                    table, label, size, size / count, first * 1000, best * 1000))
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
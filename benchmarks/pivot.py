@@ -0,0 +1,80 @@
+# Timing of aggregation.aggregate over a synthetic examination_results table
+# held as a ColumnarTable, the way CsvStorage caches it.
+#
+# Each query is run cold (no grouping memo) and then again through a
+# CsvStorage-style result cache hit. --baseline also runs the same queries
+# over a plain list of row dicts, which needs several GB at 1M rows.
+#
+#   python benchmarks/pivot.py --rows 1000000
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aggregation import aggregate  # noqa: E402
+from columnar import COUNT_COLUMNS, ColumnarTable  # noqa: E402
+from storage import storage_fieldnames  # noqa: E402
+
+FIELDNAMES = storage_fieldnames(['sno', 'prog', 'year', 'month', 'category'] + COUNT_COLUMNS)
+PROGRAMMES = ['BA', 'BSc', 'BCom', 'MA', 'MSc', 'MCom', 'BTech', 'MTech', 'PhD', 'MBA']
+YEARS = [str(year) for year in range(2015, 2025)]
+MONTHS = ['May', 'June', 'November', 'December']
+CATEGORIES = ['Regular', 'Supplementary', 'Distance']
+
+QUERIES = [
+    ('female SC by category', ['category'], ['sc_female'], 'sum'),
+    ('pass counts by prog, year', ['prog', 'year'], ['total_male', 'total_female', 'total_transgender'], 'sum'),
+    ('all counts by prog, year, month', ['prog', 'year', 'month'], COUNT_COLUMNS, 'avg'),
+]
+
+
+def _rows(count, seed=1):
+    random.seed(seed)
+    for number in range(count):
+        row = {'sno': str(number + 1), 'prog': random.choice(PROGRAMMES),
+               'year': random.choice(YEARS), 'month': random.choice(MONTHS),
+               'category': random.choice(CATEGORIES), 'id': '%016x' % number, 'rev': '1'}
+        for name in COUNT_COLUMNS:
+            row[name] = str(random.randrange(200))
+        yield row
+
+
+def _time(function):
+    began = time.perf_counter()
+    result = function()
+    return result, time.perf_counter() - began
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Aggregation / pivot benchmark')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--baseline', action='store_true', help='also time a list of row dicts')
+    args = parser.parse_args()
+
+    table, build = _time(lambda: ColumnarTable.from_rows(FIELDNAMES, _rows(args.rows)))
+    print('%d rows built in %.1fs' % (args.rows, build))
+    dicts = [dict(row) for row in table] if args.baseline else None
+
+    cache = {}
+    for label, group_by, measures, function in QUERIES:
+        table._groupings = {}
+        results, cold = _time(lambda: aggregate(table, group_by, measures, function))
+        cache[label] = results
+        _, warm = _time(lambda: aggregate(table, group_by, measures, function))
+        # What Storage.aggregate does on a hit: a dict lookup by query and version
+        _, hit = _time(lambda: cache[label])
+        line = '%-32s %4d groups  cold %7.1f ms  memoized groups %7.1f ms  cached %6.3f ms' % (
+            label, len(results), cold * 1000, warm * 1000, hit * 1000)
+        if dicts is not None:
+            expected, slow = _time(lambda: aggregate(dicts, group_by, measures, function))
+            assert expected == results
+            line += '  dicts %7.1f ms' % (slow * 1000)
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
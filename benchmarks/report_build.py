@@ -0,0 +1,70 @@
+# Build time of the consolidated report (reports.py). Every module is
+# generated with --rows rows (as benchmarks/suite.py generates them), then
+# the report is built:
+#
+#   cold, N jobs   from a fresh storage and an empty section cache, with the
+#                  sections split across N threads or worker processes
+#   unchanged      again with nothing edited (every section from cache)
+#   one edit       after changing one hostel, so one section is rebuilt
+#   new process    from a fresh storage that reads the section cache left on
+#                  disk, as the next `flask report` run would
+#
+#   python benchmarks/report_build.py --rows 100000 --jobs 2
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+import reports  # noqa: E402
+from suite import generate  # noqa: E402
+
+
+def _timed(label, storage, cache, jobs=1, processes=False):
+    began = time.perf_counter()
+    sections, rebuilt = reports.build_report(storage, cache, jobs, processes)
+    print('%-28s %7.2fs  %d of %d sections rebuilt' % (
+        label, time.perf_counter() - began, len(rebuilt), len(sections)))
+    return sections
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Consolidated report build time')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='idms-report-')
+    try:
+        generate(data_folder, args.rows, 1, reports.SECTION_TABLES, args.backend)
+        config = dict(app_module.app.config, DATA_FOLDER=data_folder,
+                      STORAGE_BACKEND=args.backend, SQLITE_PATH=None)
+        cache_folder = os.path.join(data_folder, 'reports')
+
+        for jobs, processes in sorted({(1, False), (args.jobs, False), (args.jobs, True)}):
+            shutil.rmtree(cache_folder, ignore_errors=True)
+            storage = app_module.create_storage(config)
+            cache = reports.SectionCache(cache_folder)
+            _timed('cold, %d job(s) in %s' % (jobs, 'processes' if processes else 'threads'),
+                   storage, cache, jobs, processes)
+
+        _timed('unchanged', storage, cache)
+        fieldnames = app_module.MODULE_FIELDNAMES['hostels']
+        row = storage.read('hostels')[0]
+        storage.update('hostels', row['id'], dict(row, capacity=str(int(row['capacity']) + 1)),
+                       fieldnames)
+        _timed('one edit', storage, cache, args.jobs)
+        _timed('new process', app_module.create_storage(config),
+               reports.SectionCache(cache_folder))
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+# Validation throughput of the schema registry on bulk paths. For each
+# module, synthetic rows (the ones benchmarks/suite.py generates) are run
+# through:
+#
+#   compiled     the module's generated parse(), one row at a time
+#   interpreted  the same checks walked off the declaration per row, i.e.
+#                what parse() would cost without code generation
+#   batch        bulk_import.RowChecker on rows already in stored spelling
+#                (the column-wise fast path an import usually takes)
+#   batch+fix    RowChecker on the same rows with leading zeros and blanks
+#                that have to be rewritten before they are stored
+#
+# Each is timed --repeat times over --rows rows and the fastest run is
+# reported in rows per second.
+#
+#   python benchmarks/schema_validation.py --rows 100000
+
+import argparse
+import os
+import random
+import sys
+import time
+from decimal import ROUND_HALF_UP, Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_import import RowChecker  # noqa: E402
+from schema import AMOUNT, CHOICE, COUNT, MODULES  # noqa: E402
+from suite import synthetic_row  # noqa: E402
+
+BATCH_ROWS = 1000
+
+
+def interpreted_parse(module, data):
+    # parse() without code generation: the declaration is consulted for
+    # every cell
+    problems = []
+    row = {}
+    numbers = {}
+    for column in module.columns:
+        value = (data.get(column.name) or '').strip()
+        if column.kind == COUNT:
+            if not value:
+                value, numbers[column.name] = '0', 0
+            elif value.isdigit() and value.isascii():
+                numbers[column.name] = int(value)
+                value = str(numbers[column.name])
+            else:
+                problems.append('%s: %r is not a whole number' % (column.name, value))
+        elif column.kind == AMOUNT:
+            value = str(Decimal(value or '0').quantize(Decimal('0.01'), ROUND_HALF_UP))
+        elif column.kind == CHOICE and value not in column.choices:
+            problems.append('%s: %r is not one of %s' % (column.name, value, ', '.join(column.choices)))
+        row[column.name] = value
+    for total, parts in module.totals:
+        if all(part in numbers for part in parts):
+            expected = sum(numbers[part] for part in parts)
+            given = (data.get(total) or '').strip()
+            if given and total in numbers and numbers[total] != expected:
+                problems.append('%s is %s but %s add up to %d'
+                                % (total, given, ' + '.join(parts), expected))
+            row[total] = str(expected)
+    return row, problems
+
+
+def _untidy(row, counts, rng):
+    # The row as a hand-made upload might spell it
+    row = dict(row)
+    for name in counts:
+        if row[name] == '0' and rng.random() < 0.5:
+            row[name] = ''
+        elif rng.random() < 0.1:
+            row[name] = '0' + row[name]
+    return row
+
+
+def _rowwise(parse, rows):
+    for row in rows:
+        parse(row)
+
+
+def _batched(checker, rows):
+    for start in range(0, len(rows), BATCH_ROWS):
+        checker.parse(rows[start:start + BATCH_ROWS])
+
+
+def _fastest(function, repeat):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Schema validation throughput')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tables', nargs='+', default=list(MODULES), choices=list(MODULES))
+    args = parser.parse_args()
+
+    print('%-20s %12s %12s %12s %12s   (rows/s)' % ('module', 'compiled', 'interpreted', 'batch',
+                                                   'batch+fix'))
+    for table in args.tables:
+        module = MODULES[table]
+        rng = random.Random(1)
+        rows = [synthetic_row(table, module.fieldnames, rng, number) for number in range(args.rows)]
+        rows = [module.parse(row)[0] for row in rows]
+        untidy = [_untidy(row, module.counts, rng) for row in rows]
+        for row in untidy[:1000]:
+            assert module.parse(row) == interpreted_parse(module, row)
+        checker = RowChecker(module)
+        parsed, problems = checker.parse(untidy[:BATCH_ROWS])
+        assert not problems and parsed == rows[:BATCH_ROWS], problems
+
+        timings = [
+            _fastest(lambda: _rowwise(module.parse, untidy), args.repeat),
+            _fastest(lambda: _rowwise(lambda row: interpreted_parse(module, row), untidy), args.repeat),
+            _fastest(lambda: _batched(checker, rows), args.repeat),
+            _fastest(lambda: _batched(checker, untidy), args.repeat),
+        ]
+        print('%-20s %s' % (table, ' '.join('%12d' % (args.rows / seconds) for seconds in timings)))
+
+
+if __name__ == '__main__':
+    main()
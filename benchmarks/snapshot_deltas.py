@@ -0,0 +1,118 @@
+# Cost of academic-year snapshots (snapshots.py). All nine modules are
+# generated with --rows rows each (as benchmarks/suite.py generates them)
+# and frozen --years times; between years --churn of each table's rows are
+# edited and as many again are added and removed. Reported:
+#
+#   size     bytes on disk per snapshot, next to a full copy of the tables
+#            (as CSV)
+#   create   time to compare the tables with the previous year and store it
+#   read     one table of the oldest and newest year, from a store that has
+#            rebuilt nothing yet (cold) and again once cached
+#   diff     oldest against newest year, over all modules
+#
+#   python benchmarks/snapshot_deltas.py --rows 50000 --years 5 --churn 0.05
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+import export  # noqa: E402
+from snapshots import SnapshotStore  # noqa: E402
+from storage import storage_fieldnames  # noqa: E402
+from suite import generate, synthetic_row  # noqa: E402
+
+READ_TABLE = 'student_enrollment'
+
+
+def _next_year(storage, churn, rng, year):
+    # Edit, add and remove churn of every table's rows
+    for table, fieldnames in app_module.MODULE_FIELDNAMES.items():
+        rows = storage.read(table)
+        count = int(len(rows) * churn)
+        picked = rng.sample(rows, min(2 * count, len(rows)))
+        changes = []
+        for row in picked[:count]:
+            data = dict(row)
+            data[fieldnames[0]] += '*'
+            changes.append((row['id'], data, row['rev']))
+        storage.update_many(table, changes, fieldnames)
+        for row in picked[count:]:
+            storage.delete(table, row['id'], fieldnames)
+        storage.append_many(table, [synthetic_row(table, fieldnames, rng, year * 10 ** 7 + number)
+                                    for number in range(count)], fieldnames)
+
+
+def _timed(function):
+    began = time.perf_counter()
+    result = function()
+    return time.perf_counter() - began, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Snapshot size and read/diff speed')
+    parser.add_argument('--rows', type=int, default=50000)
+    parser.add_argument('--years', type=int, default=5)
+    parser.add_argument('--churn', type=float, default=0.05)
+    parser.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    args = parser.parse_args()
+
+    data_folder = tempfile.mkdtemp(prefix='idms-snapshots-')
+    try:
+        tables = list(app_module.MODULE_FIELDNAMES)
+        generate(data_folder, args.rows, 1, tables, args.backend)
+        # Removals go through the write-behind queue, so each year's are
+        # committed together
+        config = dict(app_module.app.config, DATA_FOLDER=data_folder,
+                      STORAGE_BACKEND=args.backend, SQLITE_PATH=None,
+                      WRITE_DURABILITY='batch')
+        storage = app_module.create_storage(config)
+        folder = os.path.join(data_folder, 'snapshots')
+        store = SnapshotStore(folder, fsync=config['FSYNC_WRITES'])
+        rng = random.Random(1)
+
+        labels = []
+        print('%-8s %12s %12s %9s' % ('year', 'stored', 'full copy', 'create'))
+        for year in range(args.years):
+            if year:
+                _next_year(storage, args.churn, rng, year)
+            storage.flush()
+            label = '%d-%02d' % (2020 + year, (21 + year) % 100)
+            snapshot_tables = {}
+            full = 0
+            for table in tables:
+                fieldnames = storage_fieldnames(app_module.MODULE_FIELDNAMES[table])
+                snapshot_tables[table] = (fieldnames, storage.stream(table, fieldnames))
+                full += sum(map(len, export.csv_chunks(storage.stream(table, fieldnames),
+                                                       fieldnames)))
+            seconds, entry = _timed(lambda: store.create(label, snapshot_tables))
+            labels.append(label)
+            print('%-8s %12d %12d %8.2fs' % (label, entry['bytes'], full, seconds))
+
+        for label in (labels[0], labels[-1]):
+            cold = SnapshotStore(folder)
+            seconds, (_, rows) = _timed(lambda: cold.rows(label, READ_TABLE))
+            cached, _ = _timed(lambda: cold.rows(label, READ_TABLE))
+            print('read %s %s: cold %.3fs, cached %.4fs (%d rows)'
+                  % (label, READ_TABLE, seconds, cached, len(rows)))
+
+        cold = SnapshotStore(folder)
+        seconds, diff = _timed(lambda: cold.diff(labels[0], labels[-1], tables))
+        again, _ = _timed(lambda: cold.diff(labels[0], labels[-1], tables))
+        print('diff %s..%s: cold %.3fs, cached %.3fs (%d rows differ)' % (
+            labels[0], labels[-1], seconds, again,
+            sum(len(changes[kind]) for changes in diff.values()
+                for kind in ('added', 'removed', 'changed'))))
+        storage.close()
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
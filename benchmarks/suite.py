@@ -0,0 +1,432 @@
+# Benchmark suite for the whole app: synthetic data for all nine modules at
+# one or more table sizes, every route driven through Flask's test client,
+# results written as JSON that two runs can be compared on.
+#
+#   python benchmarks/suite.py run --rows 1000 100000 --output after.json
+#   python benchmarks/suite.py compare before.json after.json
+#   python benchmarks/suite.py generate --rows 1000 --out /tmp/idms-data
+#
+# Each table size is generated into a scratch data folder and measured in a
+# fresh interpreter, so the first request of every table reads it from disk
+# and peak RSS belongs to that size alone. Per table the suite times:
+#
+#   first       the first page, which loads the table (one sample)
+#   get         random pages
+#   get_sorted  random pages sorted on a random column, either direction
+#   aggregate   /aggregate/<table> (grouped on the first dimension, if any)
+#   export      /<table>/export as CSV, read to the end
+#   add, edit, delete
+#               the module form's POSTs, on random records; the redirect is
+#               not followed
+#
+# and then index (the dashboard) after all the writes. Each route reports
+# its request count, errors (unexpected status codes), throughput in serial
+# requests per second and mean/p50/p95/p99/max latency in ms.
+#
+# --durability runs the app with that WRITE_DURABILITY; the measuring
+# process flushes any queued writes before it reports.
+#
+# compare pairs runs by backend, durability and row count and flags every latency
+# percentile, throughput and peak RSS that got worse by more than
+# --threshold (and, for latencies, by at least --min-ms). It exits with
+# status 1 when anything regressed.
+
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from schema import CASTES, GENDERS  # noqa: E402
+from storage import DURABILITY_LEVELS  # noqa: E402
+
+# Latencies where bigger is worse; throughput is the one where smaller is
+LATENCY_METRICS = ('p50_ms', 'p95_ms', 'p99_ms')
+
+TEXT = {
+    'type': ['Boys', 'Girls'],
+    'department_name': ['Computer Science', 'Physics', 'Chemistry', 'Mathematics', 'Economics',
+                        'History', 'Commerce', 'Management Studies', 'Electrical Engineering',
+                        'Civil Engineering', 'English', 'Hindi'],
+    'level': ['UG', 'PG', 'Diploma', 'PhD'],
+    'program_name': ['B.A. English', 'B.Sc. Physics', 'B.Com.', 'B.Tech. CSE', 'M.A. History',
+                     'M.Sc. Chemistry', 'MBA', 'Ph.D. Mathematics', 'Diploma in Civil Engineering'],
+    'course_duration': ['1', '2', '3', '4', '5'],
+    'entry_qualification': ['10th', '10+2', 'Graduation', 'Post Graduation'],
+    'medium_instruction': ['English', 'Hindi', 'English and Hindi'],
+    'prog': ['BA', 'BSc', 'BCom', 'BTech', 'MA', 'MSc', 'MCom', 'MBA'],
+    'year': [str(year) for year in range(2015, 2026)],
+    'month': ['May', 'June', 'November', 'December'],
+    'staff_type': ['Teaching', 'Non-Teaching'],
+    'subcategory': ['Total', 'PWD', 'Muslim Minority', 'Other Minority'],
+    'scholarship_scheme': ['Total', 'PWD', 'Muslim Minority', 'Other Minority'],
+}
+
+# category means something different in each module
+CATEGORIES = {
+    'student_enrollment': ['Regular', 'Distance'],
+    'examination_results': ['Regular', 'Distance'],
+    'staff_info': ['Contractual', 'Non-Contractual'],
+    'scholarships': ['All Categories', 'Regular', 'Distance'],
+}
+
+
+def _head_counts(rng, row, scale):
+    # caste x gender counts and their total_<gender> sums
+    for gender in GENDERS:
+        total = 0
+        for caste in CASTES:
+            value = rng.randrange(scale if gender != 'transgender' else 3)
+            row['%s_%s' % (caste, gender)] = str(value)
+            total += value
+        row['total_%s' % gender] = str(total)
+
+
+def synthetic_row(table, fieldnames, rng, number):
+    # One plausible record of a module, with every total column equal to
+    # the sum of the columns it totals
+    row = {'sno': str(number + 1)}
+    if table == 'nss_enrollment':
+        male, female = rng.randrange(200), rng.randrange(200)
+        row.update(male=str(male), female=str(female), total=str(male + female))
+    elif table == 'hostels':
+        capacity = rng.randrange(50, 500)
+        row.update(name='Hostel %d' % (number + 1), type=rng.choice(TEXT['type']),
+                   capacity=str(capacity), students_residing=str(rng.randrange(capacity + 1)))
+    elif table == 'programmes':
+        total = 0
+        for caste in ('ews', 'sc', 'st', 'obc', 'general'):
+            value = rng.randrange(60)
+            row['approved_intake_%s' % caste] = str(value)
+            total += value
+        row.update(approved_intake_total=str(total), sanctioned_intake=str(total + rng.randrange(20)),
+                   year_of_start=str(rng.randrange(1960, 2025)))
+    elif table == 'placement':
+        male, female = rng.randrange(300), rng.randrange(300)
+        row.update(male_placed=str(male), female_placed=str(female), total_placed=str(male + female),
+                   median_salary='%d.00' % (rng.randrange(25, 150) * 10000))
+    elif table in CATEGORIES:
+        _head_counts(rng, row, 500 if table != 'staff_info' else 40)
+        row['category'] = rng.choice(CATEGORIES[table])
+    for name in fieldnames:
+        if name not in row:
+            row[name] = rng.choice(TEXT[name])
+    return row
+
+
+def write_module_csv(path, table, fieldnames, count, seed):
+    # The module's CSV as the app stores it, ids and revs included
+    from storage import new_record_ids, storage_fieldnames
+
+    rng = random.Random('%s:%s' % (seed, table))
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(storage_fieldnames(fieldnames))
+        for start in range(0, count, 10000):
+            stop = min(count, start + 10000)
+            rows = []
+            for number, record_id in zip(range(start, stop), new_record_ids(stop - start)):
+                row = synthetic_row(table, fieldnames, rng, number)
+                rows.append([row[name] for name in fieldnames] + [record_id, '1'])
+            writer.writerows(rows)
+
+
+def generate(data_folder, count, seed, tables, backend='csv'):
+    # Fill data_folder with count records per table; SQLite databases are
+    # loaded through the backend's own bulk append
+    import app as app_module
+
+    os.makedirs(data_folder, exist_ok=True)
+    if backend == 'csv':
+        for table in tables:
+            write_module_csv(os.path.join(data_folder, table + '.csv'), table,
+                             app_module.MODULE_FIELDNAMES[table], count, seed)
+        return
+    config = dict(app_module.app.config, DATA_FOLDER=data_folder, STORAGE_BACKEND=backend,
+                  SQLITE_PATH=None)
+    storage = app_module.create_storage(config)
+    for table in tables:
+        fieldnames = app_module.MODULE_FIELDNAMES[table]
+        rng = random.Random('%s:%s' % (seed, table))
+        storage.append_many(table, (synthetic_row(table, fieldnames, rng, number)
+                                    for number in range(count)), fieldnames)
+
+
+def percentile(ordered, fraction):
+    # Linear interpolation between the closest ranks of a sorted list
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples, errors):
+    ordered = sorted(samples)
+    seconds = sum(ordered)
+    ms = lambda value: None if value is None else round(value * 1000, 3)  # noqa: E731
+    return {
+        'requests': len(ordered),
+        'errors': errors,
+        'throughput': round(len(ordered) / seconds, 1) if seconds else None,
+        'mean_ms': ms(seconds / len(ordered)) if ordered else None,
+        'p50_ms': ms(percentile(ordered, 0.50)),
+        'p95_ms': ms(percentile(ordered, 0.95)),
+        'p99_ms': ms(percentile(ordered, 0.99)),
+        'max_ms': ms(ordered[-1]) if ordered else None,
+    }
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == 'darwin' else 2 ** 10), 1)
+
+
+class RouteTimer:
+    # Times requests through the test client and keeps the samples per route
+
+    def __init__(self, client):
+        self.client = client
+        self.samples = {}
+        self.errors = {}
+
+    def request(self, route, method, url, expect, **kwargs):
+        began = time.perf_counter()
+        response = getattr(self.client, method)(url, **kwargs)
+        response.get_data()  # streamed bodies are produced here
+        elapsed = time.perf_counter() - began
+        response.close()
+        self.samples.setdefault(route, []).append(elapsed)
+        self.errors.setdefault(route, 0)
+        if response.status_code != expect:
+            self.errors[route] += 1
+        return response
+
+    def results(self):
+        return {route: summarize(samples, self.errors[route])
+                for route, samples in self.samples.items()}
+
+
+def _record_form(storage, table, rng):
+    # action/id/rev of a random current record, for an edit or a delete
+    total = storage.query(table, 0, 1)[1]
+    records, _ = storage.query(table, rng.randrange(total), 1)
+    record = records[0]
+    return {'id': record['id'], 'rev': record['rev']}
+
+
+def measure(data_folder, backend, durability, count, tables, requests, exports, seed):
+    # Drive every route against data_folder; runs in its own interpreter
+    import app as app_module
+    from aggregation import DIMENSION_COLUMNS, measure_columns
+
+    config = app_module.app.config
+    config.update(DATA_FOLDER=data_folder, STORAGE_BACKEND=backend, SQLITE_PATH=None,
+                  WRITE_DURABILITY=durability)
+    app_module.storage = storage = app_module.create_storage(config)
+    # Form posts redirect and flash; no cookies keeps the session from
+    # piling up flashed messages between them
+    timer = RouteTimer(app_module.app.test_client(use_cookies=False))
+    rng = random.Random(seed)
+    size = config['PAGE_SIZE']
+
+    for table in tables:
+        fieldnames = app_module.MODULE_FIELDNAMES[table]
+        url = '/' + table
+        timer.request('%s first' % table, 'get', url, 200)
+        pages = max(1, -(-count // size))
+        for _ in range(requests):
+            timer.request('%s get' % table, 'get', url, 200,
+                          query_string={'page': rng.randrange(1, pages + 1)})
+        for _ in range(requests):
+            sort = ('-' if rng.random() < 0.5 else '') + rng.choice(fieldnames)
+            timer.request('%s get_sorted' % table, 'get', url, 200,
+                          query_string={'page': rng.randrange(1, pages + 1), 'sort': sort})
+
+        dimensions = [name for name in fieldnames if name in DIMENSION_COLUMNS]
+        if measure_columns(fieldnames):
+            for _ in range(requests):
+                timer.request('%s aggregate' % table, 'get', '/aggregate/' + table, 200,
+                              query_string={'group_by': dimensions[:1]})
+        for _ in range(exports):
+            timer.request('%s export' % table, 'get', '%s/export' % url, 200,
+                          query_string={'format': 'csv'})
+
+        form_rng = random.Random('%s:%s:forms' % (seed, table))
+        for number in range(requests):
+            form = dict(synthetic_row(table, fieldnames, form_rng, count + number), action='add')
+            timer.request('%s add' % table, 'post', url, 302, data=form)
+        for number in range(requests):
+            form = dict(synthetic_row(table, fieldnames, form_rng, number), action='edit')
+            form.update(_record_form(storage, table, rng))
+            timer.request('%s edit' % table, 'post', url, 302, data=form)
+        for _ in range(requests):
+            form = dict(_record_form(storage, table, rng), action='delete')
+            timer.request('%s delete' % table, 'post', url, 302, data=form)
+
+    for _ in range(requests):
+        timer.request('index', 'get', '/', 200)
+    storage.close()
+    return timer.results()
+
+
+def run_size(args, count):
+    # Generate one table size into a scratch folder and measure it in a
+    # child interpreter
+    data_folder = tempfile.mkdtemp(prefix='idms-bench-')
+    try:
+        began = time.perf_counter()
+        generate(data_folder, count, args.seed, args.tables, args.backend)
+        generated = time.perf_counter() - began
+        command = [sys.executable, os.path.abspath(__file__), 'measure', '--data', data_folder,
+                   '--backend', args.backend, '--durability', args.durability, '--rows', str(count), '--requests', str(args.requests),
+                   '--exports', str(args.exports), '--seed', str(args.seed), '--tables'] + args.tables
+        output = subprocess.run(command, check=True, stdout=subprocess.PIPE, cwd=ROOT).stdout
+        run = json.loads(output)
+        run['generate_seconds'] = round(generated, 2)
+        return run
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+def compare(before, after, threshold, min_ms):
+    # (lines to print, number of regressions) for two suite outputs
+    lines, regressions = [], 0
+    earlier = {_run_key(run): run for run in before['runs']}
+    for run in after['runs']:
+        key = _run_key(run)
+        base = earlier.get(key)
+        if base is None:
+            lines.append('%s/%s, %d rows: not in the baseline' % key)
+            continue
+        checks = [('peak RSS', 'MB', base['peak_rss_mb'], run['peak_rss_mb'], True)]
+        for route, stats in sorted(run['routes'].items()):
+            old = base['routes'].get(route)
+            if old is None:
+                continue
+            for metric in LATENCY_METRICS:
+                checks.append((route + ' ' + metric[:3], 'ms', old[metric], stats[metric], True))
+            checks.append((route + ' throughput', '/s', old['throughput'], stats['throughput'], False))
+        for label, unit, old, new, higher_is_worse in checks:
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if higher_is_worse else change < -threshold
+            better = change < -threshold if higher_is_worse else change > threshold
+            if unit == 'ms' and abs(new - old) < min_ms:
+                continue
+            if worse or better:
+                regressions += worse
+                lines.append('%-11s %s/%s, %d rows: %-36s %10.2f -> %10.2f %-2s (%+.0f%%)' % (
+                    ('REGRESSION' if worse else 'improved',) + key + (label, old, new, unit,
+                                                                      change * 100)))
+    return lines, regressions
+
+
+def _run_key(run):
+    # Runs written before durability was recorded were synchronous
+    return run['backend'], run.get('durability', 'synchronous'), run['rows']
+
+
+def _load(path):
+    with open(path, encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def main():
+    import app as app_module
+
+    parser = argparse.ArgumentParser(description='Route benchmark suite')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help='generate data and benchmark every route')
+    run.add_argument('--rows', type=int, nargs='+', default=[1000, 100000],
+                     help='records per table; one run per size (e.g. 1000 100000 1000000)')
+    run.add_argument('--backend', choices=['csv', 'sqlite'], default='csv')
+    run.add_argument('--durability', choices=DURABILITY_LEVELS, default='synchronous')
+    run.add_argument('--requests', type=int, default=100, help='requests per route')
+    run.add_argument('--exports', type=int, default=3, help='full exports per table')
+    run.add_argument('--tables', nargs='+', default=app_module.MODULE_TABLES,
+                     choices=app_module.MODULE_TABLES)
+    run.add_argument('--seed', type=int, default=1)
+    run.add_argument('--output', help='write JSON here instead of stdout')
+
+    measure_command = commands.add_parser('measure')  # run's child process
+    measure_command.add_argument('--data', required=True)
+    measure_command.add_argument('--backend', required=True)
+    measure_command.add_argument('--durability', required=True)
+    measure_command.add_argument('--rows', type=int, required=True)
+    measure_command.add_argument('--requests', type=int, required=True)
+    measure_command.add_argument('--exports', type=int, required=True)
+    measure_command.add_argument('--tables', nargs='+', required=True)
+    measure_command.add_argument('--seed', type=int, required=True)
+
+    compare_command = commands.add_parser('compare', help='flag regressions between two runs')
+    compare_command.add_argument('before')
+    compare_command.add_argument('after')
+    compare_command.add_argument('--threshold', type=float, default=0.10,
+                                 help='relative change that counts (default 0.10)')
+    compare_command.add_argument('--min-ms', type=float, default=0.5,
+                                 help='ignore latency changes smaller than this')
+
+    generate_command = commands.add_parser('generate', help='only write the synthetic CSV files')
+    generate_command.add_argument('--rows', type=int, required=True)
+    generate_command.add_argument('--out', required=True)
+    generate_command.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    if args.command == 'measure':
+        began = time.perf_counter()
+        routes = measure(args.data, args.backend, args.durability, args.rows, args.tables,
+                         args.requests, args.exports, args.seed)
+        json.dump({'backend': args.backend, 'durability': args.durability, 'rows': args.rows,
+                   'tables': args.tables,
+                   'seconds': round(time.perf_counter() - began, 2),
+                   'peak_rss_mb': peak_rss_mb(), 'routes': routes}, sys.stdout)
+    elif args.command == 'run':
+        result = {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count(),
+            'backend': args.backend,
+            'durability': args.durability,
+            'requests': args.requests,
+            'seed': args.seed,
+            'runs': [],
+        }
+        for count in args.rows:
+            print('%d rows per table ...' % count, file=sys.stderr)
+            result['runs'].append(run_size(args, count))
+        text = json.dumps(result, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as handle:
+                handle.write(text + '\n')
+        else:
+            print(text)
+    elif args.command == 'compare':
+        lines, regressions = compare(_load(args.before), _load(args.after), args.threshold,
+                                     args.min_ms)
+        for line in lines:
+            print(line)
+        print('%d regression(s)' % regressions)
+        sys.exit(1 if regressions else 0)
+    else:
+        generate(args.out, args.rows, args.seed, app_module.MODULE_TABLES)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Memory and load cost of the shared table store (SHARED_TABLES) across
+# worker processes. The four columnar modules are generated with --rows
+# rows each (as benchmarks/suite.py generates them), then --workers
+# processes are started with SHARED_TABLES off and again with it on. Each:
+#
+#   load     reads every table (the first worker on its own, then the rest
+#            together) and runs one aggregate per table
+#   memory   what the worker holds once every worker has loaded, from
+#            /proc/self/smaps_rollup: Pss (shared pages split between the
+#            processes mapping them) and private pages, both net of the
+#            worker's footprint before loading
+#   reload   the first worker then edits one row per table, and every
+#            other worker reads the tables again
+#
+# Rows parsed is how many CSV rows the worker parsed in that phase; with
+# the store on, only the first load and the writer should parse anything.
+#
+#   python benchmarks/worker_memory.py --rows 100000 --workers 4
+
+import argparse
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = ['student_enrollment', 'examination_results', 'staff_info', 'scholarships']
+
+
+def _memory():
+    # (Pss, private) of this process in bytes
+    fields = {}
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+    return fields['Pss'], fields['Private_Clean'] + fields['Private_Dirty']
+
+
+def _load(storage, app_module):
+    for table in TABLES:
+        storage.query(table, 0, 50)
+        storage.aggregate(table, ['category'], app_module.MODULES[table].counts[:3])
+
+
+def _worker(config, number, ready, loaded, measured, edited, results):
+    import app as app_module
+    from metrics import registry
+
+    storage = app_module.create_storage(config)
+    before = _memory()
+    if number:
+        ready.wait()
+    began = time.perf_counter()
+    _load(storage, app_module)
+    load = time.perf_counter() - began, registry.total('idms_rows_parsed_total')
+    if not number:
+        ready.wait()
+    loaded.wait()
+    memory = [now - then for now, then in zip(_memory(), before)]
+    measured.wait()
+
+    parsed = registry.total('idms_rows_parsed_total')
+    if not number:
+        for table in TABLES:
+            row = storage.read(table)[0]
+            storage.update(table, row['id'], dict(row), app_module.MODULE_FIELDNAMES[table])
+        _load(storage, app_module)
+    edited.wait()
+    began = time.perf_counter()
+    _load(storage, app_module)
+    reload = time.perf_counter() - began, registry.total('idms_rows_parsed_total') - parsed
+    storage.close()
+    results.put((number, load, memory, reload))
+
+
+def _run(config, workers):
+    context = multiprocessing.get_context('spawn')
+    ready = context.Barrier(workers)
+    loaded, measured, edited = (context.Barrier(workers) for _ in range(3))
+    results = context.Queue()
+    processes = [context.Process(target=_worker, args=(config, number, ready, loaded, measured,
+                                                       edited, results))
+                 for number in range(workers)]
+    for process in processes:
+        process.start()
+    reports = sorted(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-worker memory with and without shared tables')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    import app as app_module
+    from suite import generate
+
+    data_folder = tempfile.mkdtemp(prefix='idms-shared-')
+    try:
+        generate(data_folder, args.rows, 1, TABLES)
+        for shared in (False, True):
+            config = dict(app_module.app.config, DATA_FOLDER=data_folder, STORAGE_BACKEND='csv',
+                          SQLITE_PATH=None, SHARED_TABLES=shared,
+                          SHARED_TABLE_FOLDER=os.path.join(data_folder, 'shared'))
+            print('SHARED_TABLES %s' % ('on' if shared else 'off'))
+            print('  %-6s %8s %12s %9s %11s %8s %12s' % ('worker', 'load', 'rows parsed', 'Pss MB',
+                                                        'private MB', 'reload', 'rows parsed'))
+            for number, load, memory, reload in _run(config, args.workers):
+                print('  %-6d %7.2fs %12d %9.1f %11.1f %7.2fs %12d' % (
+                    number, load[0], load[1], memory[0] / 2 ** 20, memory[1] / 2 ** 20,
+                    reload[0], reload[1]))
+    finally:
+        shutil.rmtree(data_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
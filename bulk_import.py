@@ -0,0 +1,224 @@
+import csv
+import io
+import json
+import time
+from itertools import chain, islice
+from operator import itemgetter
+
+from schema import AMOUNT, STORED_NUMBERS
+
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportReport:
+    # Outcome of one bulk import: how many rows were read and stored, and
+    # which input lines were rejected and why. Only the first max_errors
+    # rejected lines are listed; the count covers all of them.
+
+    def __init__(self, table, format, max_errors=1000):
+        self.table = table
+        self.format = format
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def reject(self, line, problems):
+        self.rejected += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({'line': line, 'errors': problems})
+
+    def to_dict(self):
+        return {
+            'table': self.table,
+            'format': self.format,
+            'rows': self.rows,
+            'imported': self.imported,
+            'rejected': self.rejected,
+            'errors': self.errors,
+            'errors_truncated': self.rejected > len(self.errors),
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': int(self.rows / self.seconds) if self.seconds else None,
+        }
+
+
+def detect_format(filename, content_type, requested=None):
+    # 'csv' or 'jsonl' from an explicit choice, the file name or the
+    # content type, in that order; None if none of them says
+    if requested:
+        requested = requested.strip().lower()
+        return 'jsonl' if requested in ('json', 'ndjson') else requested
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    content_type = (content_type or '').lower()
+    if 'csv' in content_type:
+        return 'csv'
+    if 'json' in content_type:
+        return 'jsonl'
+    return None
+
+
+def read_rows(stream, format):
+    # (line number, row dict or None, problem) for each record of a binary
+    # stream, read incrementally
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if format == 'csv':
+        reader = csv.reader(text)
+        header = [name.strip() for name in next(reader, [])]
+        for values in reader:
+            if not values:
+                continue
+            if len(values) > len(header):
+                yield reader.line_num, None, 'more values than header columns'
+                continue
+            yield reader.line_num, dict(zip(header, map(str.strip, values))), None
+        return
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as error:
+            yield line_number, None, 'invalid JSON: %s' % error
+            continue
+        if not isinstance(record, dict):
+            yield line_number, None, 'expected a JSON object'
+            continue
+        try:
+            row = dict(zip(map(str.strip, record), map(str.strip, record.values())))
+        except TypeError:
+            # Numbers, nulls and the like
+            row = {key.strip(): '' if value is None else str(value).strip()
+                   for key, value in record.items()}
+        yield line_number, row, None
+
+
+class RowChecker:
+    # Validates rows against one module of the schema registry. The
+    # per-module work (which columns are counts or choices, which totals
+    # apply) is done once up front. A batch of rows is then checked
+    # column-wise with a few C-level calls over all of it; only rows that
+    # fail, or that are not already spelled the way they are stored, go
+    # through the module's compiled parse() one by one.
+
+    def __init__(self, module):
+        self.module = module
+        self.fieldnames = list(module.fieldnames)
+        self.columns = set(self.fieldnames)
+        # Total columns may be left out; parse() works them out from their parts
+        self.required = self.columns - set(module.derived)
+        self.known = self.columns | {'id', 'rev'}
+        self.numbers = list(module.counts)
+        self.totals = module.totals
+        self._numbers = _getter(self.numbers)
+        index = {name: position for position, name in enumerate(self.numbers)}
+        self._rules = [(index[total], [index[part] for part in parts]) for total, parts in self.totals]
+        self._choices = [(name, frozenset(choices)) for name, choices in module.choices.items()]
+        # Amounts are rewritten with two decimals, so rows holding one
+        # always take the row-by-row path
+        self._rowwise = any(column.kind == AMOUNT for column in module.columns)
+
+    def parse(self, rows):
+        # (rows as they will be stored, {position: problems}) for a batch;
+        # rows at a position with problems must not be stored
+        if self._rowwise or not (all(map(self.required.issubset, rows))
+                                 and all(map(self.known.issuperset, rows))):
+            return self._parse_each(rows, range(len(rows)))
+        if not all(map(self.columns.issubset, rows)):
+            # Totals left out of the upload are filled in row by row
+            return self._parse_each(rows, range(len(rows)), self.module.parse)
+        failed = set()
+        width = len(self.numbers)
+        if width and rows:
+            values = list(chain.from_iterable(map(self._numbers, rows)))
+            joined = ','.join(values)
+            # The count rules out a comma inside a value. Anything else (bad
+            # values, but also blanks or leading zeros to rewrite) goes
+            # through the module's parse(); the columns are known to be right.
+            if not (STORED_NUMBERS.fullmatch(joined) and joined.count(',') == len(values) - 1):
+                return self._parse_each(rows, range(len(rows)), self.module.parse)
+            numbers = list(map(int, values))
+            for total, parts in self._rules:
+                expected = list(map(sum, zip(*[numbers[part::width] for part in parts])))
+                actual = numbers[total::width]
+                if expected != actual:
+                    failed.update(position for position, (left, right) in enumerate(zip(expected, actual))
+                                  if left != right)
+        for name, allowed in self._choices:
+            labels = list(map(itemgetter(name), rows))
+            if not allowed.issuperset(labels):
+                failed.update(position for position, label in enumerate(labels) if label not in allowed)
+        return self._parse_each(rows, sorted(failed))
+
+    def _parse_each(self, rows, positions, parse=None):
+        parsed = list(rows)
+        problems = {}
+        parse = parse or self._parse
+        for position in positions:
+            parsed[position], found = parse(rows[position])
+            if found:
+                problems[position] = found
+        return parsed, problems
+
+    def _parse(self, row):
+        problems = []
+        missing = [name for name in self.fieldnames if name in self.required and name not in row]
+        if missing:
+            problems.append('missing columns: %s' % ', '.join(missing))
+        unknown = [name for name in row if name not in self.known]
+        if unknown:
+            problems.append('unknown columns: %s' % ', '.join(unknown))
+        parsed, found = self.module.parse(row)
+        return parsed, problems + found
+
+
+def _getter(keys):
+    # itemgetter that always returns a tuple
+    if not keys:
+        return lambda item: ()
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda item: (item[key],)
+    return itemgetter(*keys)
+
+
+def valid_rows(records, checker, report, batch_size=1000):
+    # Filter (line, row, problem) records down to the rows worth storing,
+    # checking them batch_size at a time and recording everything else in
+    # report in input order
+    records = iter(records)
+    while True:
+        batch = list(islice(records, batch_size))
+        if not batch:
+            return
+        report.rows += len(batch)
+        readable = [(line, row) for line, row, problem in batch if problem is None]
+        parsed, failed = checker.parse([row for _, row in readable])
+        if len(readable) == len(batch) and not failed:
+            yield from parsed
+            continue
+        problems = {line: found for (line, _), found in
+                    ((readable[position], found) for position, found in failed.items())}
+        problems.update((line, [problem]) for line, _, problem in batch if problem is not None)
+        stored = {line: row for (line, _), row in zip(readable, parsed)}
+        for line, _, _ in batch:
+            if line in problems:
+                report.reject(line, problems[line])
+            else:
+                yield stored[line]
+
+
+def import_stream(storage, module, stream, format, batch_size=5000, max_errors=1000):
+    # Validate and append every record of an uploaded stream in one locked
+    # transaction; returns the ImportReport
+    report = ImportReport(module.name, format, max_errors)
+    began = time.perf_counter()
+    rows = valid_rows(read_rows(stream, format), RowChecker(module), report)
+    report.imported = storage.append_many(module.name, rows, module.fieldnames, batch_size)
+    report.seconds = time.perf_counter() - began
+    return report
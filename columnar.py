@@ -0,0 +1,765 @@
+import copy
+import json
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from collections.abc import Mapping
+from decimal import Decimal
+from itertools import accumulate, compress, islice
+from operator import add, itemgetter
+
+# Demographic head counts shared by the enrollment, results, staff and
+# scholarship tables
+COUNT_COLUMNS = ['general_male', 'general_female', 'general_transgender',
+                 'ews_male', 'ews_female', 'ews_transgender',
+                 'sc_male', 'sc_female', 'sc_transgender',
+                 'st_male', 'st_female', 'st_transgender',
+                 'obc_male', 'obc_female', 'obc_transgender',
+                 'total_male', 'total_female', 'total_transgender']
+
+# Short labels repeated across many rows; stored once each and referenced by code
+CATEGORY_COLUMNS = ['category', 'prog', 'staff_type', 'subcategory', 'year', 'month',
+                    'scholarship_scheme']
+
+INT_COLUMNS = COUNT_COLUMNS + ['rev']
+
+_INT_TYPE = 'i'
+_INT_MISSING = -2 ** 31   # slot holds a value that is not a plain int; see _odd
+_INT_MAX = 2 ** 31 - 1
+_CODE_TYPE = 'I'
+_OFFSET_TYPE = 'Q'
+_INTEGER = re.compile(r'[+-]?[0-9]+')
+_DECIMAL = re.compile(r'[0-9]+(?:\.[0-9]+)?')
+_CANONICAL_INTS = re.compile(r'(?:0|[1-9][0-9]{0,8})(?:,(?:0|[1-9][0-9]{0,8}))*')
+
+
+def to_number(value):
+    # A cell as an int for arithmetic; anything that is not a whole number
+    # (blank, 'n/a', '1.5') counts as 0
+    return int(value) if value and _INTEGER.fullmatch(value) else 0
+
+
+def to_amount(value):
+    # A sum of money as a Decimal (stored as "50000.00"); anything else
+    # counts as 0
+    return Decimal(value) if value and _DECIMAL.fullmatch(value) else 0
+
+
+def _row_getter(fieldnames):
+    # Callable giving a row's values for fieldnames as a tuple
+    if len(fieldnames) == 1:
+        name = fieldnames[0]
+        return lambda row: (row[name],)
+    return itemgetter(*fieldnames)
+
+
+def _gatherer(positions):
+    # Callable returning a tuple of a sequence's items at positions
+    if len(positions) == 1:
+        position = positions[0]
+        return lambda sequence: (sequence[position],)
+    return itemgetter(*positions)
+
+
+def _text(value):
+    if value.__class__ is str:
+        return value
+    return '' if value is None else str(value)
+
+
+def _member(positions, position):
+    # Whether position is in the ascending list positions
+    index = bisect_left(positions, position)
+    return index < len(positions) and positions[index] == position
+
+
+def _exact_ints(values):
+    # values as ints if every one of them is a canonical int of at most nine
+    # digits (so it fits the column), else None
+    if not _CANONICAL_INTS.fullmatch(','.join(values)):
+        return None
+    return list(map(int, values))
+
+
+def _as_int(value):
+    # The int to store for value, or None if it would not read back as the
+    # same string ('', '007', 'n/a', ...)
+    if value.isascii() and value.isdigit() and len(value) < 10 and (value[0] != '0' or value == '0'):
+        return int(value)
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return None
+    if str(number) != value or not _INT_MISSING < number <= _INT_MAX:
+        return None
+    return number
+
+
+class Row(Mapping):
+    # Read-only view of one row of a ColumnarTable. Behaves like the dict of
+    # strings the other tables use, so templates, filters and the CSV writer
+    # need not care; number() skips the string round trip for int columns.
+    __slots__ = ('_table', '_position')
+
+    def __init__(self, table, position):
+        self._table = table
+        self._position = position
+
+    def __getitem__(self, name):
+        return self._table.value(self._position, name)
+
+    def __iter__(self):
+        return iter(self._table.fieldnames)
+
+    def __len__(self):
+        return len(self._table.fieldnames)
+
+    def number(self, name):
+        return self._table.number(self._position, name)
+
+    def __repr__(self):
+        return 'Row(%r)' % dict(self)
+
+
+class ColumnarTable:
+    # A table kept column by column instead of as one dict per row.
+    #
+    # Count columns live in array('i'); category-like columns hold a code into
+    # a per-column list of distinct labels; everything else is a plain list
+    # of strings. Values are stored losslessly: an int column entry that is
+    # not a canonical int ('' or '05', say) is parked in a per-column dict.
+    #
+    # Indexing gives Row views, so the object can stand in for the list of
+    # row dicts the storage layer caches. Appends grow the columns in place.
+    # An edited row is not written into the columns: it goes to _patched,
+    # {position: row}, which an edit replaces rather than changes, so an
+    # edit costs one row rather than a copy of the table and a reader sees
+    # a row either wholly old or wholly new. Every read lays the patches
+    # over the columns. Deletes build a new table with without(), and
+    # snapshot() gives a reader a table that will not change under it.
+
+    def __init__(self, fieldnames, int_columns=INT_COLUMNS, category_columns=CATEGORY_COLUMNS):
+        self.fieldnames = list(fieldnames)
+        self._kinds = {}
+        self._columns = {}
+        self._odd = {}
+        self._labels = {}
+        self._codes = {}
+        for name in self.fieldnames:
+            if name in int_columns:
+                self._kinds[name] = 'int'
+                self._columns[name] = array(_INT_TYPE)
+                self._odd[name] = {}
+            elif name in category_columns:
+                self._kinds[name] = 'category'
+                self._columns[name] = array(_CODE_TYPE)
+                self._labels[name] = []
+                self._codes[name] = {}
+            else:
+                self._kinds[name] = 'str'
+                self._columns[name] = []
+        self._length = 0
+        self._patched = {}
+        self._prepare()
+
+    @classmethod
+    def from_rows(cls, fieldnames, rows, **kinds):
+        table = cls(fieldnames, **kinds)
+        table.extend(rows)
+        return table
+
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        for position in range(self._length):
+            yield Row(self, position)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [Row(self, index) for index in range(*position.indices(self._length))]
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError('row index out of range')
+        return Row(self, position)
+
+    def __setitem__(self, position, row):
+        if position < 0:
+            position += self._length
+        if not 0 <= position < self._length:
+            raise IndexError('row index out of range')
+        patched = dict(self._patched)
+        patched[position] = {name: _text(row.get(name, '')) for name in self.fieldnames}
+        self._patched = patched
+
+    def append(self, row):
+        self.extend((row,))
+
+    def extend(self, rows):
+        # Encode a chunk of rows at a time, column by column
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, 4096))
+            if not chunk:
+                break
+            self._extend_chunk(chunk)
+
+    def copy(self):
+        table = ColumnarTable.__new__(ColumnarTable)
+        table.fieldnames = list(self.fieldnames)
+        table._kinds = self._kinds
+        table._columns = {name: self._column_copy(name) for name in self._columns}
+        table._odd = {name: dict(odd) for name, odd in self._odd.items()}
+        # Labels only ever grow, and existing codes keep their meaning
+        table._labels = {name: list(labels) for name, labels in self._labels.items()}
+        table._codes = {name: dict(codes) for name, codes in self._codes.items()}
+        table._length = self._column_rows()
+        table._patched = {}
+        table._prepare()
+        # The copy is private, so patched rows go into its columns
+        for position, row in self._patched.items():
+            if position < table._length:
+                for name in self.fieldnames:
+                    table._set(name, position, row[name])
+        table.extend(self._patched[position] for position in range(table._length, self._length))
+        return table
+
+    def patched_rows(self):
+        # How many rows are read from patches rather than the columns
+        return len(self._patched)
+
+    def snapshot(self):
+        # The table as it stands. Shares the columns, which only ever grow
+        # past this length, and the patches, which an edit replaces.
+        table = copy.copy(self)
+        table._groupings = {}
+        return table
+
+    def without(self, positions):
+        # New table minus the rows at positions
+        dropped = sorted(set(positions))
+        table = self.copy()
+        kept = []
+        start = 0
+        for position in dropped + [self._length]:
+            if start < position:
+                kept.append((start, position))
+            start = position + 1
+        for name, column in table._columns.items():
+            rebuilt = column[:0]
+            for begin, end in kept:
+                rebuilt += column[begin:end]
+            table._columns[name] = rebuilt
+        gone = set(dropped)
+        for name, odd in table._odd.items():
+            table._odd[name] = {position - bisect_left(dropped, position): value
+                                for position, value in odd.items() if position not in gone}
+        table._length = self._length - len(dropped)
+        table._prepare()
+        return table
+
+    def value(self, position, name):
+        kind = self._kinds.get(name)
+        if kind is None:
+            raise KeyError(name)
+        patch = self._patched.get(position)
+        if patch is not None:
+            return patch[name]
+        stored = self._columns[name][position]
+        if kind == 'int':
+            if stored == _INT_MISSING:
+                return self._odd[name][position]
+            return str(stored)
+        if kind == 'category':
+            return self._labels[name][stored]
+        return stored
+
+    def number(self, position, name):
+        # The cell as to_number() reads it
+        if self._kinds.get(name) != 'int' or position in self._patched:
+            return to_number(self.value(position, name))
+        stored = self._columns[name][position]
+        if stored != _INT_MISSING:
+            return stored
+        return to_number(self._odd[name][position])
+
+    def groups(self, names, positions=None):
+        # {tuple of values of names: ascending positions of the rows that
+        # have them}, over positions or the whole table
+        return self._grouped(names, positions, self._patched)[0]
+
+    def totals(self, names, measures, positions=None, amounts=()):
+        # [(group values, row count, [sum of each measure])], reading cells
+        # as to_number() does, or as to_amount() for the measures in
+        # amounts. Each group has an itemgetter over its
+        # positions, so summing a measure is one C-level gather per group
+        # rather than a Python step per row.
+        patched = self._patched
+        groups, gathers = self._grouped(names, positions, patched)
+        columns = []
+        for name in measures:
+            if self._kinds.get(name) == 'int':
+                columns.append((self._padded(name), self._odd[name], name))
+            elif name in amounts:
+                values = self._strings(name, 0, None, patched)
+                columns.append(([to_amount(value) for value in values], {}, None))
+            else:
+                values = self._strings(name, 0, None, patched)
+                columns.append(([to_number(value) for value in values], {}, None))
+        results = []
+        for key, members in groups.items():
+            gather = gathers[key]
+            sums = []
+            for column, odd, name in columns:
+                total = sum(gather(column))
+                for position, value in odd.items():
+                    # That slot held the _INT_MISSING marker; use its real value
+                    if _member(members, position):
+                        total += to_number(value) - _INT_MISSING
+                if name is not None:
+                    for position, row in patched.items():
+                        # The column still has the value from before the edit
+                        if _member(members, position):
+                            stored = column[position]
+                            if stored == _INT_MISSING:
+                                stored = to_number(odd[position])
+                            total += to_number(row[name]) - stored
+                sums.append(total)
+            results.append((key, len(members), sums))
+        return results
+
+    def _grouped(self, names, positions, patched):
+        # Each column is reduced to int codes and the codes combined into one
+        # group id per row, so rows are bucketed in a single pass. Whole-table
+        # groupings are kept until the table grows or is edited.
+        names = tuple(names)
+        if positions is None:
+            memo = self._groupings.get(names)
+            if memo is not None and memo[0] == self._length and memo[1] is patched:
+                return memo[2]
+        rows = range(self._length) if positions is None else positions
+        if not names:
+            groups = {(): list(rows)} if len(rows) else {}
+        else:
+            ids, sizes, labels = None, [], []
+            for name in names:
+                codes, column_labels = self._coded(name, patched)
+                sizes.append(len(column_labels))
+                labels.append(column_labels)
+                ids = codes if ids is None else list(map(add, map(len(column_labels).__mul__, ids), codes))
+            buckets = defaultdict(list)
+            for position, group in zip(rows, map(ids.__getitem__, rows)):
+                buckets[group].append(position)
+
+            groups = {}
+            for group, members in buckets.items():
+                key = []
+                for size, column_labels in zip(reversed(sizes), reversed(labels)):
+                    group, code = divmod(group, size)
+                    key.append(column_labels[code])
+                groups[tuple(reversed(key))] = members
+        grouped = groups, {key: _gatherer(members) for key, members in groups.items()}
+        if positions is None:
+            self._groupings[names] = (self._length, patched, grouped)
+        return grouped
+
+    def column(self, name):
+        # The raw typed column for an int column (treat as read-only). Rows
+        # edited since the table was built still hold their old values.
+        if self._kinds.get(name) != 'int':
+            raise KeyError(name)
+        return self._columns[name]
+
+    def numbers(self, name):
+        # (int per row, {position: text}) for an int column. The positions
+        # listed hold text that is not a plain int (blank, '007', 'n/a') and
+        # are 0 in the ints; the caller decides what they mean.
+        if self._kinds.get(name) != 'int':
+            raise KeyError(name)
+        values = self._padded(name, private=True)
+        odd = dict(self._odd[name])
+        for position in odd:
+            values[position] = 0
+        for position, row in self._patched.items():
+            number = _as_int(row[name])
+            if number is None:
+                values[position] = 0
+                odd[position] = row[name]
+            else:
+                values[position] = number
+                odd.pop(position, None)
+        return values, odd
+
+    def strings(self, name, start=0, stop=None):
+        # Values of a column as strings, in row order, for rows start..stop
+        return self._strings(name, start, stop, self._patched)
+
+    def strings_at(self, name, positions):
+        # strings() for just the rows at positions
+        if name not in self._kinds:
+            return [''] * len(positions)
+        column = self._columns[name]
+        patched = self._patched
+        if not patched:
+            return self._as_strings(name, [column[position] for position in positions], positions)
+        stored = [position for position in positions if position not in patched]
+        values = iter(self._as_strings(name, [column[position] for position in stored], stored))
+        return [patched[position][name] if position in patched else next(values)
+                for position in positions]
+
+    def tuples(self, names, start=0, stop=None):
+        # Rows start..stop as tuples of the named columns' strings, built a
+        # column at a time against one set of patches
+        patched = self._patched
+        return list(zip(*[self._strings(name, start, stop, patched) for name in names]))
+
+    def _strings(self, name, start, stop, patched):
+        stop = self._length if stop is None else min(stop, self._length)
+        if name not in self._kinds:
+            return [''] * max(0, stop - start)
+        values = self._as_strings(name, self._columns[name][start:stop], range(start, stop))
+        if len(values) < stop - start:
+            # Rows appended past the columns (see MappedTable) are all patches
+            values.extend([''] * (stop - start - len(values)))
+        if stop - start < len(patched):
+            for position in range(start, stop):
+                row = patched.get(position)
+                if row is not None:
+                    values[position - start] = row[name]
+        else:
+            for position, row in patched.items():
+                if start <= position < stop:
+                    values[position - start] = row[name]
+        return values
+
+    def _as_strings(self, name, stored, positions):
+        # A column's stored values for the rows at positions, as strings
+        kind = self._kinds[name]
+        if kind == 'int':
+            if _INT_MISSING not in stored:
+                return list(map(str, stored))
+            odd = self._odd[name]
+            return [odd[position] if value == _INT_MISSING else str(value)
+                    for position, value in zip(positions, stored)]
+        if kind == 'category':
+            return list(map(self._labels[name].__getitem__, stored))
+        return list(stored)
+
+    def _coded(self, name, patched):
+        # (int code per row, label for each code) for any column
+        if self._kinds.get(name) == 'category':
+            codes, labels = self._columns[name], self._labels[name]
+            if patched:
+                codes, labels = self._padded(name, private=True), list(labels)
+                known = dict(self._codes[name])
+                for position, row in patched.items():
+                    value = row[name]
+                    if value not in known:
+                        known[value] = len(labels)
+                        labels.append(value)
+                    codes[position] = known[value]
+            return codes, labels
+        values = self._strings(name, 0, None, patched)
+        codes, labels = {}, []
+        for value in values:
+            if value not in codes:
+                codes[value] = len(labels)
+                labels.append(value)
+        return [codes[value] for value in values], labels
+
+    def matching(self, filters):
+        # Positions of rows whose columns equal every value in filters
+        patched = self._patched
+        positions = self._matching_columns(filters)
+        if not patched:
+            return positions
+        edited = [position for position, row in patched.items()
+                  if all(row.get(name, '') == wanted for name, wanted in filters.items())]
+        return sorted([position for position in positions if position not in patched] + edited)
+
+    def _matching_columns(self, filters):
+        # matching() as the columns have it, patches aside
+        positions = None
+        for name, wanted in filters.items():
+            kind = self._kinds.get(name)
+            if kind is None:
+                hits = range(self._length) if wanted == '' else []
+            elif kind == 'category':
+                code = self._codes[name].get(wanted)
+                hits = [] if code is None else list(compress(range(self._length),
+                                                              map(code.__eq__, self._columns[name])))
+            elif kind == 'int':
+                number = _as_int(wanted)
+                if number is None:
+                    hits = [p for p, value in self._odd[name].items() if value == wanted]
+                    hits.sort()
+                else:
+                    hits = [p for p, value in enumerate(self._columns[name]) if value == number]
+            else:
+                hits = [p for p, value in enumerate(self._columns[name]) if value == wanted]
+            if positions is None:
+                positions = hits
+            else:
+                wanted_positions = set(hits)
+                positions = [p for p in positions if p in wanted_positions]
+            if not positions:
+                break
+        return list(range(self._length)) if positions is None else positions
+
+    def _column_copy(self, name):
+        # A private, writable copy of one stored column
+        return self._columns[name][:]
+
+    def _column_rows(self):
+        # How many rows the columns hold; any past that are patches
+        return self._length
+
+    def _padded(self, name, private=False):
+        # An int or category column, copied if private, with a 0 for each
+        # row past the columns
+        column = self._columns[name]
+        missing = self._length - len(column)
+        if private or missing:
+            column = self._column_copy(name)
+            column.extend(bytes(missing))
+        return column
+
+    def _prepare(self):
+        # Per-column state that append() would otherwise look up per cell
+        self._layout = [(name, self._kinds[name], self._columns[name],
+                         self._odd.get(name, self._codes.get(name)))
+                        for name in self.fieldnames]
+        self._getter = _row_getter(self.fieldnames)
+        self._groupings = {}
+
+    def _extend_chunk(self, rows):
+        start = self._length
+        try:
+            # Transpose in one go when every row has every column
+            columns = zip(*map(self._getter, rows))
+        except KeyError:
+            columns = ([row.get(name) for row in rows] for name in self.fieldnames)
+        for (name, kind, column, extra), values in zip(self._layout, columns):
+            values = list(values)
+            if set(map(type, values)) - {str}:
+                values = [_text(value) for value in values]
+            if kind == 'int':
+                numbers = _exact_ints(values)
+                if numbers is not None:
+                    column.fromlist(numbers)
+                    continue
+                for offset, value in enumerate(values):
+                    number = _as_int(value)
+                    if number is None:
+                        column.append(_INT_MISSING)
+                        extra[start + offset] = value
+                    else:
+                        column.append(number)
+            elif kind == 'category':
+                column.extend([extra[value] if value in extra else self._new_label(name, value)
+                               for value in values])
+            else:
+                column.extend(values)
+        self._length = start + len(rows)
+
+    def _new_label(self, name, value):
+        code = self._codes[name][value] = len(self._labels[name])
+        self._labels[name].append(value)
+        return code
+
+    def _set(self, name, position, value):
+        kind = self._kinds[name]
+        value = _text(value)
+        if kind == 'int':
+            number = _as_int(value)
+            if number is None:
+                self._columns[name][position] = _INT_MISSING
+                self._odd[name][position] = value
+            else:
+                self._columns[name][position] = number
+                self._odd[name].pop(position, None)
+        elif kind == 'category':
+            codes = self._codes[name]
+            self._columns[name][position] = (codes[value] if value in codes
+                                             else self._new_label(name, value))
+        else:
+            self._columns[name][position] = value
+
+
+# Images (see write_image) start with this, then the header's offset and
+# length; the arrays are in the writing machine's byte order
+IMAGE_MAGIC = b'IDMSCOL1'
+_IMAGE_PREFIX = struct.Struct('<8sQQ')
+_IMAGE_ALIGN = 8
+
+
+def write_image(source, file, **meta):
+    # Write a ColumnarTable to file as one flat image that map_image() can
+    # use in place: each int and category column as its raw array, each
+    # text column as its UTF-8 values separated by NULs plus the byte
+    # offset each value starts at, and a JSON header with the labels, odd
+    # values, layout and meta at the end
+    if source._patched:
+        # An image holds columns only
+        source = source.copy()
+    file.write(_IMAGE_PREFIX.pack(IMAGE_MAGIC, 0, 0))
+    columns = {}
+    for name in source.fieldnames:
+        kind = source._kinds[name]
+        column = source._columns[name]
+        spec = columns[name] = {'kind': kind}
+        if kind == 'str':
+            values = column[:]
+            text = '\x00'.join(values)
+            if text.isascii():
+                lengths = map(len, values)
+            else:
+                lengths = [len(value.encode('utf-8')) for value in values]
+            starts = array(_OFFSET_TYPE, accumulate((length + 1 for length in lengths), initial=0))
+            # With no NUL inside any value a run of values is one split()
+            spec['split'] = text.count('\x00') == max(len(values) - 1, 0)
+            spec['starts'] = _write_block(file, starts)
+            spec['data'] = _write_block(file, text.encode('utf-8'))
+        else:
+            spec['data'] = _write_block(file, column)
+            if kind == 'int':
+                spec['odd'] = source._odd[name]
+            else:
+                spec['labels'] = source._labels[name]
+    header = json.dumps(dict(meta, fieldnames=source.fieldnames, length=len(source), columns=columns,
+                             byteorder=sys.byteorder)).encode('utf-8')
+    offset = file.tell()
+    file.write(header)
+    file.seek(0)
+    file.write(_IMAGE_PREFIX.pack(IMAGE_MAGIC, offset, len(header)))
+
+
+def read_image_header(buffer):
+    # The header of an image in buffer, or None if it is not one this
+    # machine can map
+    if len(buffer) < _IMAGE_PREFIX.size:
+        return None
+    magic, offset, length = _IMAGE_PREFIX.unpack_from(buffer)
+    if magic != IMAGE_MAGIC or offset + length > len(buffer):
+        return None
+    header = json.loads(bytes(buffer[offset:offset + length]))
+    return header if header['byteorder'] == sys.byteorder else None
+
+
+def _write_block(file, data):
+    # Write a buffer at the next aligned offset; returns [offset, bytes]
+    padding = -file.tell() % _IMAGE_ALIGN
+    file.write(b'\x00' * padding)
+    offset = file.tell()
+    file.write(data)
+    return [offset, file.tell() - offset]
+
+
+class MappedStrings:
+    # A text column read straight out of an image: value i is the UTF-8
+    # between starts[i] and the NUL before starts[i + 1]
+    __slots__ = ('_data', '_starts', '_split')
+
+    def __init__(self, data, starts, split):
+        self._data = data
+        self._starts = starts
+        self._split = split
+
+    def __len__(self):
+        return len(self._starts) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1 or not self._split:
+                return [self[position] for position in range(start, stop, step)]
+            if start >= stop:
+                return []
+            return str(self._data[self._starts[start]:self._starts[stop] - 1],
+                       'utf-8').split('\x00')
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('row index out of range')
+        return str(self._data[self._starts[index]:self._starts[index + 1] - 1], 'utf-8')
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+class MappedTable(ColumnarTable):
+    # A ColumnarTable whose columns are views into an image (a buffer such
+    # as an mmap), so processes mapping the same file share its pages
+    # instead of each holding a parsed copy.
+    #
+    # Reads work as on any ColumnarTable. The image is never written to:
+    # edited rows are patches as on any ColumnarTable, and so are appended
+    # rows, at the positions past the image's. copy(), without() and
+    # numbers() return private data, and snapshot() an independent table
+    # over the same image.
+
+    def __init__(self, buffer, header):
+        self.buffer = buffer
+        self.header = header
+        self.fieldnames = list(header['fieldnames'])
+        self._kinds = {}
+        self._columns = {}
+        self._odd = {}
+        self._labels = {}
+        self._codes = {}
+        view = memoryview(buffer)
+        for name in self.fieldnames:
+            spec = header['columns'][name]
+            kind = self._kinds[name] = spec['kind']
+            offset, size = spec['data']
+            data = view[offset:offset + size]
+            if kind == 'int':
+                self._columns[name] = data.cast(_INT_TYPE)
+                self._odd[name] = {int(position): value for position, value in spec['odd'].items()}
+            elif kind == 'category':
+                self._columns[name] = data.cast(_CODE_TYPE)
+                self._labels[name] = list(spec['labels'])
+                self._codes[name] = {label: code for code, label in enumerate(spec['labels'])}
+            else:
+                offset, size = spec['starts']
+                self._columns[name] = MappedStrings(data, view[offset:offset + size].cast(_OFFSET_TYPE),
+                                                    spec['split'])
+        self._length = header['length']
+        self._patched = {}
+        self._prepare()
+
+    def extend(self, rows):
+        patched = dict(self._patched)
+        length = self._length
+        for row in rows:
+            patched[length] = {name: _text(row.get(name, '')) for name in self.fieldnames}
+            length += 1
+        # Patches first, so a reader that sees the new length finds the rows
+        self._patched = patched
+        self._length = length
+
+    def _column_copy(self, name):
+        column = self._columns[name]
+        if isinstance(column, memoryview):
+            copied = array(column.format)
+            copied.frombytes(column.cast('B'))
+            return copied
+        return list(column) if isinstance(column, MappedStrings) else column[:]
+
+    def _column_rows(self):
+        return self.header['length']
+
+
+def record_values(records, names):
+    # [[record.get(name, '') for name in names] for record in records], but
+    # gathered a column at a time when the records are Rows of one table
+    first = records[0] if records else None
+    if type(first) is Row and all(type(record) is Row and record._table is first._table
+                                  for record in records):
+        positions = [record._position for record in records]
+        return list(map(list, zip(*[first._table.strings_at(name, positions) for name in names])))
+    return [[record.get(name, '') for name in names] for record in records]
@@ -0,0 +1,140 @@
+import time
+from itertools import compress, count
+from operator import itemgetter, ne
+
+from columnar import ColumnarTable
+from schema import MODULES, STORED_NUMBERS
+from storage import map_in_processes
+
+
+class TableCheck:
+    # Outcome of checking one table's total columns against their parts.
+    #
+    # wrong lists the rows whose totals disagree, each as a dict with the
+    # record's id and rev, {total: [stored, sum of parts]} and the row as
+    # it should be stored. unreadable lists cells a total depends on that
+    # are not whole numbers; those rows are left for a person to fix.
+    # repaired and skipped are filled in by repair().
+
+    def __init__(self, table):
+        self.table = table
+        self.rows = 0
+        self.wrong = []
+        self.unreadable = []
+        self.seconds = 0.0
+        self.repaired = 0
+        self.skipped = 0
+
+    def to_dict(self, limit=None):
+        return {
+            'table': self.table,
+            'rows': self.rows,
+            'wrong': len(self.wrong),
+            'unreadable': len(self.unreadable),
+            'wrong_rows': [{'id': entry['id'], 'totals': entry['totals']}
+                           for entry in self.wrong[:limit]],
+            'unreadable_cells': self.unreadable[:limit],
+            'repaired': self.repaired,
+            'skipped': self.skipped,
+            'seconds': round(self.seconds, 3),
+        }
+
+
+def _numbers(rows, name):
+    # (int per row, {position: text}) for one column; the positions listed
+    # hold text other than a plain whole number and are 0 in the ints
+    if isinstance(rows, ColumnarTable):
+        return rows.numbers(name)
+    try:
+        texts = list(map(itemgetter(name), rows))
+    except KeyError:
+        texts = [row.get(name, '') for row in rows]
+    joined = ','.join(texts)
+    if STORED_NUMBERS.fullmatch(joined) and joined.count(',') == len(texts) - 1:
+        return list(map(int, texts)), {}
+    values, odd = [], {}
+    for position, text in enumerate(texts):
+        if text.isdigit() and text.isascii() and (text[0] != '0' or text == '0'):
+            values.append(int(text))
+        else:
+            values.append(0)
+            odd[position] = text
+    return values, odd
+
+
+def check_rows(module, rows):
+    # TableCheck for a table's rows (a ColumnarTable or a list of row dicts).
+    # Each column a total involves is turned into a list of ints once, and
+    # every rule is then checked for all rows at a time; only the rows that
+    # fail are looked at one by one.
+    check = TableCheck(module.name)
+    check.rows = len(rows)
+    if not module.totals or not rows:
+        return check
+
+    columns = {}
+    unreadable = {}  # position -> [(column, text)]
+    for name in dict.fromkeys(name for total, parts in module.totals for name in [total] + parts):
+        values, odd = _numbers(rows, name)
+        for position, text in odd.items():
+            if not text:
+                continue
+            if text.isdigit() and text.isascii():
+                values[position] = int(text)
+            else:
+                unreadable.setdefault(position, []).append((name, text))
+        if values and min(values) < 0:
+            for position in compress(count(), (value < 0 for value in values)):
+                unreadable.setdefault(position, []).append((name, str(values[position])))
+        columns[name] = values
+
+    wrong = {}  # position -> {total: [stored, expected]}
+    for total, parts in module.totals:
+        expected = list(map(sum, zip(*[columns[name] for name in parts])))
+        stored = columns[total]
+        for position in compress(count(), map(ne, expected, stored)):
+            if position not in unreadable:
+                wrong.setdefault(position, {})[total] = [stored[position], expected[position]]
+
+    for position in sorted(wrong):
+        row = rows[position]
+        data = {name: row.get(name, '') for name in module.fieldnames}
+        for total, (_, expected) in wrong[position].items():
+            data[total] = str(expected)
+        check.wrong.append({'id': row.get('id', ''), 'rev': row.get('rev', ''),
+                            'totals': wrong[position], 'row': data})
+    for position in sorted(unreadable):
+        record_id = rows[position].get('id', '')
+        check.unreadable.extend({'id': record_id, 'column': name, 'value': text}
+                                for name, text in unreadable[position])
+    return check
+
+
+def check_table(storage, table):
+    began = time.perf_counter()
+    check = check_rows(MODULES[table], storage.scan(table))
+    check.seconds = time.perf_counter() - began
+    return check
+
+
+def check_tables(storage, tables, jobs=1):
+    # TableCheck for each of tables. With jobs > 1 the tables are split
+    # across that many worker processes, each reading its tables (one file
+    # per table with the CSV backend) through its own storage; queued
+    # writes are flushed first so the workers see them.
+    tables = list(tables)
+    if jobs <= 1 or len(tables) <= 1:
+        return [check_table(storage, table) for table in tables]
+    return map_in_processes(storage, check_table, tables, jobs)
+
+
+def repair(storage, check):
+    # Store the worked-out totals for every row in check.wrong, in one
+    # transaction. A row edited since it was checked has a newer rev and is
+    # skipped rather than overwritten.
+    module = MODULES[check.table]
+    results = storage.update_many(check.table, [(entry['id'], entry['row'], entry['rev'])
+                                                for entry in check.wrong], module.fieldnames)
+    check.repaired = sum(1 for result in results if result is True)
+    check.skipped = len(results) - check.repaired
+    return check
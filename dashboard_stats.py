@@ -0,0 +1,146 @@
+import threading
+from collections import deque
+
+
+def _int_field(record, name):
+    return int(record.get(name, 0) or 0)
+
+
+def _headcount(record):
+    # Partial sums are kept on a bad value, matching the old per-request loop
+    count = 0
+    try:
+        count += _int_field(record, 'total_male')
+        count += _int_field(record, 'total_female')
+        count += _int_field(record, 'total_transgender')
+    except (ValueError, KeyError):
+        pass
+    return count
+
+
+def _teaching_headcount(record):
+    if record.get('staff_type', '').lower() != 'teaching':
+        return 0
+    return _headcount(record)
+
+
+def _one(record):
+    return 1
+
+
+# Table -> (stat name, contribution of a single row to that stat)
+STAT_SOURCES = {
+    'student_enrollment': ('total_students', _headcount),
+    'staff_info': ('faculty_members', _teaching_headcount),
+    'programmes': ('active_programmes', _one),
+    'departments': ('departments', _one),
+}
+
+
+class DashboardStats:
+    # Home-page totals kept up to date by deltas.
+    #
+    # Each source table's total is computed once and tagged with the storage
+    # signature (file stat or data version) it was computed against. Writes
+    # made through the app report the rows they added or removed along with
+    # the signatures before and after the write, and the total is adjusted in
+    # place. If the table was
+    # changed by anything else the signatures no longer line up and the next
+    # read falls back to a full recompute of that one table.
+    #
+    # Writes still queued (write-behind) are counted by what each one adds
+    # or takes away, noted by queue() in the order they are queued. When a
+    # batch lands, apply() (or land(), if the rows were already there) drops
+    # its ops' notes in the same step as it adjusts the stored total, so a
+    # queued write is never counted twice or not at all. Notes are matched
+    # by op, so landing a batch again after a retry drops nothing more.
+
+    def __init__(self, sources=None):
+        self.sources = STAT_SOURCES if sources is None else sources
+        self.recomputes = 0
+        self._totals = {}  # table -> (signature, value)
+        self._queued = {}  # table -> [deque of (op, delta), sum of the deltas]
+        self._lock = threading.Lock()
+
+    def get(self, load_rows, signature_of):
+        # load_rows(table) must be the stored rows, without queued writes
+        stats = {}
+        for table, (stat_name, contribution) in self.sources.items():
+            stats[stat_name] = self._value(table, contribution, load_rows, signature_of)
+        return stats
+
+    def change(self, table, old=None, new=None):
+        # What replacing row old with row new (either may be None) does to
+        # table's total
+        if table not in self.sources:
+            return 0
+        contribution = self.sources[table][1]
+        return (contribution(new) if new is not None else 0) - \
+            (contribution(old) if old is not None else 0)
+
+    def queue(self, table, op, delta):
+        # Note a queued op and its delta (see change())
+        if table not in self.sources:
+            return
+        with self._lock:
+            queued = self._queued.setdefault(table, [deque(), 0])
+            queued[0].append((op, delta))
+            queued[1] += delta
+
+    def land(self, table, ops):
+        # ops, the oldest queued ones in order, are now part of the stored table
+        with self._lock:
+            self._land(table, ops)
+
+    def apply(self, table, before, after, added=(), removed=(), landed=()):
+        # landed lists the queued ops this change stores (see land())
+        if table not in self.sources:
+            return
+        contribution = self.sources[table][1]
+        with self._lock:
+            self._land(table, landed)
+            current = self._totals.get(table)
+            if current is None or before is None or current[0] != before:
+                # We never saw the pre-write state; recompute on next read
+                self._totals.pop(table, None)
+                return
+            value = current[1]
+            for row in added:
+                value += contribution(row)
+            for row in removed:
+                value -= contribution(row)
+            self._totals[table] = (after, value)
+
+    def invalidate(self, table=None):
+        with self._lock:
+            if table is None:
+                self._totals.clear()
+            else:
+                self._totals.pop(table, None)
+
+    def _land(self, table, ops):
+        # Called with the lock held
+        queued = self._queued.get(table)
+        if queued is None:
+            return
+        notes = queued[0]
+        for op in ops:
+            if notes and notes[0][0] is op:
+                queued[1] -= notes.popleft()[1]
+
+    def _value(self, table, contribution, load_rows, signature_of):
+        signature = signature_of(table)
+        with self._lock:
+            current = self._totals.get(table)
+            if current is not None and current[0] == signature:
+                return current[1] + self._queued.get(table, (None, 0))[1]
+        if signature is None:
+            value = 0
+        else:
+            value = sum(contribution(row) for row in load_rows(table))
+            self.recomputes += 1
+        with self._lock:
+            # Keep the result only if the table stayed put while we summed it
+            if signature_of(table) == signature:
+                self._totals[table] = (signature, value)
+            return value + self._queued.get(table, (None, 0))[1]
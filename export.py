@@ -0,0 +1,102 @@
+import csv
+import hashlib
+import io
+import json
+import zipfile
+import zlib
+from json.encoder import encode_basestring_ascii
+
+# Per-module export formats and their content types
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+
+# The all-modules bundle: JSON lines tagged with their table, or a zip of
+# one CSV per module
+BUNDLE_FORMATS = {
+    'jsonl': 'application/x-ndjson',
+    'zip': 'application/zip',
+}
+
+
+def entity_tag(*parts):
+    # Strong ETag for one representation of some tables' data: parts hold
+    # the tables' signatures plus the format and encoding
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()[:24]
+
+
+def csv_chunks(chunks, fieldnames):
+    # UTF-8 CSV for a stream of row-tuple chunks, header first
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fieldnames)
+    yield _drain(buffer)
+    for rows in chunks:
+        writer.writerows(rows)
+        yield _drain(buffer)
+
+
+def jsonl_chunks(chunks, fieldnames, table=None):
+    # One JSON object per row. Cells are always strings, so each line is a
+    # fixed template filled with the cells' JSON encodings; with table set,
+    # lines read {"table": ..., "record": {...}}.
+    template = '{%s}' % ','.join('%s:%%s' % json.dumps(name).replace('%', '%%')
+                                 for name in fieldnames)
+    if table is not None:
+        template = '{"table":%s,"record":%s}' % (json.dumps(table).replace('%', '%%'), template)
+    template += '\n'
+    for rows in chunks:
+        yield ''.join([template % tuple(map(encode_basestring_ascii, row))
+                       for row in rows]).encode('utf-8')
+
+
+def gzipped(chunks, level=6):
+    # gzip content encoding over a byte stream, compressed as it goes
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def zip_chunks(members):
+    # A zip archive of (member name, byte chunks) pairs, handed out as it is
+    # written; sizes and CRCs go in data descriptors after each member
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, chunks in members:
+            with archive.open(name, 'w', force_zip64=True) as member:
+                for chunk in chunks:
+                    member.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+    yield sink.drain()
+
+
+def _drain(buffer):
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text.encode('utf-8')
+
+
+class _Sink:
+    # Write-only, unseekable file that zipfile writes into and zip_chunks
+    # empties after every member chunk
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
@@ -0,0 +1,52 @@
+import threading
+from collections import OrderedDict
+
+
+class FragmentCache:
+    # Rendered pieces of module pages, keyed by what was asked for and tagged
+    # with the version of the table they were rendered from.
+    #
+    # A lookup under any other version misses, so every write to a table,
+    # from this process or through another one, retires its fragments; the
+    # next render replaces the stale entry in place. Entries are evicted
+    # least-recently-used first once there are more than max_entries or
+    # their sizes add up to more than max_bytes.
+
+    def __init__(self, max_entries=256, max_bytes=64 * 2 ** 20):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (version, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def put(self, key, version, value, size):
+        with self._lock:
+            self._discard(key)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (version, value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
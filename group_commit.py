@@ -0,0 +1,72 @@
+import threading
+
+
+class _Pending:
+    __slots__ = ('op', 'result', 'error', 'finished', 'wake')
+
+    def __init__(self, op):
+        self.op = op
+        self.result = None
+        self.error = None
+        self.finished = False
+        self.wake = threading.Event()
+
+
+class GroupCommitter:
+    # Batches concurrent writes to the same table into one commit.
+    #
+    # The first thread to submit for a table becomes its leader and commits
+    # everything queued so far with a single call to apply_batch (one lock,
+    # one write and one fsync per file). Threads that arrive meanwhile queue
+    # up behind it; when the leader finishes it wakes the next waiter, which
+    # then commits the whole backlog that built up during the previous batch.
+    #
+    # apply_batch(filepath, ops) must return one result per op, in order.
+
+    def __init__(self, apply_batch):
+        self.apply_batch = apply_batch
+        self.batches = 0
+        self.ops = 0
+        self._pending = {}  # filepath -> [_Pending]
+        self._leaders = set()
+        self._guard = threading.Lock()
+
+    def submit(self, filepath, op):
+        item = _Pending(op)
+        with self._guard:
+            self._pending.setdefault(filepath, []).append(item)
+            leader = filepath not in self._leaders
+            if leader:
+                self._leaders.add(filepath)
+        if not leader:
+            item.wake.wait()
+        if not item.finished:
+            # Either we arrived first or the previous leader handed over to us
+            self._commit(filepath)
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def _commit(self, filepath):
+        with self._guard:
+            batch = self._pending.pop(filepath, [])
+        error = None
+        try:
+            results = self.apply_batch(filepath, [item.op for item in batch])
+        except Exception as exc:
+            results, error = [None] * len(batch), exc
+
+        with self._guard:
+            self.batches += 1
+            self.ops += len(batch)
+            waiting = self._pending.get(filepath)
+            if waiting:
+                waiting[0].wake.set()
+            else:
+                self._leaders.discard(filepath)
+
+        for item, result in zip(batch, results):
+            item.result = result
+            item.error = error
+            item.finished = True
+            item.wake.set()
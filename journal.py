@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+
+from metrics import registry
+
+JOURNAL_SUFFIX = '.journal'
+
+
+def journal_path(filepath):
+    return filepath + JOURNAL_SUFFIX
+
+
+def replay(rows, ops):
+    # Apply journal entries, in order, to the rows parsed from the base CSV.
+    # Entries address rows by their id; deleted rows are tombstoned and
+    # dropped in one pass at the end so a long journal stays O(rows + ops).
+    positions = None
+    for op in ops:
+        if 'index' in op:
+            # Entry from before rows had ids: positional
+            rows = [row for row in rows if row is not None]
+            positions = None
+            index = op['index']
+            if 0 <= index < len(rows):
+                if op['op'] == 'update':
+                    rows[index] = op['row']
+                elif op['op'] == 'delete':
+                    rows.pop(index)
+            continue
+        if positions is None:
+            positions = {row.get('id'): position for position, row in enumerate(rows) if row is not None}
+        position = positions.get(op['id'])
+        if position is None:
+            continue
+        if op['op'] == 'update':
+            rows[position] = op['row']
+        elif op['op'] == 'delete':
+            rows[position] = None
+            del positions[op['id']]
+    return [row for row in rows if row is not None]
+
+
+class EditJournal:
+    # Per-table append-only log of edits and deletes.
+    #
+    # Instead of rewriting a whole CSV to change one row, edits and deletes
+    # append a one-line JSON entry to "<table>.csv.journal".
+    # Readers parse the base CSV and replay the journal on top of it. Once a
+    # journal grows past max_entries or max_bytes it is compacted in the
+    # background: the merged rows are written to a temp file that replaces
+    # the CSV, and the journal is removed.
+    #
+    # The first line of every journal names the inode of the base file it
+    # applies to. Compaction always installs a new inode, so a journal left
+    # behind by a crash between the replace and the unlink is recognised as
+    # already folded in and ignored rather than applied twice.
+    #
+    # Writes to the journal and compaction run under the table's exclusive
+    # lock (see TableLocks); callers that already hold it can nest freely.
+
+    def __init__(self, locks, max_entries=500, max_bytes=1024 * 1024, fsync=True):
+        self.locks = locks
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.compactions = 0
+        self._counts = {}  # filepath -> entries in the live journal
+        self._compacting = set()
+        self._guard = threading.Lock()
+
+    def read_ops(self, filepath):
+        try:
+            base_inode = os.stat(filepath).st_ino
+            file = open(journal_path(filepath), 'r', encoding='utf-8')
+        except FileNotFoundError:
+            return []
+        with file:
+            if self._header_inode(file.readline()) != base_inode:
+                return []
+            ops = []
+            for line in file:
+                # A torn last line from a crash mid-append is dropped
+                if not line.endswith('\n'):
+                    break
+                ops.append(json.loads(line))
+        self._counts[filepath] = len(ops)
+        return ops
+
+    def record(self, filepath, ops):
+        # Append entries with one write (and one fsync); returns True when the
+        # journal is due for compaction
+        path = journal_path(filepath)
+        lines = [json.dumps(op, separators=(',', ':')) + '\n' for op in ops]
+        with self.locks.exclusive(filepath):
+            base_inode = os.stat(filepath).st_ino
+            fresh = not self._is_current(path, base_inode)
+            with open(path, 'w' if fresh else 'a', encoding='utf-8') as file:
+                if fresh:
+                    lines.insert(0, json.dumps({'base_inode': base_inode}) + '\n')
+                    self._counts[filepath] = 0
+                text = ''.join(lines)
+                file.write(text)
+                file.flush()
+                if self.fsync:
+                    os.fsync(file.fileno())
+                size = file.tell()
+            registry.count('idms_bytes_written_total', len(text.encode('utf-8')),
+                           table=os.path.basename(filepath)[:-len('.csv')])
+            count = self._counts.get(filepath)
+            if count is None:
+                # Another worker may have started this journal
+                count = len(self.read_ops(filepath))
+            else:
+                count += len(ops)
+            self._counts[filepath] = count
+        return count >= self.max_entries or size >= self.max_bytes
+
+    def discard(self, filepath):
+        # Forget the journal after the base file has been fully rewritten
+        with self.locks.exclusive(filepath):
+            try:
+                os.remove(journal_path(filepath))
+            except FileNotFoundError:
+                pass
+            self._counts.pop(filepath, None)
+
+    def compact(self, filepath, write_rows, load_rows):
+        # Fold the journal into the base file. write_rows must install the
+        # merged rows with a new inode (temp file + os.replace).
+        with self.locks.exclusive(filepath):
+            if not os.path.exists(journal_path(filepath)):
+                return False
+            write_rows(filepath, load_rows(filepath))
+            self.discard(filepath)
+            self.compactions += 1
+            return True
+
+    def compact_in_background(self, filepath, write_rows, load_rows):
+        with self._guard:
+            if filepath in self._compacting:
+                return
+            self._compacting.add(filepath)
+
+        def run():
+            try:
+                self.compact(filepath, write_rows, load_rows)
+            finally:
+                with self._guard:
+                    self._compacting.discard(filepath)
+
+        threading.Thread(target=run, name='journal-compact', daemon=True).start()
+
+    def _is_current(self, path, base_inode):
+        try:
+            with open(path, 'r', encoding='utf-8') as file:
+                return self._header_inode(file.readline()) == base_inode
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _header_inode(line):
+        try:
+            return json.loads(line)['base_inode']
+        except (ValueError, KeyError, TypeError):
+            return None
@@ -0,0 +1,155 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    'idms_requests_total': ('counter', 'Requests handled, by endpoint, method and status.'),
+    'idms_request_duration_seconds': ('histogram', 'Time from before_request to after_request.'),
+    'idms_phase_duration_seconds': ('histogram', 'Time spent in each instrumented phase.'),
+    'idms_rows_parsed_total': ('counter', 'Rows parsed from CSV files or fetched from SQLite.'),
+    'idms_bytes_read_total': ('counter', 'Bytes of CSV and journal files parsed.'),
+    'idms_bytes_written_total': ('counter', 'Bytes written to CSV and journal files.'),
+    'idms_cache_hits_total': ('counter', 'Cache lookups answered from the cache.'),
+    'idms_cache_misses_total': ('counter', 'Cache lookups that had to load or compute.'),
+    'idms_cache_hit_ratio': ('gauge', 'Hits over lookups since the process started.'),
+}
+
+
+class Metrics:
+    # Counters and latency histograms for one process, written out in the
+    # Prometheus text format by render().
+    #
+    # Series are keyed by metric name plus a sorted tuple of label pairs.
+    # phase() times a named stretch of work into idms_phase_duration_seconds
+    # and, on a thread that is inside begin_request/end_request, into that
+    # request's breakdown as well. Phases may nest (a CSV parse inside a
+    # page read), so a breakdown's parts can add up to more than the whole.
+    # With enabled False every call returns straight away.
+
+    def __init__(self, buckets=LATENCY_BUCKETS, enabled=True):
+        self.buckets = buckets
+        self.enabled = enabled
+        self._counters = {}    # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [count per bucket..., +Inf, sum]
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def count(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def total(self, name):
+        # A counter summed over all its labels
+        with self._lock:
+            return sum(value for (counter, _), value in self._counters.items() if counter == name)
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._histograms.get(key)
+            if series is None:
+                series = self._histograms[key] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += seconds
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - began
+            self.observe('idms_phase_duration_seconds', elapsed, phase=name)
+            phases = getattr(self._local, 'phases', None)
+            if phases is not None:
+                entry = phases.get(name)
+                phases[name] = (elapsed, 1) if entry is None else (entry[0] + elapsed, entry[1] + 1)
+
+    def begin_request(self):
+        self._local.phases = {}
+        self._local.began = time.perf_counter()
+
+    def end_request(self, endpoint, method, status):
+        # Record the request; returns (seconds, {phase: (seconds, calls)})
+        phases = getattr(self._local, 'phases', None)
+        if phases is None:
+            return None, {}
+        elapsed = time.perf_counter() - self._local.began
+        self._local.phases = None
+        self.count('idms_requests_total', endpoint=endpoint, method=method, status=str(status))
+        self.observe('idms_request_duration_seconds', elapsed, endpoint=endpoint, method=method)
+        return elapsed, phases
+
+    def render(self, cache_stats=None):
+        # Prometheus text exposition of everything recorded so far, plus
+        # hit/miss counts for caches that keep their own ({name: stats})
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(series) for key, series in self._histograms.items()}
+        for name, stats in (cache_stats or {}).items():
+            counters[('idms_cache_hits_total', (('cache', name),))] = stats['hits']
+            counters[('idms_cache_misses_total', (('cache', name),))] = stats['misses']
+            lookups = stats['hits'] + stats['misses']
+            counters[('idms_cache_hit_ratio', (('cache', name),))] = (
+                stats['hits'] / lookups if lookups else 0.0)
+
+        lines = []
+        for name in sorted({key[0] for key in counters} | {key[0] for key in histograms}):
+            kind, text = HELP.get(name, ('untyped', ''))
+            lines.append('# HELP %s %s' % (name, text))
+            lines.append('# TYPE %s %s' % (name, kind))
+            for key in sorted(key for key in counters if key[0] == name):
+                lines.append('%s%s %s' % (name, _labels(key[1]), _number(counters[key])))
+            for key in sorted(key for key in histograms if key[0] == name):
+                series = histograms[key]
+                cumulative = 0
+                for bound, count in zip(self.buckets + ('+Inf',), series):
+                    cumulative += count
+                    lines.append('%s_bucket%s %d' % (name, _labels(key[1] + (('le', bound),)),
+                                                     cumulative))
+                lines.append('%s_sum%s %s' % (name, _labels(key[1]), _number(series[-1])))
+                lines.append('%s_count%s %d' % (name, _labels(key[1]), cumulative))
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in pairs)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def describe_phases(seconds, phases):
+    # "812.4 ms: csv_parse 700.1 ms, render 50.3 ms x2, other 62.0 ms" for
+    # the slow-request log; other is what no phase accounts for
+    parts = []
+    for name, (spent, calls) in sorted(phases.items(), key=lambda item: -item[1][0]):
+        parts.append('%s %.1f ms%s' % (name, spent * 1000, ' x%d' % calls if calls > 1 else ''))
+    other = seconds - sum(spent for spent, _ in phases.values())
+    if other > 0:
+        parts.append('other %.1f ms' % (other * 1000))
+    return '%.1f ms: %s' % (seconds * 1000, ', '.join(parts) or 'no phases')
+
+
+# The process's registry; storage and the app record into it
+registry = Metrics()
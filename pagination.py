@@ -0,0 +1,121 @@
+import math
+
+
+def sort_key(value):
+    # Numbers sort numerically and ahead of text; text sorts case-insensitively
+    try:
+        return (0, float(value), '')
+    except (TypeError, ValueError):
+        return (1, 0.0, (value or '').lower())
+
+
+def parse_filters(values, fieldnames):
+    # "column:value" pairs; unknown columns are ignored
+    filters = {}
+    for item in values:
+        name, sep, value = item.partition(':')
+        name = name.strip()
+        if sep and name in fieldnames:
+            filters[name] = value.strip()
+    return filters
+
+
+def _positive_int(value, default):
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        return default
+    return number if number > 0 else default
+
+
+class Page:
+    # One window of a module table plus what the templates need to render
+    # the pager. items holds the records themselves; the edit and delete
+    # forms address them by their id and rev. count is how many there are,
+    # which outlives items once the rows have been rendered (see detached).
+
+    def __init__(self, items, total, number, size, sort=None, descending=False, filters=None):
+        self.items = items
+        self.count = len(items)
+        self.total = total
+        self.number = number
+        self.size = size
+        self.sort = sort
+        self.descending = descending
+        self.filters = filters or {}
+
+    @property
+    def pages(self):
+        return max(1, math.ceil(self.total / self.size))
+
+    @property
+    def first_item(self):
+        return (self.number - 1) * self.size + 1 if self.count else 0
+
+    @property
+    def last_item(self):
+        return (self.number - 1) * self.size + self.count
+
+    @property
+    def has_prev(self):
+        return self.number > 1
+
+    @property
+    def has_next(self):
+        return self.number < self.pages
+
+    def window(self, radius=2):
+        # Page numbers to link to, with None marking a gap
+        shown = {1, self.pages}
+        shown.update(range(max(1, self.number - radius), min(self.pages, self.number + radius) + 1))
+        numbers = []
+        for number in sorted(shown):
+            if numbers and number - numbers[-1] > 1:
+                numbers.append(None)
+            numbers.append(number)
+        return numbers
+
+    def detached(self):
+        # Copy for the fragment cache: everything the pager needs, but not
+        # the records, which would keep the table they came from alive
+        page = Page((), self.total, self.number, self.size, self.sort, self.descending, self.filters)
+        page.count = self.count
+        return page
+
+    def query_args(self, number):
+        # Query string arguments for a link to another page of the same view
+        args = {'page': number, 'page_size': self.size}
+        if self.sort:
+            args['sort'] = ('-' if self.descending else '') + self.sort
+        if self.filters:
+            args['filter'] = ['%s:%s' % item for item in self.filters.items()]
+        return args
+
+
+def page_request(args, fieldnames, default_size=50, max_size=500):
+    # (page number, page size, sort column, descending, filters) from the
+    # request arguments
+    size = min(_positive_int(args.get('page_size'), default_size), max_size)
+    number = _positive_int(args.get('page'), 1)
+
+    sort = args.get('sort', '').strip()
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-')
+    if sort not in fieldnames:
+        sort, descending = None, False
+    return number, size, sort, descending, parse_filters(args.getlist('filter'), fieldnames)
+
+
+def fetch_page(storage, table, args, fieldnames, default_size=50, max_size=500):
+    # Read page, page_size, sort and filter from the request arguments and
+    # ask the storage for just that window
+    number, size, sort, descending, filters = page_request(args, fieldnames, default_size, max_size)
+    items, total = storage.query(table, (number - 1) * size, size, sort=sort,
+                                 descending=descending, filters=filters)
+    pages = max(1, math.ceil(total / size))
+    if number > pages:
+        # Past the end (e.g. after deleting the last row of the last page)
+        number = pages
+        items, total = storage.query(table, (number - 1) * size, size, sort=sort,
+                                     descending=descending, filters=filters)
+    return Page(items, total, number, size, sort, descending, filters)
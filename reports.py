@@ -0,0 +1,187 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from aggregation import COUNT
+from schema import HEAD_COUNT_TOTALS
+from storage import map_in_processes
+from table_cache import json_signature
+
+HEAD_COUNTS = [total for total, _ in HEAD_COUNT_TOTALS]
+
+# The consolidated report's sections, in the order it prints them: (module,
+# title, columns its totals are broken down by, columns summed, columns
+# averaged)
+SECTIONS = [
+    ('student_enrollment', 'Student Enrollment', ['category'], HEAD_COUNTS, []),
+    ('examination_results', 'Examination Results', ['prog'], HEAD_COUNTS, []),
+    ('staff_info', 'Staff Information', ['staff_type', 'category'], HEAD_COUNTS, []),
+    ('scholarships', 'Scholarships', ['scholarship_scheme'], HEAD_COUNTS, []),
+    ('hostels', 'Hostel Management', ['type'], ['capacity', 'students_residing'], []),
+    ('placement', 'Placement Records', [], ['male_placed', 'female_placed', 'total_placed'],
+     ['median_salary']),
+    ('nss_enrollment', 'NSS Enrollment', [], ['male', 'female', 'total'], []),
+    ('programmes', 'Academic Programmes', ['level'], ['sanctioned_intake', 'approved_intake_total'],
+     []),
+    ('departments', 'Departments', ['department_name'], [], []),
+]
+
+SECTION_TABLES = [table for table, *_ in SECTIONS]
+
+# Report formats and their content types: the printable page, its figures
+# as one CSV, or a zip of both
+FORMATS = {
+    'html': 'text/html; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'zip': 'application/zip',
+}
+
+CSV_FIELDNAMES = ['module', 'group', 'measure', 'value']
+
+# Bumped whenever the figures a section holds are worked out differently,
+# so sections cached before the change are built again
+SECTION_FORMAT = 2
+
+
+def build_section(storage, table):
+    # One section's figures, from the table as storage has it now. The
+    # signature is read first, so a write landing mid-build leaves the
+    # section looking stale rather than wrongly current.
+    began = time.perf_counter()
+    signature = json_signature(storage.signature(table))
+    _, title, group_by, measures, averages = SECTIONS[SECTION_TABLES.index(table)]
+    overall = storage.aggregate(table, [], measures)
+    lines = storage.aggregate(table, group_by, measures) if group_by else []
+    averaged = storage.aggregate(table, [], averages, 'avg') if averages else []
+    total = overall[0] if overall else {}
+    return {
+        'table': table,
+        'format': SECTION_FORMAT,
+        'title': title,
+        'signature': signature,
+        'group_by': group_by,
+        'measures': measures,
+        'lines': [[line[name] for name in group_by] + [line[COUNT]] + [line[name] for name in measures]
+                  for line in lines],
+        'total': [total.get(COUNT, 0)] + [total.get(name, 0) for name in measures],
+        'averages': {name: averaged[0][name] if averaged else 0 for name in averages},
+        'built': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'seconds': round(time.perf_counter() - began, 3),
+    }
+
+
+class SectionCache:
+    # Built report sections, one "<module>.json" file each in folder, tagged
+    # with the storage signature of the table they were built from. A
+    # section is reused for as long as its table's signature is unchanged;
+    # signatures describe what is on disk (file stats, or the SQLite
+    # backend's table versions), so sections carry over between worker
+    # processes and restarts. Sections read or built here are also kept in
+    # memory.
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.hits = 0
+        self.misses = 0
+        self._sections = {}  # table -> section
+        self._lock = threading.Lock()
+
+    def get(self, table, signature):
+        # The cached section for table if it was built from signature, else None
+        signature = json_signature(signature)
+        with self._lock:
+            section = self._sections.get(table)
+        if section is None or section['signature'] != signature:
+            section = self._read(table)
+            if section is not None:
+                with self._lock:
+                    self._sections[table] = section
+        with self._lock:
+            if section is not None and section['signature'] == signature \
+                    and section.get('format') == SECTION_FORMAT:
+                self.hits += 1
+                return section
+            self.misses += 1
+        return None
+
+    def put(self, section):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(section['table'])
+        # Through a temp file, so another worker never reads half a section
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(section, file)
+        os.replace(temp_path, path)
+        with self._lock:
+            self._sections[section['table']] = section
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._sections), 'hits': self.hits, 'misses': self.misses}
+
+    def _read(self, table):
+        try:
+            with open(self._path(table), encoding='utf-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _path(self, table):
+        return os.path.join(self.folder, table + '.json')
+
+
+def build_report(storage, cache, jobs=1, processes=False):
+    # (sections in print order, modules rebuilt). Sections whose table is
+    # unchanged since they were cached are reused; the rest are built jobs
+    # at a time, in threads sharing storage's cached tables or, with
+    # processes, in worker processes that each read their tables through
+    # their own storage. Queued writes are flushed first so signatures match
+    # what the sections are built from.
+    storage.flush()
+    sections = {}
+    stale = []
+    for table in SECTION_TABLES:
+        section = cache.get(table, storage.signature(table))
+        if section is None:
+            stale.append(table)
+        else:
+            sections[table] = section
+
+    if jobs <= 1 or len(stale) <= 1:
+        built = [build_section(storage, table) for table in stale]
+    elif processes:
+        built = map_in_processes(storage, build_section, stale, jobs)
+    else:
+        with ThreadPoolExecutor(max_workers=min(jobs, len(stale))) as pool:
+            built = list(pool.map(lambda table: build_section(storage, table), stale))
+
+    for section in built:
+        sections[section['table']] = section
+        # Cached only if nothing was written to the table while it was built
+        if json_signature(storage.signature(section['table'])) == section['signature']:
+            cache.put(section)
+    return [sections[table] for table in SECTION_TABLES], stale
+
+
+def report_tag(sections):
+    # What a rendered report depends on, for its ETag
+    return [SECTION_FORMAT] + [(section['table'], section['signature']) for section in sections]
+
+
+def csv_rows(sections):
+    # The report's figures as (module, group, measure, value) rows: each
+    # group's record count and sums, then the module's totals and averages
+    for section in sections:
+        width = len(section['group_by'])
+        names = [COUNT] + section['measures']
+        for line in section['lines']:
+            group = ' / '.join(line[:width])
+            for name, value in zip(names, line[width:]):
+                yield section['table'], group, name, value
+        for name, value in zip(names, section['total']):
+            yield section['table'], 'All', name, value
+        for name, value in section['averages'].items():
+            yield section['table'], 'All', 'avg_' + name, value
@@ -0,0 +1,217 @@
+import re
+from decimal import ROUND_HALF_UP, Decimal
+
+# What a column holds. Values are stored as text either way; parse() turns
+# what a form or upload sent into the one spelling that is stored.
+COUNT = 'count'    # a whole number of people or places ('007' is stored as '7', blank as '0')
+AMOUNT = 'amount'  # a non-negative sum of money, stored with two decimals
+CHOICE = 'choice'  # one of a fixed list of labels
+TEXT = 'text'      # anything, with surrounding whitespace removed
+
+CASTES = ['general', 'ews', 'sc', 'st', 'obc']
+GENDERS = ['male', 'female', 'transgender']
+
+# Counts joined with commas, each spelled the way parse() stores them
+STORED_NUMBERS = re.compile(r'(?:0|[1-9][0-9]*)(?:,(?:0|[1-9][0-9]*))*')
+
+_AMOUNT = re.compile(r'[0-9]+(?:\.[0-9]*)?|\.[0-9]+')
+_CENTS = Decimal('0.01')
+
+
+class Column:
+    # One column of a module. A dimension is a label shared by many rows
+    # that totals can be grouped by.
+
+    def __init__(self, name, kind=TEXT, choices=None, dimension=False):
+        self.name = name
+        self.kind = kind
+        self.choices = list(choices) if choices else None
+        self.dimension = dimension
+
+
+class Module:
+    # A module's columns in the order its table stores them, the total
+    # columns that are the sum of others, and the noun its flash messages
+    # use. parse(data) is compiled from the declaration when the
+    # module is defined; see compile_parser.
+
+    def __init__(self, name, noun, columns, totals=()):
+        self.name = name
+        self.noun = noun
+        self.columns = list(columns)
+        self.fieldnames = [column.name for column in self.columns]
+        self.counts = [column.name for column in self.columns if column.kind == COUNT]
+        self.dimensions = [column.name for column in self.columns if column.dimension]
+        self.choices = {column.name: column.choices for column in self.columns
+                        if column.kind == CHOICE}
+        self.totals = [(total, list(parts)) for total, parts in totals]
+        # Total columns, which are worked out on write rather than typed in
+        self.derived = [total for total, _ in self.totals]
+        for total, parts in self.totals:
+            for name in [total] + parts:
+                if name not in self.counts:
+                    raise ValueError('%s: total %s refers to %s, which is not a count column'
+                                     % (self.name, total, name))
+                if name in self.derived and name != total:
+                    raise ValueError('%s: total %s is made up of another total, %s'
+                                     % (self.name, total, name))
+        self.parse = compile_parser(self)
+
+    def column_kinds(self):
+        # ColumnarTable arguments for this module's stored table (rev is
+        # kept as a number too)
+        return {'int_columns': self.counts + ['rev'], 'category_columns': self.dimensions}
+
+
+def compile_parser(module):
+    # Build parse(data) -> (row, problems) for a module.
+    #
+    # data is a form or any mapping of column name to text; the row holds
+    # every module column in its stored spelling, and problems lists what
+    # is wrong (the row must not be stored unless it is empty). Total
+    # columns are worked out from their parts: a blank or missing total is
+    # filled in, and one that was given must agree. The checks are written
+    # out column by column as Python source and compiled once, so a call
+    # does no lookups in the declaration and only converts the counts that
+    # a total depends on to int.
+    derived = {total for total, _ in module.totals}
+    in_totals = {part for _, parts in module.totals for part in parts}
+    variables = {name: 'v%d' % position for position, name in enumerate(module.fieldnames)}
+    numbers = {name: 'n%d' % position for position, name in enumerate(module.fieldnames)}
+    namespace = {'Decimal': Decimal, 'ROUND_HALF_UP': ROUND_HALF_UP, '_AMOUNT': _AMOUNT,
+                 '_CENTS': _CENTS}
+
+    lines = ['def parse(data):',
+             '    problems = []',
+             '    get = data.get']
+    for column in module.columns:
+        value = variables[column.name]
+        number = numbers[column.name]
+        lines.append('    %s = (get(%r) or "").strip()' % (value, column.name))
+        if column.name in derived:
+            # Replaced by the sum of its parts below
+            lines += ['    if %s and not (%s.isdigit() and %s.isascii()):' % (value, value, value),
+                      '        problems.append("%s: %%r is not a whole number" %% %s)'
+                      % (column.name, value)]
+        elif column.kind == COUNT:
+            tracked = column.name in in_totals
+            lines += ['    if not %s:' % value,
+                      '        %s = "0"' % value]
+            if tracked:
+                lines.append('        %s = 0' % number)
+            lines += ['    elif %s.isdigit() and %s.isascii():' % (value, value)]
+            if tracked:
+                lines += ['        %s = int(%s)' % (number, value),
+                          '        %s = str(%s)' % (value, number)]
+            else:
+                lines += ['        if %s[0] == "0":' % value,
+                          '            %s = str(int(%s))' % (value, value)]
+            lines += ['    else:',
+                      '        problems.append("%s: %%r is not a whole number" %% %s)'
+                      % (column.name, value)]
+            if tracked:
+                lines.append('        %s = None' % number)
+        elif column.kind == AMOUNT:
+            lines += ['    if not %s:' % value,
+                      '        %s = "0.00"' % value,
+                      '    elif _AMOUNT.fullmatch(%s):' % value,
+                      '        %s = str(Decimal(%s).quantize(_CENTS, ROUND_HALF_UP))' % (value, value),
+                      '    else:',
+                      '        problems.append("%s: %%r is not an amount" %% %s)'
+                      % (column.name, value)]
+        elif column.kind == CHOICE:
+            allowed = 'choices_%s' % value
+            namespace[allowed] = frozenset(column.choices)
+            lines += ['    if %s not in %s:' % (value, allowed),
+                      '        problems.append("%s: %%r is not one of %s" %% %s)'
+                      % (column.name, ', '.join(column.choices), value)]
+    for total, parts in module.totals:
+        value = variables[total]
+        terms = [numbers[name] for name in parts]
+        lines += ['    if None not in (%s,):' % ', '.join(terms),
+                  '        expected = %s' % ' + '.join(terms),
+                  '        if %s and %s.isdigit() and %s.isascii() and int(%s) != expected:'
+                  % (value, value, value, value),
+                  '            problems.append("%s is %%s but %s add up to %%d" %% (%s, expected))'
+                  % (total, ' + '.join(parts), value),
+                  '        %s = str(expected)' % value]
+    lines.append('    return {%s}, problems' % ', '.join(
+        '%r: %s' % (name, variables[name]) for name in module.fieldnames))
+
+    source = '\n'.join(lines) + '\n'
+    exec(compile(source, '<schema %s>' % module.name, 'exec'), namespace)
+    parse = namespace['parse']
+    parse.source = source
+    return parse
+
+
+def head_count_columns():
+    # caste x gender counts followed by their total_<gender> columns
+    return [Column('%s_%s' % (caste, gender), COUNT)
+            for caste in CASTES + ['total'] for gender in GENDERS]
+
+
+# Each total_<gender> is the sum of that gender's caste columns
+HEAD_COUNT_TOTALS = [('total_%s' % gender, ['%s_%s' % (caste, gender) for caste in CASTES])
+                     for gender in GENDERS]
+
+SCHEMES = ['Total', 'PWD', 'Muslim Minority', 'Other Minority']
+
+# Every module, in the order the app lists them
+MODULES = {module.name: module for module in [
+    Module('nss_enrollment', 'Record', [
+        Column('male', COUNT), Column('female', COUNT), Column('total', COUNT),
+    ], totals=[('total', ['male', 'female'])]),
+    Module('hostels', 'Hostel', [
+        Column('sno'), Column('name'),
+        Column('type', CHOICE, ['Boys', 'Girls'], dimension=True),
+        Column('capacity', COUNT), Column('students_residing', COUNT),
+    ]),
+    Module('departments', 'Department', [
+        Column('sno'), Column('department_name'),
+    ]),
+    Module('programmes', 'Programme', [
+        Column('sno'), Column('level', CHOICE, ['UG', 'PG', 'Diploma', 'PhD'], dimension=True),
+        Column('program_name'), Column('year_of_start'), Column('course_duration'),
+        Column('entry_qualification'), Column('medium_instruction'),
+        Column('sanctioned_intake', COUNT),
+        Column('approved_intake_ews', COUNT), Column('approved_intake_sc', COUNT),
+        Column('approved_intake_st', COUNT), Column('approved_intake_obc', COUNT),
+        Column('approved_intake_general', COUNT), Column('approved_intake_total', COUNT),
+    ], totals=[('approved_intake_total', ['approved_intake_%s' % caste for caste in
+                                          ['ews', 'sc', 'st', 'obc', 'general']])]),
+    Module('student_enrollment', 'Enrollment record', [
+        Column('sno'), Column('category', CHOICE, ['Regular', 'Distance'], dimension=True),
+    ] + head_count_columns(), totals=HEAD_COUNT_TOTALS),
+    Module('examination_results', 'Result record', [
+        Column('sno'), Column('prog', dimension=True), Column('year', dimension=True),
+        Column('month', dimension=True), Column('category', dimension=True),
+    ] + head_count_columns(), totals=HEAD_COUNT_TOTALS),
+    Module('placement', 'Placement record', [
+        Column('male_placed', COUNT), Column('female_placed', COUNT),
+        Column('total_placed', COUNT), Column('median_salary', AMOUNT),
+    ], totals=[('total_placed', ['male_placed', 'female_placed'])]),
+    Module('staff_info', 'Staff record', [
+        Column('staff_type', CHOICE, ['Teaching', 'Non-Teaching'], dimension=True),
+        Column('category', CHOICE, ['Contractual', 'Non-Contractual'], dimension=True),
+        Column('subcategory', dimension=True),
+    ] + head_count_columns(), totals=HEAD_COUNT_TOTALS),
+    Module('scholarships', 'Scholarship record', [
+        Column('scholarship_scheme', CHOICE, SCHEMES, dimension=True),
+        Column('category', dimension=True),
+    ] + head_count_columns(), totals=HEAD_COUNT_TOTALS),
+]}
+
+# Columns some module can be grouped by
+DIMENSION_COLUMNS = sorted({name for module in MODULES.values() for name in module.dimensions})
+
+# Columns holding sums of money, which are added up as decimals
+AMOUNT_COLUMNS = sorted({column.name for module in MODULES.values() for column in module.columns
+                         if column.kind == AMOUNT})
+
+
+def column_kinds(table):
+    # ColumnarTable arguments for a stored table; its defaults for tables
+    # that are not modules
+    module = MODULES.get(table)
+    return module.column_kinds() if module is not None else {}
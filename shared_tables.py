@@ -0,0 +1,141 @@
+import glob
+import mmap
+import os
+import struct
+import threading
+
+from columnar import MappedTable, read_image_header, write_image
+from table_cache import json_signature
+from table_lock import TableLocks
+
+GENERATION_SUFFIX = '.generation'
+IMAGE_SUFFIX = '.image'
+_GENERATION = struct.Struct('<Q')
+
+
+class SharedTableStore:
+    # Parsed columnar tables published as images (see columnar.write_image)
+    # that every worker process maps read-only.
+    #
+    # Each table has an 8-byte "<table>.generation" counter, which every
+    # process keeps mapped, and the current image "<table>.<generation>.image".
+    # Publishing writes a new image, bumps the counter and removes the old
+    # image (processes still mapping it keep their pages until they move on).
+    # An image records the signature of the CSV and journal it was built
+    # from: reading the counter tells a worker whether a sibling has
+    # published since, so a table changed by another worker is mapped rather
+    # than parsed again.
+    #
+    # Images are read-only. Each caller gets its own MappedTable over the
+    # image, which keeps the rows it edits or appends as patches (see
+    # MappedTable); share() publishes such a table again only once it has
+    # more than republish_rows of them, so a small write costs the rows it
+    # touches rather than a new image.
+
+    def __init__(self, folder, republish_rows=1000):
+        self.folder = folder
+        self.republish_rows = republish_rows
+        self.locks = TableLocks()
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+        self._counters = {}  # table -> mmap of its generation file
+        self._mapped = {}    # table -> (generation, MappedTable or None)
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def load(self, table, signature):
+        # A table over the published image of table if it was built from
+        # signature, else None
+        mapped = self._current(table)
+        with self._lock:
+            if mapped is not None and mapped.header['signature'] == json_signature(signature):
+                self.hits += 1
+                return mapped.snapshot()
+            self.misses += 1
+        return None
+
+    def latest(self, table):
+        # A table over whatever image of table is published, or None; its
+        # header says what it was built from
+        mapped = self._current(table)
+        return None if mapped is None else mapped.snapshot()
+
+    def share(self, table, rows, signature):
+        # rows (a ColumnarTable built from signature) as a MappedTable,
+        # publishing it first unless a sibling already has
+        if isinstance(rows, MappedTable) and rows.patched_rows() <= self.republish_rows:
+            return rows
+        with self.locks.exclusive(self._path(table, GENERATION_SUFFIX)):
+            mapped = self.load(table, signature)
+            if mapped is None:
+                mapped = self._publish(table, rows, signature)
+        return mapped
+
+    def generation(self, table):
+        counter = self._counters.get(table)
+        if counter is None:
+            counter = self._counter(table)
+        return _GENERATION.unpack_from(counter)[0]
+
+    def stats(self):
+        with self._lock:
+            return {'tables': sum(1 for _, mapped in self._mapped.values() if mapped is not None),
+                    'hits': self.hits, 'misses': self.misses, 'published': self.published}
+
+    def _publish(self, table, rows, signature):
+        # Called with the table's generation lock held
+        generation = self.generation(table) + 1
+        path = self._path(table, '.%d%s' % (generation, IMAGE_SUFFIX))
+        with open(path + '.tmp', 'wb') as file:
+            write_image(rows, file, table=table, generation=generation, signature=signature)
+        os.replace(path + '.tmp', path)
+        _GENERATION.pack_into(self._counters[table], 0, generation)
+        for old in glob.glob(self._path(table, '.*' + IMAGE_SUFFIX)):
+            if old != path:
+                os.remove(old)
+        mapped = self._map(table, generation)
+        with self._lock:
+            self._mapped[table] = (generation, mapped)
+            self.published += 1
+        return rows if mapped is None else mapped.snapshot()
+
+    def _current(self, table):
+        # The table's current image, mapped once per generation; only ever
+        # handed out as a snapshot(), so it never changes
+        generation = self.generation(table)
+        with self._lock:
+            known = self._mapped.get(table)
+        if known is None or known[0] != generation:
+            known = (generation, self._map(table, generation))
+            with self._lock:
+                self._mapped[table] = known
+        return known[1]
+
+    def _map(self, table, generation):
+        if not generation:
+            return None
+        try:
+            with open(self._path(table, '.%d%s' % (generation, IMAGE_SUFFIX)), 'rb') as file:
+                buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError):
+            # Replaced by a newer generation since we read the counter (or empty)
+            return None
+        header = read_image_header(buffer)
+        return None if header is None else MappedTable(buffer, header)
+
+    def _counter(self, table):
+        path = self._path(table, GENERATION_SUFFIX)
+        with self.locks.exclusive(path):
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < _GENERATION.size:
+                    os.write(fd, bytes(_GENERATION.size))
+                counter = mmap.mmap(fd, _GENERATION.size)
+            finally:
+                os.close(fd)
+        with self._lock:
+            return self._counters.setdefault(table, counter)
+
+    def _path(self, table, suffix):
+        return os.path.join(self.folder, table + suffix)
@@ -0,0 +1,262 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from table_cache import file_signature
+from table_lock import TableLocks
+
+INDEX_FILE = 'index.json'
+DELTA_SUFFIX = '.jsonl'
+
+# Labels name files in the snapshot folder, so they are kept to plain text
+# such as "2025-26"
+_LABEL = re.compile(r'[0-9A-Za-z][0-9A-Za-z._-]{0,63}')
+
+
+class SnapshotError(Exception):
+    # A snapshot label that is malformed, already taken or not known
+    pass
+
+
+class SnapshotStore:
+    # Point-in-time copies of the module tables, one per label, kept as
+    # row-level deltas.
+    #
+    # index.json lists the snapshots oldest first. Each snapshot has one
+    # "<label>.jsonl" file with a line per changed table holding the rows
+    # added or changed since the previous snapshot (all of them for the
+    # first one, or when a table's columns changed) and the ids of the rows
+    # removed; the index records where each line starts, so reading one
+    # table never parses the others. A table is read back by applying its
+    # deltas forward from the nearest snapshot of it already rebuilt in this
+    # process. The last cache_size rebuilt tables are kept, and one a delta
+    # did not touch is shared with the snapshot before it rather than
+    # copied. Snapshots never change once written, so cached tables never
+    # go stale.
+
+    def __init__(self, folder, cache_size=36, fsync=True):
+        self.folder = folder
+        self.cache_size = cache_size
+        self.fsync = fsync
+        self.locks = TableLocks()
+        self.hits = 0
+        self.misses = 0
+        self._index = (None, [])  # (signature of index.json, entries)
+        self._tables = OrderedDict()  # (label, table) -> (fieldnames, {id: values})
+        self._lock = threading.Lock()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.folder, INDEX_FILE)
+
+    def list(self):
+        return [dict(entry) for entry in self._entries()]
+
+    def entry(self, label):
+        return dict(self._entries()[self._position(label)])
+
+    def create(self, label, tables):
+        # Freeze tables ({table: (fieldnames, chunks)}, the chunks being
+        # lists of rows as tuples of the fieldnames values) under label,
+        # storing what changed since the latest snapshot. Returns the new
+        # index entry.
+        if not isinstance(label, str) or not _LABEL.fullmatch(label):
+            raise SnapshotError('snapshot labels are letters, digits, ".", "-" and "_" '
+                                '(up to 64), got %r' % label)
+        os.makedirs(self.folder, exist_ok=True)
+        with self.locks.exclusive(self.index_path):
+            entries = self._entries()
+            if any(entry['label'] == label for entry in entries):
+                raise SnapshotError('there is already a snapshot named %r' % label)
+            parent = entries[-1]['label'] if entries else None
+
+            lines = []
+            offset = 0
+            counts = {}
+            frozen = {}
+            for table, (fieldnames, chunks) in tables.items():
+                fieldnames = list(fieldnames)
+                rows = _keyed(fieldnames, (values for chunk in chunks for values in chunk))
+                previous = self._table(parent, table) if parent is not None else None
+                old_fieldnames, old_rows = previous or (None, {})
+                if old_fieldnames != fieldnames:
+                    keys = list(rows)
+                else:
+                    keys = [key for key, values in rows.items() if old_rows.get(key) != values]
+                changed = sum(1 for key in keys if key in old_rows)
+                remove = [key for key in old_rows if key not in rows]
+                counts[table] = {'rows': len(rows), 'added': len(keys) - changed,
+                                 'changed': changed, 'removed': len(remove)}
+                if keys or remove or old_fieldnames != fieldnames:
+                    line = (json.dumps({'table': table, 'fieldnames': fieldnames,
+                                        'put': [rows[key] for key in keys], 'remove': remove},
+                                       separators=(',', ':')) + '\n').encode('utf-8')
+                    counts[table].update(offset=offset, length=len(line))
+                    lines.append(line)
+                    offset += len(line)
+                    frozen[table] = (fieldnames, rows)
+                else:
+                    # Unchanged: share the previous snapshot's rows
+                    frozen[table] = previous
+
+            filename = label + DELTA_SUFFIX
+            self._replace(os.path.join(self.folder, filename), b''.join(lines))
+            entry = {'label': label, 'parent': parent, 'file': filename, 'bytes': offset,
+                     'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                     'tables': counts}
+            self._replace(self.index_path, json.dumps(entries + [entry], indent=1).encode('utf-8'))
+            self._index = (file_signature(self.index_path), entries + [entry])
+            for table, state in frozen.items():
+                self._remember((label, table), state)
+        return dict(entry)
+
+    def rows(self, label, table):
+        # (fieldnames, rows as tuples) of one table as it was frozen under
+        # label, or (None, []) if the snapshot has no such table
+        fieldnames, rows = self._table(label, table) or (None, {})
+        return fieldnames, list(rows.values())
+
+    def diff(self, old, new, tables):
+        # {table: {'added': [row dicts], 'removed': [ids], 'changed': [{'id',
+        # 'columns': {column: [old, new]}}]}} between two snapshots, in
+        # either order. Only rows a delta between the two touched are
+        # compared, and a change to nothing but a row's rev is not listed.
+        first, last = sorted((self._position(old), self._position(new)))
+        labels = [entry['label'] for entry in self._entries()[first + 1:last + 1]]
+        result = {}
+        for table in tables:
+            touched = set()
+            for label in labels:
+                delta = self._delta(label, table)
+                if delta is not None:
+                    id_position = delta['fieldnames'].index('id')
+                    touched.update(values[id_position] for values in delta['put'])
+                    touched.update(delta['remove'])
+            old_fieldnames, old_rows = self._table(old, table) or ([], {})
+            new_fieldnames, new_rows = self._table(new, table) or ([], {})
+            added, removed, changed = [], [], []
+            for key in sorted(touched):
+                was, now = old_rows.get(key), new_rows.get(key)
+                if was is None and now is None or was == now and old_fieldnames == new_fieldnames:
+                    continue
+                if was is None:
+                    added.append(dict(zip(new_fieldnames, now)))
+                elif now is None:
+                    removed.append(key)
+                else:
+                    if old_fieldnames == new_fieldnames:
+                        columns = {name: [before, after]
+                                   for name, before, after in zip(new_fieldnames, was, now)
+                                   if before != after and name != 'rev'}
+                    else:
+                        was, now = dict(zip(old_fieldnames, was)), dict(zip(new_fieldnames, now))
+                        columns = {name: [was.get(name), now.get(name)]
+                                   for name in dict.fromkeys(old_fieldnames + new_fieldnames)
+                                   if name != 'rev' and was.get(name) != now.get(name)}
+                    if columns:
+                        changed.append({'id': key, 'columns': columns})
+            result[table] = {'added': added, 'removed': removed, 'changed': changed}
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._tables), 'hits': self.hits, 'misses': self.misses}
+
+    def _entries(self):
+        # The index, read again only when the file has changed (another
+        # worker may have added a snapshot)
+        signature = file_signature(self.index_path)
+        if signature != self._index[0]:
+            if signature is None:
+                entries = []
+            else:
+                with open(self.index_path, encoding='utf-8') as file:
+                    entries = json.load(file)
+            self._index = (signature, entries)
+        return self._index[1]
+
+    def _position(self, label):
+        for position, entry in enumerate(self._entries()):
+            if entry['label'] == label:
+                return position
+        raise SnapshotError('no snapshot named %r' % label)
+
+    def _delta(self, label, table):
+        # One table's delta line from label's file, or None if the table
+        # did not change in that snapshot
+        entry = self._entries()[self._position(label)]
+        counts = entry['tables'].get(table)
+        if counts is None or 'length' not in counts:
+            return None
+        with open(os.path.join(self.folder, entry['file']), 'rb') as file:
+            file.seek(counts['offset'])
+            return json.loads(file.read(counts['length']))
+
+    def _table(self, label, table):
+        # (fieldnames, {id: values}) of table as of label, or None
+        entries = self._entries()
+        position = self._position(label)
+        with self._lock:
+            state = self._tables.get((label, table))
+            if state is not None:
+                self._tables.move_to_end((label, table))
+                self.hits += 1
+                return state
+            self.misses += 1
+            start, state = -1, None
+            for earlier in range(position - 1, -1, -1):
+                cached = self._tables.get((entries[earlier]['label'], table))
+                if cached is not None:
+                    start, state = earlier, cached
+                    break
+
+        for entry in entries[start + 1:position + 1]:
+            delta = self._delta(entry['label'], table)
+            if delta is not None:
+                state = _applied(state, delta)
+        if state is not None:
+            self._remember((label, table), state)
+        return state
+
+    def _remember(self, key, state):
+        with self._lock:
+            self._tables[key] = state
+            self._tables.move_to_end(key)
+            while len(self._tables) > self.cache_size:
+                self._tables.popitem(last=False)
+
+    def _replace(self, path, data):
+        # Write data to path through a temp file, so readers never see half
+        # of it
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+            file.flush()
+            if self.fsync:
+                os.fsync(file.fileno())
+        os.replace(temp_path, path)
+
+
+def _keyed(fieldnames, rows):
+    # {id: values} for rows of fieldnames values
+    if 'id' not in fieldnames:
+        raise ValueError('snapshot rows need an id column')
+    id_position = fieldnames.index('id')
+    return {values[id_position]: tuple(values) for values in rows}
+
+
+def _applied(previous, delta):
+    # One table's (fieldnames, rows) with a delta applied; the previous
+    # rows are copied, never changed, since older snapshots may share them
+    fieldnames = delta['fieldnames']
+    if previous is None or previous[0] != fieldnames:
+        rows = {}
+    else:
+        rows = dict(previous[1])
+    for key in delta['remove']:
+        rows.pop(key, None)
+    rows.update(_keyed(fieldnames, delta['put']))
+    return fieldnames, rows
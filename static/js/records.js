@@ -0,0 +1,80 @@
+// Module tables carry their records once, in the JSON block after the table
+// body ({"fields": [...], "rows": [[...], ...]}), rather than repeating every
+// value in each row's markup. A row's Edit and Delete buttons find their
+// record through its data-row index: Edit hands it to the page's
+// editRecord(record), Delete posts a one-off delete form for it.
+(function () {
+    var data = null;
+
+    function recordAt(index) {
+        if (data === null) {
+            data = JSON.parse(document.getElementById('recordData').textContent);
+        }
+        var values = data.rows[index];
+        var record = {};
+        data.fields.forEach(function (name, position) {
+            record[name] = values[position];
+        });
+        return record;
+    }
+
+    function deleteRecord(record) {
+        if (!confirm('Are you sure you want to delete this record?')) {
+            return;
+        }
+        var form = document.createElement('form');
+        form.method = 'POST';
+        [['action', 'delete'], ['id', record.id], ['rev', record.rev]].forEach(function (field) {
+            var input = document.createElement('input');
+            input.type = 'hidden';
+            input.name = field[0];
+            input.value = field[1];
+            form.appendChild(input);
+        });
+        document.body.appendChild(form);
+        form.submit();
+    }
+
+    document.addEventListener('click', function (event) {
+        var button = event.target.closest('.btn-edit, .btn-delete');
+        var row = button && button.closest('tr[data-row]');
+        if (!row) {
+            return;
+        }
+        var record = recordAt(Number(row.dataset.row));
+        if (button.classList.contains('btn-edit')) {
+            editRecord(record);
+        } else {
+            deleteRecord(record);
+        }
+    });
+})();
+
+// Total inputs (data-total-of="part part ...") are worked out by the server
+// when the form is saved and have no name, so they are never posted; here
+// they just show the sum of their parts as the user types.
+(function () {
+    var totals = document.querySelectorAll('input[data-total-of]');
+
+    function update() {
+        totals.forEach(function (total) {
+            var sum = 0;
+            var filled = false;
+            total.dataset.totalOf.split(' ').forEach(function (name) {
+                var part = document.getElementById(name);
+                if (part && part.value !== '') {
+                    sum += Number(part.value) || 0;
+                    filled = true;
+                }
+            });
+            total.value = filled ? sum : '';
+        });
+    }
+
+    if (totals.length) {
+        document.addEventListener('input', update);
+        document.addEventListener('reset', function () {
+            setTimeout(update, 0);
+        });
+    }
+})();
@@ -0,0 +1,1307 @@
+import csv
+import io
+import json
+import multiprocessing
+import os
+import re
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from itertools import chain, islice
+from operator import itemgetter
+
+import aggregation
+from columnar import ColumnarTable
+from dashboard_stats import DashboardStats
+from group_commit import GroupCommitter
+from journal import EditJournal, journal_path, replay
+from metrics import registry
+from pagination import sort_key
+from schema import AMOUNT_COLUMNS, column_kinds
+from shared_tables import SharedTableStore
+from table_cache import TableCache, file_signature
+from table_lock import TableLocks
+from write_behind import WriteBehindQueue
+
+# When a write is on disk relative to the request that made it (see
+# Storage._submit)
+DURABILITY_LEVELS = ('synchronous', 'batch', 'interval')
+
+# Columns the module pages filter on; indexed wherever a table has them
+INDEXED_COLUMNS = ['sno', 'category', 'prog', 'year', 'staff_type']
+
+# Bookkeeping columns stored after every module's own columns: a permanent
+# record id and a revision number bumped on every edit
+RECORD_COLUMNS = ['id', 'rev']
+
+_IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class StaleRecordError(Exception):
+    # An edit or delete named a revision of the record that is no longer current
+    pass
+
+
+def new_record_id():
+    return secrets.token_hex(8)
+
+
+def new_record_ids(count):
+    # count ids like new_record_id()'s, from one read of the OS random source
+    text = secrets.token_hex(8 * count)
+    return [text[start:start + 16] for start in range(0, 16 * count, 16)]
+
+
+def module_fieldnames(fieldnames):
+    return [name for name in fieldnames if name not in RECORD_COLUMNS]
+
+
+def storage_fieldnames(fieldnames):
+    return module_fieldnames(fieldnames) + RECORD_COLUMNS
+
+
+def normalize_row(row, fieldnames):
+    # Same shape a read would produce after storing the row
+    return {name: ('' if row.get(name) is None else str(row.get(name))).strip() for name in fieldnames}
+
+
+def stored_row(data, fieldnames, record_id, rev):
+    row = normalize_row(data, module_fieldnames(fieldnames))
+    row['id'] = record_id
+    row['rev'] = str(rev)
+    return row
+
+
+def _new_rows(rows, fieldnames):
+    # stored_row() for a batch of rows being appended. Rows holding every
+    # module column as a string skip the per-cell checks.
+    names = module_fieldnames(fieldnames)
+    columns = names + RECORD_COLUMNS
+    values_of = itemgetter(*names) if len(names) > 1 else (lambda row: (row[names[0]],))
+    rows = list(rows)
+    stored = []
+    for row, record_id in zip(rows, new_record_ids(len(rows))):
+        try:
+            stored.append(dict(zip(columns, [*map(str.strip, values_of(row)), record_id, '1'])))
+        except (KeyError, TypeError):
+            stored.append(stored_row(row, fieldnames, record_id, 1))
+    return stored
+
+
+def _with_ids(rows, fieldnames):
+    # Rows for a full-table write; existing ids and revisions are kept
+    return [stored_row(row, fieldnames, row.get('id') or new_record_id(), row.get('rev') or 1)
+            for row in rows]
+
+
+def _next_rev(row):
+    try:
+        return int(row.get('rev') or 0) + 1
+    except ValueError:
+        return 1
+
+
+def _has_rev(rev):
+    # Whether an edit says which revision it was made against
+    return rev is not None and str(rev).strip() != ''
+
+
+def _is_stale(row, rev):
+    return _has_rev(rev) and str(rev).strip() != row.get('rev', '')
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _matches(row, filters):
+    return all(row.get(name, '') == value for name, value in filters.items())
+
+
+# Scans over a cached table, which is either a list of row dicts or a
+# ColumnarTable that can answer them column by column
+
+def _filter_positions(rows, filters):
+    if isinstance(rows, ColumnarTable):
+        return rows.matching(filters)
+    return [position for position, row in enumerate(rows) if _matches(row, filters)]
+
+
+def _column_values(rows, name):
+    if isinstance(rows, ColumnarTable):
+        return rows.strings(name)
+    return [row.get(name, '') for row in rows]
+
+
+def _value_tuples(rows, fieldnames, start, stop):
+    if isinstance(rows, ColumnarTable):
+        return rows.tuples(fieldnames, start, stop)
+    window = rows[start:stop]
+    if len(fieldnames) > 1:
+        try:
+            return list(map(itemgetter(*fieldnames), window))
+        except KeyError:
+            pass
+    # Single columns, and tables written before a column existed
+    return [tuple(row.get(name, '') for name in fieldnames) for row in window]
+
+
+def _without(rows, positions):
+    if isinstance(rows, ColumnarTable):
+        return rows.without(positions)
+    dropped = set(positions)
+    return [row for position, row in enumerate(rows) if position not in dropped]
+
+
+def _sorted(rows, column):
+    # Positions of rows in pagination.sort_key order of column
+    with registry.phase('sort'):
+        keys = [sort_key(value) for value in _column_values(rows, column)]
+        return sorted(range(len(rows)), key=keys.__getitem__)
+
+
+class Storage:
+    # Interface the routes use to reach a module's table.
+    #
+    # Tables are named after their module ('hostels', 'staff_info', ...) and
+    # come back as lists of dicts of stripped strings in insertion order.
+    # Every record carries a permanent 'id' and a 'rev' counter; edits and
+    # deletes address records by id and, when given the revision the user
+    # last saw, refuse with StaleRecordError instead of overwriting a newer
+    # version.
+    #
+    # Appends, edits and deletes are funnelled through a GroupCommitter so
+    # that concurrent writes to one table share a commit; each backend only
+    # implements _apply_batch for that. Every backend also exposes a cheap
+    # per-table signature that changes whenever the table does, which keeps
+    # the dashboard totals honest across worker processes.
+    #
+    # With WRITE_DURABILITY other than 'synchronous' those writes go to a
+    # WriteBehindQueue instead and the request returns before they reach
+    # disk; reads lay the queued writes over the stored table until then.
+    # Edits and deletes that carry a rev are the exception: they are written
+    # straight away, so a conflict with another process is still refused.
+
+    def __init__(self, config):
+        self.config = config
+        self.stats = DashboardStats()
+        self.committer = GroupCommitter(self._apply_batch)
+        durability = config['WRITE_DURABILITY']
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError('unknown WRITE_DURABILITY %r (expected one of %s)'
+                             % (durability, ', '.join(DURABILITY_LEVELS)))
+        self.write_behind = None
+        if durability != 'synchronous':
+            gather = config['WRITE_BEHIND_INTERVAL_MS'] / 1000 if durability == 'interval' else 0
+            self.write_behind = WriteBehindQueue(self._apply_queued, gather=gather,
+                                                 max_pending=config['WRITE_BEHIND_MAX_PENDING'],
+                                                 max_attempts=config['WRITE_BEHIND_MAX_ATTEMPTS'],
+                                                 give_up=self._dead_letter)
+        self._aggregates = OrderedDict()  # query -> (table version, results)
+        self._aggregates_lock = threading.Lock()
+        self.aggregate_hits = 0
+        self.aggregate_misses = 0
+
+    def read(self, table, filters=None):
+        raise NotImplementedError
+
+    def get(self, table, record_id):
+        if self.write_behind is not None:
+            queued, row = self.write_behind.latest(table, record_id)
+            if queued:
+                return row
+        return self._stored_record(table, record_id)
+
+    def query(self, table, offset, limit, sort=None, descending=False, filters=None):
+        # One window of the table's records, plus the number matching filters
+        raise NotImplementedError
+
+    def write(self, table, rows, fieldnames):
+        raise NotImplementedError
+
+    def signature(self, table):
+        raise NotImplementedError
+
+    def version(self, table):
+        # Changes whenever the table does, queued writes included
+        version = self._stored_version(table)
+        if self.write_behind is not None:
+            return version, self.write_behind.submitted(table)
+        return version
+
+    def modified(self, table):
+        # When the table last changed, in seconds since the epoch, or None
+        # if it does not exist. Backends may round up to the last change of
+        # anything they store.
+        raise NotImplementedError
+
+    def stream(self, table, fieldnames, chunk_rows=1000):
+        # The table's rows as tuples of their fieldnames values, chunk_rows
+        # rows at a time, all from the table as it was when streaming began.
+        # Cached tables are appended to and edited in place, so this reads a
+        # snapshot: a ColumnarTable's columns as they stand, or a list of
+        # the row dicts, which an edit replaces rather than changes.
+        rows = self._rows(table)
+        rows = rows.snapshot() if isinstance(rows, ColumnarTable) else rows[:]
+        total = len(rows)
+        for start in range(0, total, chunk_rows):
+            yield _value_tuples(rows, fieldnames, start, min(start + chunk_rows, total))
+
+    def append(self, table, data, fieldnames):
+        # Returns the new record's id
+        return self._submit(table, ('append', None, data, fieldnames, None))
+
+    def append_many(self, table, rows, fieldnames, batch_size=5000):
+        # Append a stream of rows as one locked transaction, written batch_size
+        # rows at a time; returns how many were stored. Readers, the cache
+        # and the home-page totals see the rows only once all are written,
+        # and if the stream raises part way through none of them are kept.
+        raise NotImplementedError
+
+    def update(self, table, record_id, data, fieldnames, rev=None):
+        return self._submit(table, ('update', record_id, data, fieldnames, rev))
+
+    def delete(self, table, record_id, fieldnames, rev=None):
+        return self._submit(table, ('delete', record_id, None, fieldnames, rev))
+
+    def update_many(self, table, changes, fieldnames):
+        # update() for each (record id, data, rev) of changes, all in one
+        # locked transaction. Returns update()'s result for each change,
+        # with a StaleRecordError returned rather than raised.
+        changes = list(changes)
+        if not changes:
+            return []
+        self.flush(table)
+        return self._apply_batch(table, [('update', record_id, data, fieldnames, rev)
+                                         for record_id, data, rev in changes])
+
+    def scan(self, table):
+        # The whole table as stored, for batch checks: a ColumnarTable for
+        # columnar CSV tables, otherwise a list of row dicts. Read-only.
+        self.flush(table)
+        return self._rows(table)
+
+    def aggregate(self, table, group_by=(), measures=(), function='sum', filters=None):
+        # Grouped sums or averages (see aggregation.aggregate). Results are
+        # reused until the table's version changes; treat them as read-only.
+        filters = filters or {}
+        key = (table, tuple(group_by), tuple(measures), function, tuple(sorted(filters.items())))
+        version = self.version(table)
+        with self._aggregates_lock:
+            cached = self._aggregates.get(key)
+            if cached is not None and cached[0] == version:
+                self._aggregates.move_to_end(key)
+                self.aggregate_hits += 1
+                return cached[1]
+            self.aggregate_misses += 1
+        with registry.phase('aggregate'):
+            results = self._aggregate(table, list(group_by), list(measures), function, filters)
+        with self._aggregates_lock:
+            # Keep the result only if nothing was written while we computed it
+            if self.version(table) == version:
+                self._aggregates[key] = (version, results)
+                while len(self._aggregates) > self.config['AGGREGATE_CACHE_SIZE']:
+                    self._aggregates.popitem(last=False)
+        return results
+
+    def dashboard(self):
+        # Queued writes are counted by their deltas (see DashboardStats), so
+        # the totals only wait for the writer thread when a table has to be
+        # summed again (reading it flushes it first)
+        return self.stats.get(self._rows, self.signature)
+
+    def flush(self, table=None, timeout=None):
+        # Wait until queued writes (to table, or to every table) are on
+        # disk; False if timeout ran out first
+        if self.write_behind is None:
+            return True
+        return self.write_behind.flush(table, timeout)
+
+    def close(self, timeout=None):
+        # Write out anything still queued and stop the writer thread, waiting
+        # at most timeout (WRITE_BEHIND_CLOSE_TIMEOUT by default) seconds;
+        # writes still queued then go to the dead-letter log
+        if self.write_behind is None:
+            return True
+        if timeout is None:
+            timeout = self.config['WRITE_BEHIND_CLOSE_TIMEOUT']
+        return self.write_behind.close(timeout)
+
+    def dead_letter_path(self):
+        return self.config['WRITE_BEHIND_DEAD_LETTER'] or os.path.join(
+            self.config['DATA_FOLDER'], 'write_behind_failed.jsonl')
+
+    def cache_stats(self):
+        # {cache name: {'hits': ..., 'misses': ...}} for the /metrics page
+        return {'aggregate': {'hits': self.aggregate_hits, 'misses': self.aggregate_misses}}
+
+    def _rows(self, table):
+        # Read-only view for internal scans; backends may skip the copy
+        return self.read(table)
+
+    def _aggregate(self, table, group_by, measures, function, filters):
+        return aggregation.aggregate(self._rows(table), group_by, measures, function, filters)
+
+    def _stored_record(self, table, record_id):
+        raise NotImplementedError
+
+    def _stored_version(self, table):
+        raise NotImplementedError
+
+    def _submit(self, table, op):
+        if self.write_behind is not None and not _has_rev(op[4]):
+            result = self._queue(table, op)
+        else:
+            if self.write_behind is not None:
+                # An edit made against a revision is written now, after the
+                # table's queued writes, so its rev is checked under the
+                # table's lock against what every process has stored and a
+                # conflict reaches the user rather than the writer's log
+                self.flush(table)
+            if self.config['GROUP_COMMIT']:
+                result = self.committer.submit(table, op)
+            else:
+                result = self._apply_batch(table, [op])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _queue(self, table, op):
+        # Check the write against the table as readers see it, queued writes
+        # included, and queue it with its final id, rev and row so that the
+        # overlay and the eventual write agree. Only writes without a rev to
+        # check come here (see _submit).
+        action, record_id, data, fieldnames, rev = op
+        with self.write_behind.lock:
+            existing = None
+            if action == 'append':
+                record_id = new_record_id()
+                row, result = stored_row(data, fieldnames, record_id, 1), record_id
+            else:
+                existing = self.get(table, record_id)
+                if existing is None:
+                    return False
+                row, result = None, True
+                if action == 'update':
+                    row = stored_row(data, fieldnames, record_id, _next_rev(existing))
+            op = (action, record_id, row, fieldnames, rev)
+            self.write_behind.put(table, op)
+            # Still under the queue's lock, so the notes keep the ops' order
+            self.stats.queue(table, op, self.stats.change(table, existing, row))
+        return result
+
+    def _apply_queued(self, table, ops, retry):
+        # The writer thread's apply_batch. On a retry, ops that reached the
+        # table before the failure are skipped and reported as done.
+        stored = [retry and self._landed(table, op) for op in ops]
+        todo = [op for op, done in zip(ops, stored) if not done]
+        if todo:
+            results = iter(self._apply_batch(table, todo, landed=ops))
+        else:
+            results = iter(())
+            self.stats.land(table, ops)
+        return [True if done else next(results) for done in stored]
+
+    def _dead_letter(self, table, ops, error):
+        # The writer gave up on ops: keep them, one JSON line each, where
+        # someone can look at them and apply them by hand
+        with open(self.dead_letter_path(), 'a', encoding='utf-8') as file:
+            for action, record_id, row, _, rev in ops:
+                file.write(json.dumps({'table': table, 'action': action, 'id': record_id,
+                                       'row': row, 'rev': rev, 'error': str(error)}) + '\n')
+            self._sync(file)
+        # They will never land, so the dashboard stops counting them
+        self.stats.land(table, ops)
+
+    def _sync(self, file):
+        file.flush()
+        if self.config['FSYNC_WRITES']:
+            os.fsync(file.fileno())
+
+    def _landed(self, table, op):
+        action, record_id, row = op[:3]
+        stored = self._stored_record(table, record_id)
+        if action == 'append':
+            return stored is not None
+        if action == 'update':
+            return stored is not None and str(stored.get('rev')) == row['rev']
+        return stored is None
+
+    def _apply_batch(self, table, ops, landed=()):
+        # ops are (action, record_id, data, fieldnames, rev) tuples; returns
+        # one result per op: the new id for appends, True/False for edits and
+        # deletes, or a StaleRecordError to raise in the submitting thread.
+        # landed lists the queued ops the batch stores, for the dashboard
+        # totals.
+        raise NotImplementedError
+
+
+class CsvStorage(Storage):
+    # One CSV per table in DATA_FOLDER.
+    #
+    # Parsed tables live in a TableCache validated against each file's stat,
+    # next to an id -> position index that follows the cached list; tables
+    # listed in COLUMNAR_TABLES are cached as a ColumnarTable. Writes
+    # take an advisory flock on the table; appends go to the end of the CSV,
+    # single-row edits and deletes to the table's EditJournal (or, with
+    # EDIT_JOURNAL off, to a full rewrite), and full rewrites go through a
+    # temp file and os.replace so readers never see half a table.
+    #
+    # With SHARED_TABLES on, columnar tables are also published to a
+    # SharedTableStore and cached as the mapped image, so worker processes
+    # share one copy and pick up a sibling's writes without parsing: a
+    # table written since its image was published is the image plus the
+    # rows appended to the CSV after it, with the journal replayed on top.
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.locks = TableLocks()
+        self.shared = None
+        if config['SHARED_TABLES']:
+            self.shared = SharedTableStore(config['SHARED_TABLE_FOLDER']
+                                           or os.path.join(config['DATA_FOLDER'], 'shared'),
+                                           republish_rows=config['SHARED_TABLE_REPUBLISH_ROWS'])
+        self.cache = TableCache(max_tables=config['TABLE_CACHE_MAX_TABLES'],
+                                max_rows=config['TABLE_CACHE_MAX_ROWS'],
+                                signature_of=self._file_signature,
+                                share=self._share if self.shared is not None else None)
+        self.journal = EditJournal(self.locks,
+                                   max_entries=config['JOURNAL_COMPACT_ENTRIES'],
+                                   max_bytes=config['JOURNAL_COMPACT_BYTES'],
+                                   fsync=config['FSYNC_WRITES'])
+        self._orderings = {}   # (filepath, column) -> (signature, sorted positions)
+        self._id_index = {}    # filepath -> [rows list, {id: position}, rows indexed]
+        self._overlays = {}    # filepath -> (queued op range, stored rows, rows with ops applied)
+        self._missing_ids = set()
+        self._columnar = set(config['COLUMNAR_TABLES'])
+
+    def path(self, table):
+        return os.path.join(self.config['DATA_FOLDER'], table + '.csv')
+
+    def read(self, table, filters=None):
+        rows = self._rows(table)
+        if filters:
+            return [rows[position] for position in _filter_positions(rows, filters)]
+        # Cached rows are shared between requests; hand out a copy of the list
+        return list(rows)
+
+    def _stored_record(self, table, record_id):
+        rows = self._stored_rows(table)
+        position = self._positions(self.path(table), rows).get(record_id)
+        return None if position is None else rows[position]
+
+    def query(self, table, offset, limit, sort=None, descending=False, filters=None):
+        rows = self._rows(table)
+        if not filters and not sort:
+            # Straight slice of the cached table; nothing else is touched
+            return rows[offset:offset + limit], len(rows)
+
+        positions = None
+        if filters:
+            positions = _filter_positions(rows, filters)
+        if sort:
+            order = self._sorted_positions(table, rows, sort)
+            if positions is not None:
+                wanted = set(positions)
+                order = [position for position in order if position in wanted]
+            positions = order
+
+        total = len(positions)
+        if descending:
+            start = total - offset
+            window = positions[max(0, start - limit):max(0, start)][::-1]
+        else:
+            window = positions[offset:offset + limit]
+        return [rows[position] for position in window], total
+
+    def fieldnames(self, table):
+        try:
+            with open(self.path(table), 'r', newline='', encoding='utf-8') as file:
+                header = next(csv.reader(file), [])
+        except FileNotFoundError:
+            return []
+        return [name.strip() for name in header]
+
+    def write(self, table, rows, fieldnames):
+        self.flush(table)
+        self._write_table(self.path(table), rows, fieldnames)
+        self.stats.invalidate(table)
+
+    def signature(self, table):
+        return self._file_signature(self.path(table))
+
+    def _stored_version(self, table):
+        # Revalidate first so changes made by other processes count
+        self._stored_rows(table)
+        return self.cache.version(self.path(table))
+
+    def modified(self, table):
+        signature = self.signature(table)
+        if signature is None:
+            return None
+        journal = signature[3]
+        return max(signature[0], journal[0] if journal else 0) / 1e9
+
+    def dashboard(self):
+        # As Storage.dashboard, but a table summed again is summed as
+        # stored: reads lay queued writes over it rather than flushing
+        return self.stats.get(self._stored_rows, self.signature)
+
+    def cache_stats(self):
+        stats = super().cache_stats()
+        stats['table'] = self.cache.stats()
+        if self.shared is not None:
+            stats['shared'] = self.shared.stats()
+        return stats
+
+    def _rows(self, table):
+        records = self._stored_rows(table)
+        if self.write_behind is not None:
+            filepath = self.path(table)
+            pending = self.write_behind.pending(table)
+            if pending:
+                return self._overlay(filepath, records, pending)
+            self._overlays.pop(filepath, None)
+        return records
+
+    def _stored_rows(self, table):
+        filepath = self.path(table)
+        records = self.cache.get(filepath, self._load_from_disk)
+        if records is None:
+            return []
+        if filepath in self._missing_ids:
+            records = self._assign_ids(table)
+        return records
+
+    def _overlay(self, filepath, rows, pending):
+        # The stored rows with queued writes applied, kept until either
+        # changes. Ops whose batch has already reached rows are skipped
+        # (their record is there, or gone), so one landing while we look
+        # is not applied twice.
+        key = (pending[0][0], pending[-1][0], len(rows))
+        cached = self._overlays.get(filepath)
+        if cached is not None and cached[0] == key and cached[1] is rows:
+            return cached[2]
+        positions = self._positions(filepath, rows)
+        records = rows.copy()
+        added = {}
+        deleted = set()
+        for _, (action, record_id, row, _, _) in pending:
+            position = positions.get(record_id, added.get(record_id))
+            if action == 'append':
+                if position is None:
+                    added[record_id] = len(records)
+                    records.append(row)
+            elif position is not None and position not in deleted:
+                if action == 'update':
+                    records[position] = row
+                else:
+                    deleted.add(position)
+        if deleted:
+            records = _without(records, sorted(deleted))
+        self._overlays[filepath] = (key, rows, records)
+        return records
+
+    def _sorted_positions(self, table, rows, column):
+        # Sort orders are reused until the table changes
+        key = (self.path(table), column)
+        overlay = self._overlays.get(key[0])
+        if overlay is not None and overlay[2] is rows:
+            # Queued writes laid over the table; they reach disk in moments
+            return _sorted(rows, column)
+        signature = self.signature(table)
+        cached = self._orderings.get(key)
+        if cached is not None and cached[0] == signature and len(cached[1]) == len(rows):
+            return cached[1]
+        positions = _sorted(rows, column)
+        if len(self._orderings) >= 64:
+            self._orderings.clear()
+        self._orderings[key] = (signature, positions)
+        return positions
+
+    def _positions(self, filepath, rows):
+        # id -> position for this exact cached list. Rows appended to the list
+        # in place are indexed incrementally; a new list gets a new index.
+        entry = self._id_index.get(filepath)
+        if entry is None or entry[0] is not rows:
+            entry = [rows, {}, 0]
+            self._id_index[filepath] = entry
+        positions = entry[1]
+        start = entry[2]
+        if start < len(rows):
+            if isinstance(rows, ColumnarTable):
+                ids = rows.strings('id', start)
+            else:
+                ids = [row.get('id') for row in rows[start:]]
+            for position, record_id in enumerate(ids, start):
+                positions[record_id] = position
+        entry[2] = len(rows)
+        return positions
+
+    def _assign_ids(self, table):
+        # One-off upgrade of a CSV written before rows had ids (or rows added
+        # by hand without one): give every row an id and rewrite the file.
+        # A file with only the old header is rewritten too, so rows appended
+        # to it line up with an id and rev column.
+        filepath = self.path(table)
+        with self.locks.exclusive(filepath):
+            rows = self._load_from_disk(filepath)
+            header = self.fieldnames(table)
+            if 'id' not in header or any(not row.get('id') for row in rows):
+                before, after = self._write_table(filepath, rows, header)
+                self.stats.apply(table, before, after)
+            self._missing_ids.discard(filepath)
+        records = self.cache.get(filepath, self._load_from_disk)
+        return [] if records is None else records
+
+    def _file_signature(self, filepath):
+        # A table is its base CSV plus any edit journal not yet compacted into it
+        base = file_signature(filepath)
+        if base is None:
+            return None
+        return base + (file_signature(journal_path(filepath)),)
+
+    def _share(self, filepath, rows, signature):
+        # TableCache hook: columnar tables are swapped for their shared
+        # image. A table still missing ids is kept private until they are
+        # assigned.
+        if not isinstance(rows, ColumnarTable) or filepath in self._missing_ids:
+            return rows
+        return self.shared.share(os.path.basename(filepath)[:-len('.csv')], rows, signature)
+
+    def _is_columnar(self, filepath):
+        return os.path.basename(filepath)[:-len('.csv')] in self._columnar
+
+    def _typed(self, filepath, rows, fieldnames):
+        # Counts and dimensions are typed as the schema registry declares them
+        if self._is_columnar(filepath):
+            table = os.path.basename(filepath)[:-len('.csv')]
+            return ColumnarTable.from_rows(fieldnames, rows, **column_kinds(table))
+        return rows
+
+    def _csv_rows(self, filepath):
+        with open(filepath, 'r', newline='', encoding='utf-8') as file:
+            reader = csv.DictReader(file)
+            # Strip whitespace from all values
+            for row in reader:
+                yield {key.strip(): value.strip() for key, value in row.items()}
+
+    def _parse_csv(self, filepath):
+        return list(self._csv_rows(filepath))
+
+    def _load_from_disk(self, filepath):
+        # A shared lock keeps us from reading a half-appended row or a journal
+        # that is being compacted
+        table = os.path.basename(filepath)[:-len('.csv')]
+        with self.locks.shared(filepath):
+            if self.shared is not None and self._is_columnar(filepath):
+                # A sibling may have published this version already, or an
+                # earlier one to catch up from
+                mapped = self.shared.load(table, self._file_signature(filepath))
+                if mapped is None:
+                    mapped = self._caught_up(filepath, table)
+                if mapped is not None:
+                    return mapped
+            with registry.phase('csv_parse'):
+                header = self.fieldnames(table)
+                ops = self.journal.read_ops(filepath)
+                if ops or not self._is_columnar(filepath):
+                    rows = self._typed(filepath, replay(self._parse_csv(filepath), ops), header)
+                else:
+                    # Straight from the file into columns, one row dict at a time
+                    rows = ColumnarTable.from_rows(header, self._csv_rows(filepath),
+                                                   **column_kinds(table))
+                signature = self._file_signature(filepath)
+        registry.count('idms_rows_parsed_total', len(rows), table=table)
+        if signature is not None:
+            journal = signature[3]
+            registry.count('idms_bytes_read_total', signature[1] + (journal[1] if journal else 0),
+                           table=table)
+        if not all(_column_values(rows, 'id')):
+            self._missing_ids.add(filepath)
+        return rows
+
+    def _caught_up(self, filepath, table):
+        # The latest image of table brought up to date with the files, or
+        # None if the CSV has been rewritten since it was built. Rows
+        # appended to the CSV since are read from where the image left off.
+        # The whole journal is replayed over them: its entries are by id, so
+        # those already in the image change nothing. Called with the
+        # table's shared lock held.
+        mapped = self.shared.latest(table)
+        if mapped is None:
+            return None
+        then = mapped.header['signature']
+        now = file_signature(filepath)
+        if now is None or now[2] != then[2] or now[1] < then[1]:
+            return None
+        ops = self.journal.read_ops(filepath)
+        if any('index' in op for op in ops):
+            return None
+        tail = list(self._csv_tail(filepath, then[1], mapped.fieldnames))
+        registry.count('idms_rows_parsed_total', len(tail), table=table)
+        mapped.extend(tail)
+        if not ops:
+            return mapped
+        positions = self._positions(filepath, mapped)
+        gone = []
+        for op in ops:
+            position = positions.get(op['id'])
+            if position is None:
+                continue
+            if op['op'] == 'update':
+                mapped[position] = op['row']
+            elif op['op'] == 'delete':
+                del positions[op['id']]
+                gone.append(position)
+        return mapped.without(gone) if gone else mapped
+
+    def _csv_tail(self, filepath, offset, fieldnames):
+        # _csv_rows() for the rows that start at byte offset
+        with open(filepath, 'rb') as raw:
+            raw.seek(offset)
+            file = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            for row in csv.DictReader(file, fieldnames=fieldnames):
+                yield {key: value.strip() for key, value in row.items()}
+
+    def _sync_directory(self, path):
+        # Make a rename durable, where the platform lets us open directories
+        if not self.config['FSYNC_WRITES'] or not hasattr(os, 'O_DIRECTORY'):
+            return
+        fd = os.open(os.path.dirname(path) or '.', os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _write_table(self, filepath, data, fieldnames, changed=True):
+        # Rewrite the whole table and return its signatures before and after.
+        # The rows go to a temp file that atomically replaces the CSV, so
+        # readers see either the old or the new table, and the new inode
+        # retires any edit journal written against the old file.
+        rows = _with_ids(data, fieldnames)
+        with self.locks.exclusive(filepath):
+            before = self._file_signature(filepath)
+            temp_path = filepath + '.tmp'
+            with open(temp_path, 'w', newline='', encoding='utf-8') as file, \
+                    registry.phase('csv_rewrite'):
+                writer = csv.DictWriter(file, fieldnames=storage_fieldnames(fieldnames))
+                writer.writeheader()
+                writer.writerows(rows)
+                self._sync(file)
+                registry.count('idms_bytes_written_total', file.tell(),
+                               table=os.path.basename(filepath)[:-len('.csv')])
+            os.replace(temp_path, filepath)
+            self._sync_directory(filepath)
+            self.journal.discard(filepath)
+            after = self._file_signature(filepath)
+            self.cache.put(filepath, self._typed(filepath, rows, storage_fieldnames(fieldnames)),
+                           after, changed)
+        return before, after
+
+    def append_many(self, table, rows, fieldnames, batch_size=5000):
+        filepath = self.path(table)
+        added = []
+        with self.locks.exclusive(filepath):
+            header = self.fieldnames(table)
+            if header and 'id' not in header:
+                self._assign_ids(table)
+            before = self._file_signature(filepath)
+            with open(filepath, 'a', newline='', encoding='utf-8') as file:
+                start = file.tell()
+                columns = storage_fieldnames(fieldnames)
+                values_of = itemgetter(*columns)
+                writer = csv.writer(file)
+                try:
+                    if before is None:
+                        writer.writerow(columns)
+                    for batch in _batches(rows, batch_size):
+                        stored = _new_rows(batch, fieldnames)
+                        with registry.phase('csv_append'):
+                            writer.writerows(map(values_of, stored))
+                            file.flush()
+                        added.extend(stored)
+                    with registry.phase('csv_append'):
+                        self._sync(file)
+                    registry.count('idms_bytes_written_total', file.tell() - start, table=table)
+                except BaseException:
+                    # Cut the file back to where this import started; the
+                    # cache and the totals never saw any of it
+                    file.truncate(start)
+                    self._sync(file)
+                    if before is None:
+                        os.remove(filepath)
+                    raise
+            # The whole upload is on disk: publish it in one step
+            after = self._file_signature(filepath)
+            self.cache.extend(filepath, added, before)
+            self.stats.apply(table, before, after, added=added)
+        return len(added)
+
+    def _append_rows(self, filepath, rows, fieldnames, write_header):
+        with open(filepath, 'a', newline='', encoding='utf-8') as file, registry.phase('csv_append'):
+            start = file.tell()
+            writer = csv.DictWriter(file, fieldnames=storage_fieldnames(fieldnames))
+            if write_header:
+                writer.writeheader()
+            writer.writerows(rows)
+            self._sync(file)
+            registry.count('idms_bytes_written_total', file.tell() - start,
+                           table=os.path.basename(filepath)[:-len('.csv')])
+
+    def _compact(self, table, filepath, rows, fieldnames):
+        before, after = self._write_table(filepath, rows, fieldnames, changed=False)
+        self.stats.apply(table, before, after)
+
+    def _apply_batch(self, table, ops, landed=()):
+        # The whole batch runs under one exclusive lock and touches each file
+        # once
+        filepath = self.path(table)
+        fieldnames = ops[-1][3]
+        results = []
+        appended, journal_ops, added, removed = [], [], [], []
+        current = positions = None
+        moved = {}    # record id -> position (None once deleted) within this batch
+        edited = {}   # position -> row, laid over the cached table once on disk
+        deleted = []
+        compaction_due = False
+        with self.locks.exclusive(filepath):
+            header = self.fieldnames(table)
+            if header and 'id' not in header:
+                self._assign_ids(table)
+            before = self._file_signature(filepath)
+            for action, record_id, data, _, rev in ops:
+                if action == 'append':
+                    row = stored_row(data, fieldnames, record_id or new_record_id(), 1)
+                    appended.append(row)
+                    added.append(row)
+                    if current is not None:
+                        moved[row['id']] = len(current) + len(appended) - 1
+                    results.append(row['id'])
+                    continue
+
+                # Edits need the table as it stands, including any rows
+                # appended earlier in this batch
+                if current is None:
+                    current = self._stored_rows(table)
+                    positions = self._positions(filepath, current)
+                    for offset, row in enumerate(appended):
+                        moved[row['id']] = len(current) + offset
+                position = moved[record_id] if record_id in moved else positions.get(record_id)
+                if position is None:
+                    results.append(False)
+                    continue
+                if position in edited:
+                    existing = edited[position]
+                elif position < len(current):
+                    existing = dict(current[position])
+                else:
+                    existing = appended[position - len(current)]
+                if _is_stale(existing, rev):
+                    results.append(StaleRecordError(record_id))
+                    continue
+                if action == 'update':
+                    row = stored_row(data, fieldnames, record_id, _next_rev(existing))
+                    removed.append(existing)
+                    added.append(row)
+                    edited[position] = row
+                    journal_ops.append({'op': 'update', 'id': record_id, 'row': row})
+                else:
+                    # Drop after the loop so the other positions hold
+                    moved[record_id] = None
+                    deleted.append(position)
+                    removed.append(existing)
+                    journal_ops.append({'op': 'delete', 'id': record_id})
+                results.append(True)
+
+            if journal_ops and not self.config['EDIT_JOURNAL']:
+                # One rewrite covers the whole batch, appends included
+                gone = set(deleted)
+                records = [edited.get(position, row)
+                           for position, row in enumerate(chain(current, appended))
+                           if position not in gone]
+                after = self._write_table(filepath, records, fieldnames)[1]
+            else:
+                if appended:
+                    self._append_rows(filepath, appended, fieldnames, write_header=before is None)
+                if journal_ops:
+                    with registry.phase('journal_write'):
+                        compaction_due = self.journal.record(filepath, journal_ops)
+                after = self._file_signature(filepath)
+                if journal_ops:
+                    # Only now that the batch is on disk does the cached table
+                    # change, in place: a table summed or read meanwhile is
+                    # still the one its signature says
+                    if appended:
+                        size = len(current)
+                        self.cache.extend(filepath, appended, before)
+                        if len(current) == size:
+                            # The cache had moved on from current; grow it here
+                            current.extend(appended)
+                    for position, row in edited.items():
+                        current[position] = row
+                    records = _without(current, deleted) if deleted else current
+                    records = self.cache.put(filepath, records, after)
+                    if not deleted:
+                        # Edits leave positions alone, so the index carries over
+                        entry = self._id_index.get(filepath)
+                        if entry is not None and entry[0] is current:
+                            entry[0] = records
+                elif appended:
+                    self.cache.extend(filepath, appended, before)
+            self.stats.apply(table, before, after, added=added, removed=removed, landed=landed)
+
+        if compaction_due:
+            self.journal.compact_in_background(
+                filepath, lambda path, rows: self._compact(table, path, rows, fieldnames),
+                self._load_from_disk)
+        return results
+
+
+class SqliteStorage(Storage):
+    # One SQLite table per module in a single WAL-mode database.
+    #
+    # Each worker thread keeps its own connection for the life of the process
+    # (reopened after a fork). Rows keep their insertion order through the
+    # rowid, record ids have a unique index, the columns the pages filter on
+    # are indexed, and every write bumps the table's row in _table_versions
+    # inside the same transaction, which gives all workers a shared, cheap
+    # change signature.
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._local = threading.local()
+
+    def database_path(self):
+        return self.config.get('SQLITE_PATH') or os.path.join(
+            self.config['DATA_FOLDER'], 'institutional.db')
+
+    # Queries run in the database, so reads of a table with queued writes
+    # wait for them to land rather than overlaying them
+
+    def read(self, table, filters=None):
+        self.flush(table)
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return []
+        where, params = self._where(filters)
+        with registry.phase('sqlite_read'):
+            return self._records(table, connection.execute(
+                'SELECT * FROM %s%s ORDER BY rowid' % (self._quote(table), where), params))
+
+    def _stored_record(self, table, record_id):
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return None
+        return self._fetch(connection, table, record_id)
+
+    def query(self, table, offset, limit, sort=None, descending=False, filters=None):
+        self.flush(table)
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return [], 0
+        quoted = self._quote(table)
+        where, params = self._where(filters)
+        order = 'rowid'
+        if sort:
+            column = self._quote(sort)
+            direction = 'DESC' if descending else 'ASC'
+            # Mirrors pagination.sort_key: numbers first, by value, then text
+            order = ("CASE WHEN {c} = '' OR {c} GLOB '*[^0-9.eE+-]*' THEN 1 ELSE 0 END {d}, "
+                     "CAST({c} AS REAL) {d}, lower({c}) {d}, rowid {d}").format(c=column, d=direction)
+        with registry.phase('sqlite_read'):
+            total = connection.execute('SELECT COUNT(*) FROM %s%s' % (quoted, where),
+                                       params).fetchone()[0]
+            cursor = connection.execute('SELECT * FROM %s%s ORDER BY %s LIMIT ? OFFSET ?'
+                                        % (quoted, where, order), params + [limit, offset])
+            return self._records(table, cursor), total
+
+    def fieldnames(self, table):
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return []
+        return [row[1] for row in connection.execute('PRAGMA table_info(%s)' % self._quote(table))]
+
+    def write(self, table, rows, fieldnames):
+        self.flush(table)
+        connection = self._connection()
+        with self._transaction(connection):
+            connection.execute('DROP TABLE IF EXISTS %s' % self._quote(table))
+            self._local.ready.discard(table)
+            self._create(connection, table, fieldnames)
+            self._insert(connection, table, _with_ids(rows, fieldnames))
+            self._bump_version(connection, table)
+        self.stats.invalidate(table)
+
+    def signature(self, table):
+        connection = self._connection()
+        row = connection.execute('SELECT version FROM _table_versions WHERE name = ?',
+                                 (table,)).fetchone()
+        return None if row is None else row[0]
+
+    def _stored_version(self, table):
+        return self.signature(table) or 0
+
+    def modified(self, table):
+        # SQLite keeps no per-table timestamps; the database and its WAL
+        # file change whenever any table does
+        if self.signature(table) is None:
+            return None
+        path = self.database_path()
+        return max(os.stat(name).st_mtime for name in (path, path + '-wal') if os.path.exists(name))
+
+    def stream(self, table, fieldnames, chunk_rows=1000):
+        # One SELECT read in chunks; SQLite keeps its snapshot until the
+        # statement is done
+        self.flush(table)
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return
+        existing = set(self.fieldnames(table))
+        columns = ', '.join(self._quote(name) if name in existing else "''" for name in fieldnames)
+        cursor = connection.execute('SELECT %s FROM %s ORDER BY rowid' % (columns, self._quote(table)))
+        try:
+            while True:
+                chunk = cursor.fetchmany(chunk_rows)
+                if not chunk:
+                    return
+                registry.count('idms_rows_parsed_total', len(chunk), table=table)
+                yield chunk
+        finally:
+            cursor.close()
+
+    def append_many(self, table, rows, fieldnames, batch_size=5000):
+        connection = self._connection()
+        added = []
+        with self._transaction(connection):
+            self._create(connection, table, fieldnames)
+            before = after = self.signature(table)
+            for batch in _batches(rows, batch_size):
+                stored = _new_rows(batch, fieldnames)
+                self._insert(connection, table, stored)
+                after = self._bump_version(connection, table)
+                added.extend(stored)
+        # Committed: only now do the totals count the upload
+        if added:
+            self.stats.apply(table, before, after, added=added)
+        return len(added)
+
+    def _aggregate(self, table, group_by, measures, function, filters):
+        # GROUP BY in the database; cells are read as whole numbers the way
+        # columnar.to_number reads them. Amounts (columnar.to_amount) are
+        # summed in whole cents, so the total is exact.
+        self.flush(table)
+        connection = self._connection()
+        if not self._exists(connection, table):
+            return []
+        dimensions = [self._quote(name) for name in group_by]
+        sums = []
+        for name in measures:
+            if name in AMOUNT_COLUMNS:
+                sums.append("SUM(CASE WHEN {c} GLOB '[0-9]*' AND {c} NOT GLOB '*[^0-9.]*' "
+                            "AND {c} NOT GLOB '*.*.*' AND {c} NOT GLOB '*.' "
+                            "THEN CAST(ROUND({c} * 100) AS INTEGER) ELSE 0 END)"
+                            .format(c=self._quote(name)))
+                continue
+            sums.append("SUM(CASE WHEN ({c} GLOB '[0-9]*' OR {c} GLOB '[+-][0-9]*') "
+                        "AND substr({c}, 2) NOT GLOB '*[^0-9]*' "
+                        "THEN CAST({c} AS INTEGER) ELSE 0 END)".format(c=self._quote(name)))
+        where, params = self._where(filters)
+        sql = 'SELECT %s FROM %s%s' % (', '.join(dimensions + ['COUNT(*)'] + sums),
+                                       self._quote(table), where)
+        if dimensions:
+            sql += ' GROUP BY ' + ', '.join(dimensions)
+        size = len(dimensions)
+        cents = [name in AMOUNT_COLUMNS for name in measures]
+        totals = [(tuple(row[:size]), row[size],
+                   [Decimal(total) / 100 if amount else total
+                    for total, amount in zip(row[size + 1:], cents)])
+                  for row in connection.execute(sql, params) if row[size]]
+        return aggregation.finish(group_by, measures, function, totals)
+
+    def _apply_batch(self, table, ops, landed=()):
+        fieldnames = ops[-1][3]
+        quoted = self._quote(table)
+        columns = storage_fieldnames(fieldnames)
+        assignments = ', '.join('%s = ?' % self._quote(name) for name in columns)
+        results, added, removed = [], [], []
+        connection = self._connection()
+        with self._transaction(connection):
+            before = self.signature(table)
+            self._create(connection, table, fieldnames)
+            for action, record_id, data, _, rev in ops:
+                if action == 'append':
+                    row = stored_row(data, fieldnames, record_id or new_record_id(), 1)
+                    self._insert(connection, table, [row])
+                    added.append(row)
+                    results.append(row['id'])
+                    continue
+                existing = self._fetch(connection, table, record_id)
+                if existing is None:
+                    results.append(False)
+                    continue
+                if _is_stale(existing, rev):
+                    results.append(StaleRecordError(record_id))
+                    continue
+                removed.append(existing)
+                if action == 'update':
+                    row = stored_row(data, fieldnames, record_id, _next_rev(existing))
+                    connection.execute('UPDATE %s SET %s WHERE id = ?' % (quoted, assignments),
+                                       [row[name] for name in columns] + [record_id])
+                    added.append(row)
+                else:
+                    connection.execute('DELETE FROM %s WHERE id = ?' % quoted, (record_id,))
+                results.append(True)
+            after = self._bump_version(connection, table)
+        self.stats.apply(table, before, after, added=added, removed=removed, landed=landed)
+        return results
+
+    def _connection(self):
+        local = self._local
+        path = self.database_path()
+        if getattr(local, 'connection', None) is None or local.pid != os.getpid() or local.path != path:
+            connection = sqlite3.connect(path, timeout=30, isolation_level=None,
+                                         check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=%s' % ('FULL' if self.config['FSYNC_WRITES'] else 'NORMAL'))
+            connection.execute('CREATE TABLE IF NOT EXISTS _table_versions '
+                               '(name TEXT PRIMARY KEY, version INTEGER NOT NULL)')
+            local.connection, local.pid, local.path = connection, os.getpid(), path
+            local.ready = set()
+        return local.connection
+
+    def _transaction(self, connection):
+        return _Transaction(connection)
+
+    def _exists(self, connection, table):
+        return connection.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                                  (table,)).fetchone() is not None
+
+    def _create(self, connection, table, fieldnames):
+        quoted = self._quote(table)
+        columns = ', '.join("%s TEXT NOT NULL DEFAULT ''" % self._quote(name)
+                            for name in storage_fieldnames(fieldnames))
+        connection.execute('CREATE TABLE IF NOT EXISTS %s (%s)' % (quoted, columns))
+        if table in self._local.ready:
+            return
+
+        # Tables imported before records had ids get them now
+        existing = [row[1] for row in connection.execute('PRAGMA table_info(%s)' % quoted)]
+        for name in RECORD_COLUMNS:
+            if name not in existing:
+                connection.execute("ALTER TABLE %s ADD COLUMN %s TEXT NOT NULL DEFAULT ''"
+                                   % (quoted, self._quote(name)))
+        connection.execute("UPDATE %s SET id = lower(hex(randomblob(8))) WHERE id = ''" % quoted)
+        connection.execute("UPDATE %s SET rev = '1' WHERE rev = ''" % quoted)
+
+        connection.execute('CREATE UNIQUE INDEX IF NOT EXISTS %s ON %s (id)' % (
+            self._quote('idx_%s_id' % table), quoted))
+        for name in INDEXED_COLUMNS:
+            if name in fieldnames:
+                connection.execute('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' % (
+                    self._quote('idx_%s_%s' % (table, name)), quoted, self._quote(name)))
+        self._local.ready.add(table)
+
+    def _insert(self, connection, table, rows):
+        if not rows:
+            return
+        columns = list(rows[0])
+        connection.executemany('INSERT INTO %s (%s) VALUES (%s)' % (
+            self._quote(table), ', '.join(self._quote(name) for name in columns),
+            ', '.join('?' for _ in columns)), map(itemgetter(*columns), rows))
+
+    def _fetch(self, connection, table, record_id):
+        records = self._records(table, connection.execute(
+            'SELECT * FROM %s WHERE id = ?' % self._quote(table), (record_id,)))
+        return records[0] if records else None
+
+    def _where(self, filters):
+        if not filters:
+            return '', []
+        return (' WHERE ' + ' AND '.join('%s = ?' % self._quote(name) for name in filters),
+                list(filters.values()))
+
+    @staticmethod
+    def _records(table, cursor):
+        columns = [description[0] for description in cursor.description]
+        records = [{name: '' if value is None else value for name, value in zip(columns, row)}
+                   for row in cursor]
+        registry.count('idms_rows_parsed_total', len(records), table=table)
+        return records
+
+    def _bump_version(self, connection, table):
+        connection.execute('INSERT INTO _table_versions (name, version) VALUES (?, 1) '
+                           'ON CONFLICT(name) DO UPDATE SET version = version + 1', (table,))
+        return connection.execute('SELECT version FROM _table_versions WHERE name = ?',
+                                  (table,)).fetchone()[0]
+
+    @staticmethod
+    def _quote(name):
+        if not _IDENTIFIER.match(name):
+            raise ValueError('invalid table or column name: %r' % name)
+        return '"%s"' % name
+
+
+class _Transaction:
+    # BEGIN IMMEDIATE takes the write lock up front so concurrent workers
+    # queue on SQLite's busy timeout instead of failing mid-transaction
+    def __init__(self, connection):
+        self.connection = connection
+        self.phase = registry.phase('sqlite_write')
+
+    def __enter__(self):
+        self.phase.__enter__()
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.connection.execute('COMMIT' if exc_type is None else 'ROLLBACK')
+        finally:
+            self.phase.__exit__(None, None, None)
+        return False
+
+
+BACKENDS = {
+    'csv': CsvStorage,
+    'sqlite': SqliteStorage,
+}
+
+
+def create_storage(config):
+    backend = config['STORAGE_BACKEND']
+    if backend not in BACKENDS:
+        raise ValueError('unknown STORAGE_BACKEND %r (expected one of %s)'
+                         % (backend, ', '.join(sorted(BACKENDS))))
+    return BACKENDS[backend](config)
+
+
+def _table_in_worker(function, config, table):
+    storage = create_storage(config)
+    try:
+        return function(storage, table)
+    finally:
+        storage.close()
+
+
+def map_in_processes(storage, function, tables, jobs):
+    # [function(storage, table) for each of tables], with the tables split
+    # across jobs worker processes that each read through their own storage
+    # (one file per table with the CSV backend); queued writes are flushed
+    # first so the workers see them. function must be a module-level one.
+    storage.flush()
+    config = dict(storage.config, WRITE_DURABILITY='synchronous')
+    # spawn rather than fork: the app process has writer threads whose
+    # locks a forked child could inherit mid-acquire
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tables)), mp_context=context) as pool:
+        return list(pool.map(_table_in_worker, [function] * len(tables), [config] * len(tables),
+                             tables))
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def file_signature(filepath):
+    # (mtime_ns, size, inode) changes whenever the file is rewritten, appended
+    # to or replaced, including by something outside this process.
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+def json_signature(signature):
+    # A signature as it reads back from JSON (tuples become lists), for
+    # comparing with one saved in a file
+    return json.loads(json.dumps(signature))
+
+
+class TableCache:
+    # Process-wide cache of parsed CSV tables keyed by file path.
+    #
+    # Every entry remembers the file signature it was parsed from, so a read
+    # is a stat() plus a dictionary lookup while the file is unchanged. The
+    # app's own writes push the new rows straight into the cache; anything
+    # else that touches the file shows up as a signature mismatch and forces
+    # a re-parse. Entries are evicted least-recently-used first once either
+    # the table count or the total row count goes over its limit.
+    #
+    # With share set, share(filepath, rows, signature) is offered every
+    # table the cache stores or hands out and may return an equivalent copy
+    # to keep in its place (one mapped from memory other processes share).
+
+    def __init__(self, max_tables=32, max_rows=1000000, signature_of=file_signature, share=None):
+        self.max_tables = max_tables
+        self.max_rows = max_rows
+        self.signature_of = signature_of
+        self.share = share
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # filepath -> (signature, rows)
+        self._versions = {}            # filepath -> (signature, version)
+        self._row_count = 0
+        self._lock = threading.RLock()
+
+    def get(self, filepath, loader):
+        signature = self.signature_of(filepath)
+        if signature is None:
+            return None
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(filepath)
+                self.hits += 1
+                if self.share is None:
+                    return entry[1]
+                rows = entry[1]
+            else:
+                rows = None
+                self.misses += 1
+        if rows is not None:
+            return self._shared(filepath, rows, signature)
+
+        rows = loader(filepath)
+        # Only keep the result if nobody changed the file while we parsed it
+        if self.signature_of(filepath) == signature:
+            rows = self._store(filepath, rows, signature, changed=False)
+        return rows
+
+    def put(self, filepath, rows, signature=None, changed=True):
+        # Record rows the app has just written to filepath. Pass changed=False
+        # when the content is the same and only its on-disk form moved.
+        # Returns the rows as cached (see share).
+        if signature is None:
+            signature = self.signature_of(filepath)
+        return self._store(filepath, rows, signature, changed)
+
+    def extend(self, filepath, rows, previous_signature):
+        # Extend a cached table in place after an append, provided the cached
+        # copy was current right before the write. Otherwise drop it and let
+        # the next read re-parse the file.
+        signature = self.signature_of(filepath)
+        with self._lock:
+            entry = self._entries.get(filepath)
+            if entry is None or previous_signature is None or entry[0] != previous_signature:
+                self._discard(filepath)
+                self._bump_version(filepath, signature, changed=True)
+                return
+            # Readers only ever get copies of the list, so extend it in place
+            entry[1].extend(rows)
+            self._entries[filepath] = (signature, entry[1])
+            self._entries.move_to_end(filepath)
+            self._row_count += len(rows)
+            self._bump_version(filepath, signature, changed=True)
+            self._evict(keep=filepath)
+
+    def invalidate(self, filepath=None):
+        with self._lock:
+            if filepath is None:
+                self._entries.clear()
+                self._row_count = 0
+            else:
+                self._discard(filepath)
+
+    def version(self, filepath):
+        # Monotonic per-table data version; survives eviction as long as the
+        # file itself has not changed.
+        signature = self.signature_of(filepath)
+        with self._lock:
+            return self._bump_version(filepath, signature)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'tables': len(self._entries),
+                'rows': self._row_count,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _store(self, filepath, rows, signature, changed):
+        if self.share is not None and signature is not None:
+            rows = self.share(filepath, rows, signature)
+        with self._lock:
+            self._discard(filepath)
+            self._entries[filepath] = (signature, rows)
+            self._row_count += len(rows)
+            self._bump_version(filepath, signature, changed)
+            self._evict(keep=filepath)
+        return rows
+
+    def _shared(self, filepath, rows, signature):
+        # A cached entry made private again (extended in place) is offered
+        # to share() on its next read
+        shared = self.share(filepath, rows, signature)
+        if shared is not rows:
+            with self._lock:
+                entry = self._entries.get(filepath)
+                if entry is not None and entry[0] == signature and entry[1] is rows:
+                    self._entries[filepath] = (signature, shared)
+        return shared
+
+    def _bump_version(self, filepath, signature, changed=False):
+        known = self._versions.get(filepath)
+        if known is not None and known[0] == signature and not changed:
+            return known[1]
+        version = known[1] + 1 if known is not None else 1
+        self._versions[filepath] = (signature, version)
+        return version
+
+    def _discard(self, filepath):
+        entry = self._entries.pop(filepath, None)
+        if entry is not None:
+            self._row_count -= len(entry[1])
+
+    def _evict(self, keep):
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_tables or self._row_count > self.max_rows):
+            oldest = next(iter(self._entries))
+            if oldest == keep:
+                self._entries.move_to_end(keep)
+                continue
+            self._discard(oldest)
+            self.evictions += 1
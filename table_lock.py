@@ -0,0 +1,80 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to locking within this process only
+    fcntl = None
+
+LOCK_SUFFIX = '.lock'
+
+
+class TableLocks:
+    # Advisory per-table locks that hold across threads and worker processes.
+    #
+    # Every acquisition opens "<table>.csv.lock" and flock()s it. flock locks
+    # belong to the open file description, so two threads of one process
+    # exclude each other exactly like two separate workers do. A thread that
+    # already holds a table's lock can take it again without blocking.
+
+    def __init__(self):
+        self._held = threading.local()
+        self._fallback = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def exclusive(self, filepath):
+        with self._acquire(filepath, exclusive=True):
+            yield
+
+    @contextmanager
+    def shared(self, filepath):
+        with self._acquire(filepath, exclusive=False):
+            yield
+
+    def held(self, filepath):
+        return filepath in self._held_by_thread()
+
+    @contextmanager
+    def _acquire(self, filepath, exclusive):
+        held = self._held_by_thread()
+        if filepath in held:
+            if exclusive and not held[filepath]:
+                raise RuntimeError('cannot upgrade a shared lock on %s' % filepath)
+            yield
+            return
+
+        if fcntl is None:
+            with self._fallback_lock(filepath):
+                held[filepath] = exclusive
+                try:
+                    yield
+                finally:
+                    del held[filepath]
+            return
+
+        fd = os.open(filepath + LOCK_SUFFIX, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            held[filepath] = exclusive
+            try:
+                yield
+            finally:
+                del held[filepath]
+        finally:
+            # Closing the descriptor releases the flock
+            os.close(fd)
+
+    def _held_by_thread(self):
+        held = getattr(self._held, 'tables', None)
+        if held is None:
+            held = self._held.tables = {}
+        return held
+
+    def _fallback_lock(self, filepath):
+        with self._guard:
+            lock = self._fallback.get(filepath)
+            if lock is None:
+                lock = self._fallback[filepath] = threading.Lock()
+            return lock
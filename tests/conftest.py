@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+from fragment_cache import FragmentCache  # noqa: E402
+from storage import create_storage  # noqa: E402
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def storage(request, tmp_path, monkeypatch):
+    # A fresh storage of each backend over an empty data folder, installed
+    # as the one the app's routes use
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app_module.app.config, 'STORAGE_BACKEND', request.param)
+    monkeypatch.setitem(app_module.app.config, 'FSYNC_WRITES', False)
+    storage = create_storage(app_module.app.config)
+    monkeypatch.setattr(app_module, 'storage', storage)
+    monkeypatch.setattr(app_module, 'fragments', FragmentCache())
+    yield storage
+    storage.close()
@@ -0,0 +1,35 @@
+# Sums and averages of amount columns (median_salary), which are stored
+# with two decimals, on both backends and through the report.
+import pytest
+
+import app as app_module
+import reports
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def storage(request, tmp_path):
+    config = dict(app_module.app.config, DATA_FOLDER=str(tmp_path), STORAGE_BACKEND=request.param,
+                  SQLITE_PATH=None, WRITE_DURABILITY='synchronous')
+    storage = app_module.create_storage(config)
+    module = app_module.MODULES['placement']
+    for salary in ['50000', '20000.5']:
+        row, problems = module.parse({'male_placed': '1', 'female_placed': '2', 'median_salary': salary})
+        assert not problems
+        storage.append('placement', row, module.fieldnames)
+    # A hand-edited cell that is not an amount counts as 0
+    storage.append('placement', dict(row, median_salary='n/a'), module.fieldnames)
+    yield storage
+    storage.close()
+
+
+def test_amounts_are_summed_as_decimals(storage):
+    total, = storage.aggregate('placement', [], ['median_salary', 'total_placed'])
+    assert total == {'count': 3, 'median_salary': 70000.5, 'total_placed': 9}
+    average, = storage.aggregate('placement', [], ['median_salary'], 'avg')
+    assert average['median_salary'] == 23333.5
+
+
+def test_report_averages_amounts(storage, tmp_path):
+    sections, _ = reports.build_report(storage, reports.SectionCache(str(tmp_path / 'reports')))
+    placement = sections[reports.SECTION_TABLES.index('placement')]
+    assert placement['averages'] == {'median_salary': 23333.5}
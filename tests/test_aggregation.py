@@ -0,0 +1,59 @@
+# Grouped sums and averages: both backends, columnar and row tables, and
+# the /aggregate endpoint agree with a sum worked out by hand.
+import app as app_module
+
+RESULTS = ['sno', 'prog', 'year', 'category', 'total_male', 'total_female']
+
+
+def _results(storage):
+    storage.write('examination_results', [
+        {'sno': '1', 'prog': 'BSc', 'year': '2023', 'category': 'Regular', 'total_male': '10',
+         'total_female': '4'},
+        {'sno': '2', 'prog': 'BSc', 'year': '2023', 'category': 'Distance', 'total_male': '3',
+         'total_female': 'x'},
+        {'sno': '3', 'prog': 'MSc', 'year': '2024', 'category': 'Regular', 'total_male': '6',
+         'total_female': '2'},
+    ], RESULTS)
+
+
+def test_grouped_sums_and_averages(storage):
+    _results(storage)
+    assert storage.aggregate('examination_results', ['category'],
+                             ['total_male', 'total_female']) == [
+        {'category': 'Distance', 'count': 1, 'total_male': 3, 'total_female': 0},
+        {'category': 'Regular', 'count': 2, 'total_male': 16, 'total_female': 6}]
+    assert storage.aggregate('examination_results', [], ['total_male'], 'avg') == [
+        {'count': 3, 'total_male': 6.33}]
+    assert storage.aggregate('examination_results', ['year'], ['total_male'],
+                             filters={'category': 'Regular'}) == [
+        {'year': '2023', 'count': 1, 'total_male': 10},
+        {'year': '2024', 'count': 1, 'total_male': 6}]
+
+
+def test_row_tables_group_the_same_way(storage):
+    storage.write('hostels', [
+        {'sno': '1', 'type': 'Boys', 'capacity': '100'},
+        {'sno': '2', 'type': 'Girls', 'capacity': '80'},
+        {'sno': '3', 'type': 'Boys', 'capacity': '20'}], ['sno', 'type', 'capacity'])
+    assert storage.aggregate('hostels', [], ['capacity']) == [{'count': 3, 'capacity': 200}]
+
+
+def test_cached_result_follows_writes(storage):
+    _results(storage)
+    assert storage.aggregate('examination_results', [], ['total_male'])[0]['total_male'] == 19
+    storage.append('examination_results', {'sno': '4', 'prog': 'MSc', 'year': '2024',
+                                           'category': 'Regular', 'total_male': '1',
+                                           'total_female': '1'}, RESULTS)
+    assert storage.aggregate('examination_results', [], ['total_male'])[0]['total_male'] == 20
+
+
+def test_endpoint(storage):
+    _results(storage)
+    client = app_module.app.test_client()
+    response = client.get('/aggregate/examination_results?group_by=year&measure=total_female'
+                          '&function=sum')
+    assert response.json['rows'] == [{'year': '2023', 'count': 2, 'total_female': 4},
+                                     {'year': '2024', 'count': 1, 'total_female': 2}]
+    assert client.get('/aggregate/examination_results?group_by=sno').status_code == 400
+    assert client.get('/aggregate/examination_results?function=median').status_code == 400
+    assert client.get('/aggregate/no_such_table').status_code == 404
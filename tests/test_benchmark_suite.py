@@ -0,0 +1,47 @@
+# benchmarks/suite.py: the synthetic data it generates is valid for every
+# module, and compare flags only changes past the threshold.
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                'benchmarks'))
+
+import app as app_module  # noqa: E402
+import suite  # noqa: E402
+from bulk_import import RowChecker  # noqa: E402
+from schema import MODULES  # noqa: E402
+
+
+@pytest.mark.parametrize('backend', ['csv', 'sqlite'])
+def test_generated_tables_pass_the_import_checks(tmp_path, backend):
+    suite.generate(str(tmp_path), 50, 1, app_module.MODULE_TABLES, backend)
+    config = dict(app_module.app.config, DATA_FOLDER=str(tmp_path), STORAGE_BACKEND=backend,
+                  SQLITE_PATH=None)
+    storage = app_module.create_storage(config)
+    for table in app_module.MODULE_TABLES:
+        fieldnames = app_module.MODULE_FIELDNAMES[table]
+        rows = [{name: row[name] for name in fieldnames} for row in storage.read(table)]
+        assert len(rows) == 50, table
+        assert RowChecker(MODULES[table]).parse(rows) == (rows, {}), table
+
+
+def test_percentile_interpolates():
+    assert suite.percentile([1, 2, 3, 4], 0.5) == 2.5
+    assert suite.percentile([], 0.5) is None
+
+
+def _run(p95, throughput, rss=100):
+    stats = {'p50_ms': 1.0, 'p95_ms': p95, 'p99_ms': 5.0, 'throughput': throughput}
+    return {'runs': [{'backend': 'csv', 'rows': 1000, 'peak_rss_mb': rss,
+                      'routes': {'departments get': stats}}]}
+
+
+def test_compare_flags_regressions_past_the_threshold():
+    lines, regressions = suite.compare(_run(2.0, 100), _run(2.1, 95), 0.10, 0.5)
+    assert (lines, regressions) == ([], 0)
+    lines, regressions = suite.compare(_run(2.0, 100), _run(4.0, 50, rss=80), 0.10, 0.5)
+    assert regressions == 2
+    assert sum(line.startswith('improved') for line in lines) == 1
+    assert any('departments get p95' in line for line in lines)
@@ -0,0 +1,106 @@
+# Bulk imports: uploads are read as they stream in, bad lines are reported
+# and skipped, and the good ones are stored in one transaction. Uploads that
+# leave out total columns have them worked out from their parts.
+import io
+
+import app as app_module
+from bulk_import import RowChecker, read_rows
+from schema import MODULES
+
+NSS = ['male', 'female', 'total']
+
+
+def _read(text, format='csv'):
+    return list(read_rows(io.BytesIO(text.encode('utf-8')), format))
+
+
+def test_read_rows_from_csv_and_json_lines():
+    assert _read('male, female\n1,2\n\n3,4,5\n') == [
+        (2, {'male': '1', 'female': '2'}, None), (4, None, 'more values than header columns')]
+    assert _read('{"male": 1, "female": null}\n[1]\n{bad\n', 'jsonl')[:2] == [
+        (1, {'male': '1', 'female': ''}, None), (2, None, 'expected a JSON object')]
+
+
+def test_checker_explains_only_failing_rows():
+    rows = [{'male': '3', 'female': '4', 'total': '7'},
+            {'male': '3', 'female': 'four', 'total': '7'},
+            {'male': '3', 'female': '4', 'total': '8'},
+            {'male': '3', 'female': '4', 'total': '7', 'remarks': ''}]
+    checker = RowChecker(MODULES['nss_enrollment'])
+    assert checker.parse(rows)[1] == {
+        1: ["female: 'four' is not a whole number"],
+        2: ['total is 8 but male + female add up to 7'],
+        3: ['unknown columns: remarks']}
+    assert checker.parse(rows[:1]) == (rows[:1], {})
+
+
+def test_checker_stores_the_parsed_spelling():
+    parsed, problems = RowChecker(MODULES['nss_enrollment']).parse(
+        [{'male': '03', 'female': ' 4', 'total': '7'}, {'male': '1', 'female': '', 'total': '1'}])
+    assert problems == {}
+    assert parsed == [{'male': '3', 'female': '4', 'total': '7'},
+                      {'male': '1', 'female': '0', 'total': '1'}]
+
+
+def test_import_route_stores_valid_rows_and_reports_the_rest(storage):
+    client = app_module.app.test_client()
+    response = client.post('/nss_enrollment/import', headers={'Content-Type': 'text/csv'},
+                           data=b'male,female,total\n1,2,3\n1,1,3\n4,4,8\n')
+    assert response.status_code == 200
+    assert (response.json['rows'], response.json['imported'], response.json['rejected']) == (3, 2, 1)
+    assert response.json['errors'][0]['line'] == 3
+    assert [row['total'] for row in storage.read('nss_enrollment')] == ['3', '8']
+    assert all(row['id'] for row in storage.read('nss_enrollment'))
+
+
+def test_multipart_json_lines_upload(storage):
+    client = app_module.app.test_client()
+    upload = (io.BytesIO(b'{"sno": 1, "department_name": "Physics"}\n'), 'departments.jsonl')
+    response = client.post('/departments/import', data={'file': upload},
+                           content_type='multipart/form-data')
+    assert response.json['imported'] == 1
+    assert storage.dashboard()['departments'] == 1
+
+
+def test_unreadable_upload_keeps_no_rows(storage):
+    storage.write('nss_enrollment', [{'male': '1', 'female': '1', 'total': '2'}], NSS)
+    body = b'male,female,total\n' + b'1,1,2\n' * 20 + b'\xff\xfe,1,2\n'
+    response = app_module.app.test_client().post(
+        '/nss_enrollment/import?format=csv', data=body,
+        headers={'Content-Type': 'application/octet-stream'})
+    assert response.status_code == 400 and response.json['imported'] == 0
+    assert len(storage.read('nss_enrollment')) == 1
+    fresh = app_module.create_storage(app_module.app.config)
+    assert len(fresh.read('nss_enrollment')) == 1
+
+
+def _check(table, text):
+    rows = [row for _, row, _ in read_rows(io.BytesIO(text.encode('utf-8')), 'csv')]
+    return RowChecker(MODULES[table]).parse(rows)
+
+
+def test_missing_total_is_filled_in():
+    parsed, problems = _check('nss_enrollment', 'male,female\n3,4\n5,\n')
+    assert not problems
+    assert parsed == [{'male': '3', 'female': '4', 'total': '7'},
+                      {'male': '5', 'female': '0', 'total': '5'}]
+
+
+def test_missing_head_count_totals_are_filled_in():
+    module = MODULES['student_enrollment']
+    columns = [name for name in module.fieldnames if name not in module.derived]
+    values = ['1', 'Regular'] + ['2'] * (len(columns) - 2)
+    parsed, problems = _check('student_enrollment', '%s\n%s\n' % (','.join(columns), ','.join(values)))
+    assert not problems
+    assert [parsed[0][name] for name in ('total_male', 'total_female', 'total_transgender')] == \
+        ['10', '10', '10']
+
+
+def test_missing_part_is_still_rejected():
+    _, problems = _check('nss_enrollment', 'female,total\n4,4\n')
+    assert problems == {0: ['missing columns: male']}
+
+
+def test_given_total_must_agree():
+    _, problems = _check('nss_enrollment', 'male,female,total\n3,4,8\n')
+    assert list(problems) == [0]
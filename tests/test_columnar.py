@@ -0,0 +1,126 @@
+# ColumnarTable: rows stored column by column must read back exactly as
+# they went in, edits must show through every read without touching the
+# columns, and copies, deletes and snapshots must leave earlier views
+# untouched.
+import io
+from array import array
+
+from columnar import ColumnarTable, MappedTable, read_image_header, write_image
+from storage import CsvStorage
+
+FIELDNAMES = ['sno', 'category', 'total_male', 'total_female', 'id', 'rev']
+
+
+def _rows():
+    return [
+        {'sno': '1', 'category': 'Regular', 'total_male': '10', 'total_female': '12',
+         'id': 'a', 'rev': '1'},
+        {'sno': '2', 'category': 'Distance', 'total_male': '', 'total_female': '05',
+         'id': 'b', 'rev': '1'},
+        {'sno': '3', 'category': 'Regular', 'total_male': 'n/a', 'total_female': '99999999999',
+         'id': 'c', 'rev': '2'},
+    ]
+
+
+def test_values_round_trip_exactly():
+    table = ColumnarTable.from_rows(FIELDNAMES, _rows())
+    assert [dict(row) for row in table] == _rows()
+    assert table.strings('total_female') == ['12', '05', '99999999999']
+    assert [table.number(position, 'total_male') for position in range(3)] == [10, 0, 0]
+
+
+def test_matching_filters_on_columns():
+    table = ColumnarTable.from_rows(FIELDNAMES, _rows())
+    assert table.matching({'category': 'Regular'}) == [0, 2]
+    assert table.matching({'category': 'Regular', 'rev': '2'}) == [2]
+    assert table.matching({'total_male': 'n/a'}) == [2]
+    assert table.matching({'category': 'Unknown'}) == []
+
+
+def test_copy_and_without_leave_the_original_alone():
+    table = ColumnarTable.from_rows(FIELDNAMES, _rows())
+    view = table[1]
+    edited = table.copy()
+    edited[1] = dict(_rows()[1], category='Online', total_male='7')
+    shorter = table.without([0])
+    assert dict(view) == _rows()[1]
+    assert edited[1]['category'] == 'Online' and edited.number(1, 'total_male') == 7
+    assert [row['id'] for row in shorter] == ['b', 'c']
+    assert shorter.strings('total_male') == ['', 'n/a']
+
+
+def test_edits_are_laid_over_the_columns(tmp_path):
+    table = ColumnarTable.from_rows(FIELDNAMES, _rows())
+    columns = {name: column[:] for name, column in table._columns.items()}
+    before = table.snapshot()
+    table[1] = dict(_rows()[1], category='Online', total_male='7', total_female='6')
+    table[-1] = dict(_rows()[2], category='Regular', total_male='', total_female='1')
+    assert table._columns == columns
+    assert [row['category'] for row in table] == ['Regular', 'Online', 'Regular']
+    assert table.strings('total_male', 1) == ['7', '']
+    assert table.strings_at('total_female', [2, 1]) == ['1', '6']
+    assert table.tuples(['sno', 'category'], 1, 2) == [('2', 'Online')]
+    assert table.number(1, 'total_male') == 7
+    assert table.numbers('total_male') == (array('i', [10, 7, 0]), {2: ''})
+    assert table.matching({'category': 'Online'}) == [1]
+    assert table.matching({'total_male': ''}) == [2]
+    assert sorted(table.totals(['category'], ['total_male', 'total_female'])) == \
+        [(('Online',), 1, [7, 6]), (('Regular',), 2, [10, 13])]
+    assert table.groups(['category']) == {('Regular',): [0, 2], ('Online',): [1]}
+    # Copies and deletes carry the edits; the snapshot does not
+    assert [dict(row) for row in table.copy()] == [dict(row) for row in table]
+    assert [row['category'] for row in table.without([0])] == ['Online', 'Regular']
+    assert [dict(row) for row in before] == _rows()
+    assert before.totals(['category'], ['total_male'])[0] == (('Regular',), 2, [10])
+
+
+def test_mapped_table_keeps_its_image_read_only():
+    file = io.BytesIO()
+    write_image(ColumnarTable.from_rows(FIELDNAMES, _rows()[:2]), file)
+    image = bytes(file.getvalue())
+    table = MappedTable(image, read_image_header(image))
+    other = table.snapshot()
+    table.append(_rows()[2])
+    table[0] = dict(_rows()[0], category='Online')
+    assert [dict(row) for row in table] == [dict(_rows()[0], category='Online')] + _rows()[1:]
+    assert table.strings('total_male', 1) == ['', 'n/a']
+    assert table.numbers('total_female') == (array('i', [12, 0, 0]), {1: '05', 2: '99999999999'})
+    assert table.matching({'category': 'Regular'}) == [2]
+    assert sorted(table.totals(['category'], ['total_male'])) == \
+        [(('Distance',), 1, [0]), (('Online',), 1, [10]), (('Regular',), 1, [0])]
+    assert [dict(row) for row in table.copy()] == [dict(row) for row in table]
+    # The image, and any other table over it, are as they were
+    assert [dict(row) for row in other] == _rows()[:2]
+    assert [dict(row) for row in MappedTable(image, read_image_header(image))] == _rows()[:2]
+
+
+def test_storage_edits_the_cached_table_in_place(storage):
+    fieldnames = ['sno', 'category', 'total_male', 'total_female', 'total_transgender']
+    storage.write('student_enrollment', [dict(_rows()[0], total_transgender='0'),
+                                         dict(_rows()[1], total_transgender='0')], fieldnames)
+    record = storage.read('student_enrollment')[1]
+    chunks = storage.stream('student_enrollment', ['sno', 'category'], chunk_rows=1)
+    assert next(chunks) == [('1', 'Regular')]
+    cached = storage.scan('student_enrollment')
+    storage.update('student_enrollment', record['id'],
+                   dict(record, category='Online', total_male='3'), fieldnames)
+    if isinstance(storage, CsvStorage):
+        assert storage.scan('student_enrollment') is cached
+    assert [row['category'] for row in storage.read('student_enrollment')] == \
+        ['Regular', 'Online']
+    # A stream keeps the table as it was when it began
+    assert list(chunks) == [[('2', 'Distance')]]
+
+
+def test_columnar_tables_are_cached_as_columns(storage):
+    fieldnames = ['sno', 'category', 'total_male', 'total_female', 'total_transgender']
+    storage.write('student_enrollment', [dict(_rows()[0], total_transgender='0')], fieldnames)
+    record = storage.read('student_enrollment')[0]
+    storage.update('student_enrollment', record['id'],
+                   {'sno': '1', 'category': 'Distance', 'total_male': '4', 'total_female': '4',
+                    'total_transgender': '1'}, fieldnames)
+    assert [row['category'] for row in storage.read('student_enrollment')] == ['Distance']
+    assert storage.read('student_enrollment', {'category': 'Regular'}) == []
+    assert storage.dashboard()['total_students'] == 9
+    if isinstance(storage, CsvStorage):
+        assert isinstance(storage._rows('student_enrollment'), ColumnarTable)
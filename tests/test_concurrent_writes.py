@@ -0,0 +1,76 @@
+# Concurrent writes: two worker processes with four threads each add rows to
+# and edit rows of the same table through the app. Every add must land once
+# with a fresh id, and every thread's last edit to the row it owns must
+# survive.
+import multiprocessing
+import threading
+
+import pytest
+
+import app as app_module
+from storage import CsvStorage, create_storage
+
+PROCESSES = 2
+THREADS = 4
+REQUESTS = 25
+FIELDNAMES = ['sno', 'name', 'type', 'capacity', 'students_residing']
+
+
+def _owner_row(worker, thread):
+    return {'sno': 'owner-%d-%d' % (worker, thread), 'name': 'Hostel', 'type': 'Boys',
+            'capacity': '1000', 'students_residing': '0'}
+
+
+def _worker(worker, group_commit, start, owner_ids):
+    app_module.app.config['GROUP_COMMIT'] = group_commit
+    if isinstance(app_module.storage, CsvStorage):
+        # Compactions rewrite the whole table while other writers append to it
+        app_module.storage.journal.max_entries = 10
+    failures = []
+
+    def run(thread):
+        client = app_module.app.test_client()
+        owner = _owner_row(worker, thread)
+        record_id = owner_ids[owner['sno']]
+        for number in range(REQUESTS):
+            added = client.post('/hostels', data={
+                'action': 'add', 'sno': 'add-%d-%d-%d' % (worker, thread, number), 'name': 'New',
+                'type': 'Girls', 'capacity': '10', 'students_residing': '1'})
+            edited = client.post('/hostels', data=dict(
+                owner, action='edit', id=record_id, students_residing=str(number + 1)))
+            if added.status_code != 302 or edited.status_code != 302:
+                failures.append((added.status_code, edited.status_code))
+
+    start.wait()
+    threads = [threading.Thread(target=run, args=(thread,)) for thread in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise SystemExit(1)
+
+
+@pytest.mark.parametrize('group_commit', [False, True])
+def test_no_lost_or_duplicated_writes(storage, group_commit):
+    storage.write('hostels', [_owner_row(worker, thread) for worker in range(PROCESSES)
+                              for thread in range(THREADS)], FIELDNAMES)
+    owner_ids = {row['sno']: row['id'] for row in storage.read('hostels')}
+
+    context = multiprocessing.get_context('fork')
+    start = context.Barrier(PROCESSES)
+    workers = [context.Process(target=_worker, args=(worker, group_commit, start, owner_ids))
+               for worker in range(PROCESSES)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert [worker.exitcode for worker in workers] == [0] * PROCESSES
+
+    rows = create_storage(app_module.app.config).read('hostels')
+    snos = [row['sno'] for row in rows]
+    assert len(snos) == len(set(snos)) == PROCESSES * THREADS * (REQUESTS + 1)
+    assert len({row['id'] for row in rows}) == len(rows)
+    for row in rows:
+        if row['sno'].startswith('owner-'):
+            assert row['students_residing'] == str(REQUESTS)
@@ -0,0 +1,50 @@
+# Derived totals: blank totals are worked out on write, and the batch
+# checker finds and repairs stored totals that disagree with their parts.
+import app as app_module
+import consistency
+from schema import MODULES
+
+NSS = ['male', 'female', 'total']
+
+
+def _seed(storage):
+    storage.write('nss_enrollment', [{'male': '1', 'female': '2', 'total': '3'},
+                                     {'male': '4', 'female': '4', 'total': '9'},
+                                     {'male': 'x', 'female': '1', 'total': '1'}], NSS)
+    return storage.read('nss_enrollment')
+
+
+def test_blank_total_is_worked_out():
+    row, problems = MODULES['nss_enrollment'].parse({'male': '3', 'female': '4'})
+    assert problems == []
+    assert row['total'] == '7'
+
+
+def test_check_lists_wrong_and_unreadable_rows(storage):
+    rows = _seed(storage)
+    check = consistency.check_table(storage, 'nss_enrollment')
+    assert check.rows == 3
+    assert [(entry['id'], entry['totals']) for entry in check.wrong] == \
+        [(rows[1]['id'], {'total': [9, 8]})]
+    assert check.unreadable == [{'id': rows[2]['id'], 'column': 'male', 'value': 'x'}]
+
+
+def test_repair_skips_rows_changed_since_the_check(storage):
+    rows = _seed(storage)
+    storage.append('nss_enrollment', {'male': '2', 'female': '2', 'total': '5'}, NSS)
+    check = consistency.check_table(storage, 'nss_enrollment')
+    assert len(check.wrong) == 2
+    storage.update('nss_enrollment', rows[1]['id'], {'male': '4', 'female': '5', 'total': '9'},
+                   NSS)
+    consistency.repair(storage, check)
+    assert (check.repaired, check.skipped) == (1, 1)
+    assert [row['total'] for row in storage.read('nss_enrollment')] == ['3', '9', '1', '4']
+
+
+def test_check_totals_command_exits_while_problems_remain(storage):
+    _seed(storage)
+    runner = app_module.app.test_cli_runner()
+    result = runner.invoke(args=['check-totals', 'nss_enrollment', '--repair'])
+    assert result.exit_code == 1
+    assert 'repaired 1, skipped 0' in result.output
+    assert "male is 'x', not a whole number" in result.output
@@ -0,0 +1,56 @@
+# Home-page totals: kept up to date by the app's own writes without
+# re-summing, and recomputed when another worker has changed a table.
+import re
+
+import pytest
+
+import app as app_module
+from storage import create_storage
+
+HEADCOUNT_FIELDS = ['sno', 'category', 'total_male', 'total_female', 'total_transgender']
+
+
+@pytest.fixture
+def client(storage):
+    return app_module.app.test_client()
+
+
+def index_stats(client):
+    # {stat label: value} as the home page shows them
+    html = client.get('/').get_data(as_text=True)
+    return {label: int(value.replace(',', '')) for value, label in re.findall(
+        r'<div class="stat-value">([0-9,]+)</div>\s*<div class="stat-label">([^<]+)</div>', html)}
+
+
+def test_writes_through_the_app_adjust_totals(client):
+    assert index_stats(client)['Departments'] == 0
+    for number, name in enumerate(['Physics', 'Botany', 'Zoology'], 1):
+        client.post('/departments', data={'action': 'add', 'sno': str(number), 'department_name': name})
+    assert index_stats(client)['Departments'] == 3
+    recomputes = app_module.storage.stats.recomputes
+    client.post('/departments', data={'action': 'add', 'sno': '4', 'department_name': 'Geology'})
+    assert index_stats(client)['Departments'] == 4
+    assert app_module.storage.stats.recomputes == recomputes
+
+
+def test_outside_write_is_recomputed(client):
+    index_stats(client)
+    # Another storage over the same data stands in for another worker
+    other = create_storage(app_module.app.config)
+    other.write('student_enrollment', [
+        {'sno': '1', 'category': 'Regular', 'total_male': '10', 'total_female': '12',
+         'total_transgender': '1'},
+        {'sno': '2', 'category': 'Distance', 'total_male': '5', 'total_female': '5',
+         'total_transgender': '0'}], HEADCOUNT_FIELDS)
+    assert index_stats(client)['Total Students'] == 33
+
+
+def test_faculty_counts_teaching_staff_only(client, storage):
+    storage.write('staff_info', [
+        {'staff_type': 'Teaching', 'category': 'Contractual', 'total_male': '3',
+         'total_female': '4', 'total_transgender': '0'},
+        {'staff_type': 'Non-Teaching', 'category': 'Contractual', 'total_male': '9',
+         'total_female': '9', 'total_transgender': '9'},
+        {'staff_type': 'Teaching', 'category': 'Non-Contractual', 'total_male': '1',
+         'total_female': 'n/a', 'total_transgender': '0'}], ['staff_type'] + HEADCOUNT_FIELDS)
+    assert index_stats(client)['Faculty Members'] == 8
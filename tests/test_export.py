@@ -0,0 +1,57 @@
+# Exports: the streamed body matches the table, and a client holding the
+# current ETag gets a 304 until the table changes.
+import csv
+import gzip
+import io
+import json
+import zipfile
+
+import app as app_module
+
+FIELDNAMES = ['sno', 'department_name']
+
+
+def _departments(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics, "Applied"'},
+                                  {'sno': '2', 'department_name': 'Botany'}], FIELDNAMES)
+
+
+def test_csv_and_json_lines(storage):
+    _departments(storage)
+    client = app_module.app.test_client()
+    response = client.get('/departments/export')
+    assert response.headers['Content-Disposition'] == 'attachment; filename=departments.csv'
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [row['department_name'] for row in rows] == ['Physics, "Applied"', 'Botany']
+    lines = client.get('/departments/export?format=jsonl').get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == storage.read('departments')
+    assert client.get('/departments/export?format=xml').status_code == 400
+
+
+def test_gzip_when_accepted(storage):
+    _departments(storage)
+    response = app_module.app.test_client().get('/departments/export',
+                                                headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.get_data()).decode('utf-8').startswith('sno,department_name,id,rev')
+
+
+def test_etag_answers_304_until_the_table_changes(storage):
+    _departments(storage)
+    client = app_module.app.test_client()
+    etag = client.get('/departments/export').headers['ETag']
+    assert client.get('/departments/export', headers={'If-None-Match': etag}).status_code == 304
+    storage.append('departments', {'sno': '3', 'department_name': 'Zoology'}, FIELDNAMES)
+    response = client.get('/departments/export', headers={'If-None-Match': etag})
+    assert response.status_code == 200 and response.headers['ETag'] != etag
+    assert 'Zoology' in response.get_data(as_text=True)
+
+
+def test_bundle_of_every_module(storage):
+    _departments(storage)
+    client = app_module.app.test_client()
+    archive = zipfile.ZipFile(io.BytesIO(client.get('/export?format=zip').get_data()))
+    assert sorted(archive.namelist()) == sorted('%s.csv' % table for table in app_module.MODULE_TABLES)
+    assert b'Botany' in archive.read('departments.csv')
+    lines = client.get('/export').get_data(as_text=True).splitlines()
+    assert [json.loads(line)['table'] for line in lines] == ['departments', 'departments']
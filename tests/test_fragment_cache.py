@@ -0,0 +1,48 @@
+# Rendered table bodies are reused until their table's version changes,
+# whichever process made the change.
+import re
+
+import app as app_module
+from fragment_cache import FragmentCache
+from storage import create_storage
+
+FIELDNAMES = ['sno', 'department_name']
+
+
+def test_other_version_misses():
+    cache = FragmentCache()
+    cache.put('key', 1, 'body', 4)
+    assert cache.get('key', 1) == 'body'
+    assert cache.get('key', 2) is None
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+
+
+def test_bounded_by_entries_and_bytes():
+    cache = FragmentCache(max_entries=2, max_bytes=10)
+    cache.put('a', 1, 'a', 4)
+    cache.put('b', 1, 'b', 4)
+    cache.get('a', 1)
+    cache.put('c', 1, 'c', 4)
+    assert cache.get('b', 1) is None and cache.get('a', 1) == 'a'
+    cache.put('huge', 1, 'x', 11)
+    assert cache.get('huge', 1) is None
+    assert cache.stats()['bytes'] <= 10
+
+
+def _names(html):
+    return re.findall(r'<td>([^<]*)</td><td><div class="action-buttons">', html)
+
+
+def test_page_body_is_cached_until_a_write(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    client = app_module.app.test_client()
+    assert _names(client.get('/departments').get_data(as_text=True)) == ['Physics']
+    client.get('/departments')
+    assert app_module.fragments.stats()['hits'] == 1
+
+    # Another worker's write
+    create_storage(app_module.app.config).append(
+        'departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    html = client.get('/departments').get_data(as_text=True)
+    assert _names(html) == ['Physics', 'Botany']
+    assert '"Botany"' in html.split('id="recordData">')[1]
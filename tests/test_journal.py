@@ -0,0 +1,118 @@
+# EditJournal: single-row edits are appended to "<table>.csv.journal",
+# replayed over the base CSV on read and folded into it by compaction.
+import os
+
+from journal import EditJournal, journal_path, replay
+from table_lock import TableLocks
+
+HEADER = 'sno,department_name\n'
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def _read(path):
+    with open(path, encoding='utf-8') as file:
+        return file.read()
+
+
+def _load(path):
+    lines = _read(path).splitlines()[1:]
+    return [dict(zip(['sno', 'department_name'], line.split(','))) for line in lines]
+
+
+def _write_rows(path, rows):
+    # Through a temp file, as compaction requires
+    _write(path + '.tmp', HEADER + ''.join('%s,%s\n' % (row['sno'], row['department_name'])
+                                         for row in rows))
+    os.replace(path + '.tmp', path)
+
+
+def test_replay_applies_updates_and_deletes_in_order():
+    rows = [{'sno': '1'}, {'sno': '2'}, {'sno': '3'}]
+    ops = [{'op': 'update', 'index': 1, 'row': {'sno': '20'}},
+           {'op': 'delete', 'index': 0},
+           {'op': 'delete', 'index': 9}]
+    assert replay(rows, ops) == [{'sno': '20'}, {'sno': '3'}]
+
+
+def test_recorded_edits_are_read_back_without_touching_the_csv(tmp_path):
+    path = str(tmp_path / 'departments.csv')
+    _write(path, HEADER + '1,Physics\n2,Chemistry\n')
+    journal = EditJournal(TableLocks(), fsync=False)
+    assert not journal.record(path, [{'op': 'update', 'index': 0,
+                                     'row': {'sno': '1', 'department_name': 'Maths'}}])
+    journal.record(path, [{'op': 'delete', 'index': 1}])
+    assert _read(path) == HEADER + '1,Physics\n2,Chemistry\n'
+    assert replay(_load(path), EditJournal(TableLocks(), fsync=False).read_ops(path)) == [
+        {'sno': '1', 'department_name': 'Maths'}]
+
+
+def test_record_reports_when_compaction_is_due(tmp_path):
+    path = str(tmp_path / 'departments.csv')
+    _write(path, HEADER + '1,Physics\n')
+    journal = EditJournal(TableLocks(), max_entries=2, fsync=False)
+    op = {'op': 'update', 'index': 0, 'row': {'sno': '1', 'department_name': 'Maths'}}
+    assert not journal.record(path, [op])
+    assert journal.record(path, [op])
+
+
+def test_compaction_folds_the_journal_into_the_csv(tmp_path):
+    path = str(tmp_path / 'departments.csv')
+    _write(path, HEADER + '1,Physics\n2,Chemistry\n')
+    journal = EditJournal(TableLocks(), fsync=False)
+    journal.record(path, [{'op': 'delete', 'index': 0}])
+    assert journal.compact(path, _write_rows,
+                           lambda filepath: replay(_load(filepath), journal.read_ops(filepath)))
+    assert _read(path) == HEADER + '2,Chemistry\n'
+    assert not os.path.exists(journal_path(path))
+    assert journal.compactions == 1
+
+
+def test_journal_for_an_older_file_is_ignored(tmp_path):
+    # As left behind by a crash between compaction's replace and unlink
+    path = str(tmp_path / 'departments.csv')
+    _write(path, HEADER + '1,Physics\n')
+    journal = EditJournal(TableLocks(), fsync=False)
+    journal.record(path, [{'op': 'delete', 'index': 0}])
+    _write_rows(path, [{'sno': '1', 'department_name': 'Physics'}])
+    assert journal.read_ops(path) == []
+
+
+def test_torn_last_entry_is_dropped(tmp_path):
+    path = str(tmp_path / 'departments.csv')
+    _write(path, HEADER + '1,Physics\n2,Chemistry\n')
+    journal = EditJournal(TableLocks(), fsync=False)
+    journal.record(path, [{'op': 'delete', 'index': 0}])
+    with open(journal_path(path), 'a', encoding='utf-8') as file:
+        file.write('{"op":"delete","ind')
+    assert journal.read_ops(path) == [{'op': 'delete', 'index': 0}]
+
+
+def test_replay_addresses_rows_by_id():
+    rows = [{'id': 'a'}, {'id': 'b'}, {'id': 'c'}]
+    ops = [{'op': 'delete', 'id': 'a'},
+           {'op': 'update', 'id': 'c', 'row': {'id': 'c', 'rev': '2'}},
+           {'op': 'delete', 'id': 'gone'}]
+    assert replay(rows, ops) == [{'id': 'b'}, {'id': 'c', 'rev': '2'}]
+
+
+def test_storage_edits_survive_a_cold_cache(tmp_path, monkeypatch):
+    import app as app_module
+    from storage import CsvStorage
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    fieldnames = ['sno', 'department_name']
+    storage = CsvStorage(app_module.app.config)
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'},
+                                  {'sno': '2', 'department_name': 'Chemistry'}], fieldnames)
+    path = storage.path('departments')
+    written = _read(path)
+    physics, chemistry = storage.read('departments')
+    storage.update('departments', chemistry['id'], {'sno': '2', 'department_name': 'Maths'},
+                   fieldnames)
+    storage.delete('departments', physics['id'], fieldnames)
+    assert _read(path) == written
+    assert [row['department_name'] for row in CsvStorage(app_module.app.config).read('departments')] \
+        == ['Maths']
@@ -0,0 +1,66 @@
+# Metrics: counters and histograms render in the Prometheus text format,
+# and requests through the app are timed and broken down by phase.
+import logging
+import re
+
+import app as app_module
+from metrics import Metrics, describe_phases
+
+
+def test_histogram_buckets_are_cumulative():
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe('idms_request_duration_seconds', 0.05, endpoint='index')
+    metrics.observe('idms_request_duration_seconds', 0.5, endpoint='index')
+    metrics.observe('idms_request_duration_seconds', 5.0, endpoint='index')
+    text = metrics.render()
+    assert 'idms_request_duration_seconds_bucket{endpoint="index",le="0.1"} 1' in text
+    assert 'idms_request_duration_seconds_bucket{endpoint="index",le="1.0"} 2' in text
+    assert 'idms_request_duration_seconds_bucket{endpoint="index",le="+Inf"} 3' in text
+    assert 'idms_request_duration_seconds_count{endpoint="index"} 3' in text
+
+
+def test_disabled_registry_records_nothing():
+    metrics = Metrics(enabled=False)
+    metrics.count('idms_rows_parsed_total', 5, table='hostels')
+    with metrics.phase('csv_parse'):
+        pass
+    assert metrics.render() == '\n'
+
+
+def test_phases_add_up_in_the_request_breakdown():
+    metrics = Metrics()
+    metrics.begin_request()
+    with metrics.phase('render'):
+        pass
+    with metrics.phase('render'):
+        pass
+    _, phases = metrics.end_request('hostels', 'GET', 200)
+    assert phases['render'][1] == 2
+    assert describe_phases(1.0, {'csv_parse': (0.7, 1)}) == \
+        '1000.0 ms: csv_parse 700.0 ms, other 300.0 ms'
+
+
+def _value(text, pattern):
+    match = re.search(r'^%s (\S+)$' % re.escape(pattern), text, re.M)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_metrics_endpoint_counts_requests_and_rows(storage):
+    client = app_module.app.test_client()
+    storage.write('hostels', [{'sno': '1', 'name': 'A', 'type': 'Boys', 'capacity': '9',
+                               'students_residing': '1'}],
+                  ['sno', 'name', 'type', 'capacity', 'students_residing'])
+    before = client.get('/metrics').get_data(as_text=True)
+    client.get('/hostels')
+    text = client.get('/metrics').get_data(as_text=True)
+    requests = 'idms_requests_total{endpoint="hostels",method="GET",status="200"}'
+    assert _value(text, requests) == _value(before, requests) + 1
+    assert 'idms_cache_hit_ratio{cache="fragment"}' in text
+
+
+def test_slow_requests_are_logged(storage, monkeypatch, caplog):
+    monkeypatch.setitem(app_module.app.config, 'SLOW_REQUEST_MS', 0)
+    with caplog.at_level(logging.WARNING, logger=app_module.app.logger.name):
+        app_module.app.test_client().get('/departments')
+    assert any(record.getMessage().startswith('slow request: GET /departments -> 200 in ')
+               for record in caplog.records)
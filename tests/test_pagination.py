@@ -0,0 +1,57 @@
+# Server-side paging: storage.query returns one window of a table and the
+# routes render only that window.
+import app as app_module
+from pagination import Page, sort_key
+
+FIELDNAMES = ['sno', 'name', 'type', 'capacity', 'students_residing']
+
+
+def _hostels(storage, count):
+    storage.write('hostels', [{'sno': str(number), 'name': 'Hostel %d' % number,
+                               'type': 'Boys' if number % 2 else 'Girls',
+                               'capacity': str(100 - number), 'students_residing': '1'}
+                              for number in range(1, count + 1)], FIELDNAMES)
+
+
+def test_sort_key_puts_numbers_first_by_value():
+    assert sorted(['b', '10', 'A', '9', ''], key=sort_key) == ['9', '10', '', 'A', 'b']
+
+
+def test_window_marks_gaps():
+    assert Page([], 200, 10, 10).window() == [1, None, 8, 9, 10, 11, 12, None, 20]
+
+
+def test_plain_window(storage):
+    _hostels(storage, 12)
+    items, total = storage.query('hostels', 10, 5)
+    assert total == 12
+    assert [row['sno'] for row in items] == ['11', '12']
+
+
+def test_sorted_filtered_window(storage):
+    _hostels(storage, 12)
+    items, total = storage.query('hostels', 0, 3, sort='capacity', filters={'type': 'Girls'})
+    assert total == 6
+    assert [row['capacity'] for row in items] == ['88', '90', '92']
+    items, _ = storage.query('hostels', 0, 2, sort='capacity', descending=True)
+    assert [row['capacity'] for row in items] == ['99', '98']
+
+
+def test_route_renders_one_page_and_clamps_past_the_end(storage):
+    _hostels(storage, 12)
+    client = app_module.app.test_client()
+    html = client.get('/hostels?page_size=5&page=2').get_data(as_text=True)
+    assert 'Showing 6&ndash;10 of 12 records' in html
+    assert 'Hostel 6<' in html and 'Hostel 11<' not in html
+    html = client.get('/hostels?page_size=5&page=9').get_data(as_text=True)
+    assert 'Showing 11&ndash;12 of 12 records' in html
+
+
+def test_edit_on_a_sorted_page_hits_the_right_row(storage):
+    _hostels(storage, 12)
+    client = app_module.app.test_client()
+    record = storage.query('hostels', 0, 1, sort='capacity')[0][0]
+    client.post('/hostels?sort=capacity', data={
+        'action': 'edit', 'id': record['id'], 'rev': record['rev'], 'sno': '12', 'name': 'Renamed',
+        'type': 'Girls', 'capacity': '88', 'students_residing': '1'})
+    assert storage.read('hostels')[11]['name'] == 'Renamed'
@@ -0,0 +1,57 @@
+# Record ids and revisions: every row gets a permanent id, edits bump its
+# rev, and a write made against an older rev is refused.
+import pytest
+
+import app as app_module
+from storage import CsvStorage, StaleRecordError
+
+FIELDNAMES = ['sno', 'department_name']
+
+
+def _seed(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    return storage.read('departments')[0]
+
+
+def test_stale_rev_is_refused(storage):
+    record = _seed(storage)
+    storage.update('departments', record['id'], {'sno': '1', 'department_name': 'Maths'},
+                   FIELDNAMES, rev=record['rev'])
+    with pytest.raises(StaleRecordError):
+        storage.update('departments', record['id'], {'sno': '1', 'department_name': 'Botany'},
+                       FIELDNAMES, rev=record['rev'])
+    with pytest.raises(StaleRecordError):
+        storage.delete('departments', record['id'], FIELDNAMES, rev=record['rev'])
+    assert storage.get('departments', record['id'])['department_name'] == 'Maths'
+
+
+def test_stale_edit_form_is_not_applied(storage):
+    record = _seed(storage)
+    storage.update('departments', record['id'], {'sno': '1', 'department_name': 'Maths'},
+                   FIELDNAMES)
+    client = app_module.app.test_client()
+    response = client.post('/departments', data={
+        'action': 'edit', 'id': record['id'], 'rev': record['rev'], 'sno': '1',
+        'department_name': 'Botany'}, follow_redirects=True)
+    assert 'changed by someone else' in response.get_data(as_text=True)
+    assert storage.get('departments', record['id'])['department_name'] == 'Maths'
+
+
+def test_ids_survive_edits_and_other_deletes(storage):
+    for name in ['Physics', 'Botany', 'Zoology']:
+        storage.append('departments', {'sno': '1', 'department_name': name}, FIELDNAMES)
+    physics, botany, zoology = storage.read('departments')
+    storage.delete('departments', physics['id'], FIELDNAMES)
+    storage.update('departments', zoology['id'], {'sno': '3', 'department_name': 'Geology'},
+                   FIELDNAMES)
+    assert [(row['id'], row['rev']) for row in storage.read('departments')] == [
+        (botany['id'], '1'), (zoology['id'], '2')]
+
+
+def test_legacy_csv_is_given_ids(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    with open(tmp_path / 'departments.csv', 'w', encoding='utf-8') as file:
+        file.write('sno,department_name\n1,Physics\n2,Botany\n')
+    ids = [row['id'] for row in CsvStorage(app_module.app.config).read('departments')]
+    assert all(ids) and len(set(ids)) == 2
+    assert [row['id'] for row in CsvStorage(app_module.app.config).read('departments')] == ids
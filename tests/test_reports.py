@@ -0,0 +1,48 @@
+# The consolidated report: sections are built from each module's totals,
+# cached by table signature, and only rebuilt when their table changes.
+import csv
+import io
+
+import app as app_module
+import reports
+
+HOSTELS = ['sno', 'name', 'type', 'capacity', 'students_residing']
+
+
+def _hostels(storage):
+    storage.write('hostels', [
+        {'sno': '1', 'name': 'A', 'type': 'Boys', 'capacity': '100', 'students_residing': '90'},
+        {'sno': '2', 'name': 'B', 'type': 'Girls', 'capacity': '80', 'students_residing': '70'},
+    ], HOSTELS)
+
+
+def test_only_changed_sections_are_rebuilt(storage, tmp_path):
+    _hostels(storage)
+    cache = reports.SectionCache(str(tmp_path / 'reports'))
+    sections, rebuilt = reports.build_report(storage, cache)
+    assert rebuilt == reports.SECTION_TABLES
+    hostels = sections[reports.SECTION_TABLES.index('hostels')]
+    assert hostels['lines'] == [['Boys', 1, 100, 90], ['Girls', 1, 80, 70]]
+    assert hostels['total'] == [2, 180, 160]
+
+    assert reports.build_report(storage, cache)[1] == []
+    storage.append('hostels', {'sno': '3', 'name': 'C', 'type': 'Boys', 'capacity': '10',
+                               'students_residing': '5'}, HOSTELS)
+    # A fresh cache over the same folder stands in for another worker
+    other = reports.SectionCache(str(tmp_path / 'reports'))
+    sections, rebuilt = reports.build_report(storage, other)
+    assert rebuilt == ['hostels']
+    assert sections[reports.SECTION_TABLES.index('hostels')]['total'] == [3, 190, 165]
+
+
+def test_report_route_formats(storage, tmp_path, monkeypatch):
+    _hostels(storage)
+    monkeypatch.setattr(app_module, 'report_sections',
+                        reports.SectionCache(str(tmp_path / 'reports')))
+    client = app_module.app.test_client()
+    page = client.get('/report')
+    assert page.status_code == 200 and 'Hostel Management' in page.get_data(as_text=True)
+    assert client.get('/report', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+    rows = list(csv.DictReader(io.StringIO(client.get('/report?format=csv').get_data(as_text=True))))
+    assert {'module': 'hostels', 'group': 'All', 'measure': 'capacity', 'value': '180'} in rows
+    assert client.get('/report?format=pdf').status_code == 400
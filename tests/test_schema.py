@@ -0,0 +1,44 @@
+# The schema registry: each module's compiled parse() stores one spelling
+# per value and explains what is wrong, and the module pages use it.
+import pytest
+
+import app as app_module
+from schema import COUNT, Column, Module, MODULES
+
+
+def test_counts_and_amounts_are_stored_in_one_spelling():
+    row, problems = MODULES['placement'].parse(
+        {'male_placed': ' 007', 'female_placed': '', 'total_placed': '7', 'median_salary': '12.5'})
+    assert problems == []
+    assert row == {'male_placed': '7', 'female_placed': '0', 'total_placed': '7',
+                   'median_salary': '12.50'}
+
+
+def test_problems_name_the_column():
+    _, problems = MODULES['hostels'].parse({'sno': '1', 'name': 'A', 'type': 'Mixed',
+                                           'capacity': '-3', 'students_residing': '1'})
+    assert problems == ["type: 'Mixed' is not one of Boys, Girls",
+                        "capacity: '-3' is not a whole number"]
+    _, problems = MODULES['nss_enrollment'].parse({'male': '1', 'female': '2', 'total': '4'})
+    assert problems == ['total is 4 but male + female add up to 3']
+
+
+def test_total_over_a_text_column_is_refused():
+    with pytest.raises(ValueError):
+        Module('broken', 'Row', [Column('a'), Column('b', COUNT)], totals=[('b', ['a'])])
+
+
+def test_module_form_stores_the_parsed_row(storage):
+    client = app_module.app.test_client()
+    client.post('/nss_enrollment', data={'action': 'add', 'male': '01', 'female': '2',
+                                         'total': '3'})
+    assert [(row['male'], row['total']) for row in storage.read('nss_enrollment')] == [('1', '3')]
+
+
+def test_bad_form_is_refused_with_its_problems(storage):
+    client = app_module.app.test_client()
+    response = client.post('/nss_enrollment', data={'action': 'add', 'male': '1', 'female': '2',
+                                                    'total': '9'}, follow_redirects=True)
+    assert 'Record not saved: total is 9 but male + female add up to 3' in \
+        response.get_data(as_text=True)
+    assert storage.read('nss_enrollment') == []
@@ -0,0 +1,101 @@
+# Shared tables: one worker's parsed columnar table is published as an
+# image that the other workers map instead of parsing, and each publish
+# bumps the table's generation.
+import pytest
+
+import app as app_module
+from columnar import MappedTable
+from storage import create_storage
+
+TABLE = 'staff_info'
+
+
+@pytest.fixture
+def workers(tmp_path, monkeypatch):
+    # Two CSV storages over the same folder, standing in for two processes
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    monkeypatch.setitem(app_module.app.config, 'STORAGE_BACKEND', 'csv')
+    monkeypatch.setitem(app_module.app.config, 'FSYNC_WRITES', False)
+    monkeypatch.setitem(app_module.app.config, 'SHARED_TABLES', True)
+    first = create_storage(app_module.app.config)
+    second = create_storage(app_module.app.config)
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    first.write(TABLE, [dict.fromkeys(fieldnames, '1') for _ in range(3)], fieldnames)
+    yield first, second
+    first.close()
+    second.close()
+
+
+def test_second_worker_maps_the_published_image(workers):
+    first, second = workers
+    rows = first.read(TABLE)
+    assert first.shared.generation(TABLE) == 1
+    assert second.read(TABLE) == rows
+    assert second.shared.stats()['hits'] == 1 and second.shared.stats()['published'] == 0
+    assert isinstance(second.scan(TABLE), MappedTable)
+
+
+def _without_parsing(monkeypatch, storage):
+    # Fail the test if storage parses the whole CSV
+    def parse(*args):
+        raise AssertionError('parsed the whole table')
+    monkeypatch.setattr(storage, '_parse_csv', parse)
+    monkeypatch.setattr(storage, '_csv_rows', parse)
+
+
+def _row(fieldnames, **values):
+    return dict(dict.fromkeys(fieldnames, '1'), **values)
+
+
+def test_an_edit_reaches_the_other_worker_without_a_parse(workers, monkeypatch):
+    first, second = workers
+    record = second.read(TABLE)[0]
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    cached = first.scan(TABLE)
+    first.update(TABLE, record['id'], _row(fieldnames, subcategory='Librarian'), fieldnames)
+    # Kept beside the image rather than copied out of it or published again
+    assert first.scan(TABLE) is cached and cached.patched_rows() == 1
+    assert first.shared.generation(TABLE) == 1 and first.shared.stats()['published'] == 1
+    _without_parsing(monkeypatch, second)
+    assert second.get(TABLE, record['id'])['subcategory'] == 'Librarian'
+    assert second.read(TABLE, {'subcategory': 'Librarian'})[0]['id'] == record['id']
+    assert second.shared.generation(TABLE) == 1
+
+
+def test_appends_are_read_from_the_end_of_the_csv(workers, monkeypatch):
+    first, second = workers
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    second.read(TABLE)
+    record_id = first.append(TABLE, _row(fieldnames, staff_type='Teaching', total_male='5'),
+                             fieldnames)
+    _without_parsing(monkeypatch, second)
+    rows = second.read(TABLE)
+    assert len(rows) == 4 and rows[-1]['id'] == record_id
+    assert second.aggregate(TABLE, ['staff_type'], ['total_male']) == \
+        first.aggregate(TABLE, ['staff_type'], ['total_male'])
+    assert second.shared.generation(TABLE) == 1
+
+
+def test_table_is_published_again_past_the_threshold(workers, monkeypatch):
+    first, second = workers
+    monkeypatch.setattr(first.shared, 'republish_rows', 2)
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    first.append_many(TABLE, [_row(fieldnames, subcategory=str(n)) for n in range(2)], fieldnames)
+    first.read(TABLE)
+    assert first.shared.generation(TABLE) == 1
+    first.append(TABLE, _row(fieldnames, subcategory='9'), fieldnames)
+    assert len(first.read(TABLE)) == 6
+    assert first.shared.generation(TABLE) == 2 and first.scan(TABLE).patched_rows() == 0
+    hits = second.shared.stats()['hits']
+    assert [row['subcategory'] for row in second.read(TABLE)][-3:] == ['0', '1', '9']
+    assert second.shared.stats()['hits'] == hits + 1
+
+
+def test_delete_publishes_the_smaller_table(workers, monkeypatch):
+    first, second = workers
+    fieldnames = app_module.MODULE_FIELDNAMES[TABLE]
+    record = first.read(TABLE)[0]
+    first.delete(TABLE, record['id'], fieldnames)
+    assert first.shared.generation(TABLE) == 2
+    _without_parsing(monkeypatch, second)
+    assert second.get(TABLE, record['id']) is None and len(second.read(TABLE)) == 2
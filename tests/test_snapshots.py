@@ -0,0 +1,70 @@
+# Snapshots: each label stores only the rows that changed since the one
+# before, reads rebuild the table from the deltas, and diffs list what
+# changed between two labels.
+import json
+
+import pytest
+
+import app as app_module
+from snapshots import SnapshotError, SnapshotStore
+
+FIELDNAMES = ['sno', 'department_name', 'id', 'rev']
+
+
+def _freeze(store, label, rows):
+    return store.create(label, {'departments': (FIELDNAMES, [rows])})
+
+
+def test_later_snapshots_store_only_the_changes(tmp_path):
+    store = SnapshotStore(str(tmp_path), fsync=False)
+    _freeze(store, '2024-25', [('1', 'Physics', 'a', '1'), ('2', 'Botany', 'b', '1')])
+    entry = _freeze(store, '2025-26', [('1', 'Physics', 'a', '1'), ('2', 'Zoology', 'b', '2'),
+                                       ('3', 'Maths', 'c', '1')])
+    assert {key: entry['tables']['departments'][key]
+            for key in ('rows', 'added', 'changed', 'removed')} == \
+        {'rows': 3, 'added': 1, 'changed': 1, 'removed': 0}
+    line = json.loads((tmp_path / '2025-26.jsonl').read_text())
+    assert [values[2] for values in line['put']] == ['b', 'c']
+
+    # A cold store rebuilds the table from both deltas
+    cold = SnapshotStore(str(tmp_path), fsync=False)
+    assert cold.rows('2025-26', 'departments')[1] == [
+        ('1', 'Physics', 'a', '1'), ('2', 'Zoology', 'b', '2'), ('3', 'Maths', 'c', '1')]
+    assert cold.rows('2024-25', 'departments')[1][1] == ('2', 'Botany', 'b', '1')
+
+
+def test_diff_lists_added_removed_and_changed_rows(tmp_path):
+    store = SnapshotStore(str(tmp_path), fsync=False)
+    _freeze(store, 'old', [('1', 'Physics', 'a', '1'), ('2', 'Botany', 'b', '1')])
+    _freeze(store, 'new', [('2', 'Zoology', 'b', '2'), ('3', 'Maths', 'c', '1')])
+    diff = store.diff('old', 'new', ['departments'])['departments']
+    assert [row['id'] for row in diff['added']] == ['c']
+    assert diff['removed'] == ['a']
+    assert diff['changed'] == [{'id': 'b', 'columns': {'department_name': ['Botany', 'Zoology']}}]
+
+
+def test_labels_are_checked(tmp_path):
+    store = SnapshotStore(str(tmp_path), fsync=False)
+    _freeze(store, '2024-25', [])
+    with pytest.raises(SnapshotError):
+        _freeze(store, '2024-25', [])
+    with pytest.raises(SnapshotError):
+        _freeze(store, '../escape', [])
+
+
+def test_snapshot_routes(storage, tmp_path, monkeypatch):
+    monkeypatch.setattr(app_module, 'snapshots',
+                        SnapshotStore(str(tmp_path / 'snapshots'), fsync=False))
+    client = app_module.app.test_client()
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}],
+                  ['sno', 'department_name'])
+    assert client.post('/snapshots', data={'label': '2024-25'}).status_code == 201
+    storage.append('departments', {'sno': '2', 'department_name': 'Botany'},
+                   ['sno', 'department_name'])
+    assert client.post('/snapshots', data={'label': '2025-26'}).status_code == 201
+    old = client.get('/snapshots/2024-25/departments/export').get_data(as_text=True)
+    assert 'Physics' in old and 'Botany' not in old
+    diff = client.get('/snapshots/2024-25/diff/2025-26?table=departments').json
+    assert diff['tables']['departments']['added'] == 1
+    assert [row['department_name'] for row in diff['tables']['departments']['added_rows']] == \
+        ['Botany']
@@ -0,0 +1,98 @@
+# Storage: both backends behave the same behind the interface the routes use.
+import app as app_module
+from storage import CsvStorage, SqliteStorage, create_storage
+
+FIELDNAMES = ['sno', 'department_name']
+
+
+def _departments(storage):
+    return [row['department_name'] for row in storage.read('departments')]
+
+
+def test_append_update_delete(storage):
+    assert storage.read('departments') == []
+    for number, name in enumerate(['Physics', 'Botany', 'Zoology'], 1):
+        storage.append('departments', {'sno': number, 'department_name': ' %s ' % name}, FIELDNAMES)
+    physics, botany, _ = storage.read('departments')
+    assert physics['id'] and physics['rev'] == '1'
+    assert (physics['sno'], physics['department_name']) == ('1', 'Physics')
+    assert storage.update('departments', botany['id'], {'sno': '2', 'department_name': 'Maths'},
+                          FIELDNAMES)
+    assert storage.delete('departments', physics['id'], FIELDNAMES)
+    assert _departments(storage) == ['Maths', 'Zoology']
+    assert storage.get('departments', botany['id'])['rev'] == '2'
+    assert not storage.update('departments', physics['id'], {'sno': '9'}, FIELDNAMES)
+    assert not storage.delete('departments', 'no-such-id', FIELDNAMES)
+
+
+def test_batch_edits_rows_it_appended(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'},
+                                  {'sno': '2', 'department_name': 'Botany'}], FIELDNAMES)
+    physics, botany = storage.read('departments')
+    stored_botany = storage.scan('departments')[1]
+    results = storage._apply_batch('departments', [
+        ('append', 'new', {'sno': '3', 'department_name': 'Zoology'}, FIELDNAMES, None),
+        ('update', 'new', {'sno': '3', 'department_name': 'Geology'}, FIELDNAMES, '1'),
+        ('update', botany['id'], {'sno': '2', 'department_name': 'Maths'}, FIELDNAMES, None),
+        ('delete', physics['id'], None, FIELDNAMES, None),
+        ('update', physics['id'], {'sno': '1', 'department_name': 'Gone'}, FIELDNAMES, None)])
+    assert results == ['new', True, True, True, False]
+    assert _departments(storage) == ['Maths', 'Geology']
+    assert storage.get('departments', 'new')['rev'] == '2'
+    assert _departments(create_storage(app_module.app.config)) == ['Maths', 'Geology']
+    # Edited rows are replaced, never changed under a reader holding them
+    assert stored_botany['department_name'] == 'Botany'
+
+
+def test_append_many_publishes_once_written(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    assert storage.dashboard()['departments'] == 1
+    recomputes = storage.stats.recomputes
+    cached = storage.scan('departments')
+    seen = []
+
+    def rows():
+        for number in range(2, 6):
+            # What readers would be served while the upload is still going
+            seen.append((storage.stats._totals['departments'][1], len(cached)))
+            yield {'sno': str(number), 'department_name': 'Dept %d' % number}
+
+    assert storage.append_many('departments', rows(), FIELDNAMES, batch_size=2) == 4
+    assert seen == [(1, 1)] * 4
+    assert storage.dashboard()['departments'] == 5
+    assert storage.stats.recomputes == recomputes
+    assert len(_departments(storage)) == 5
+
+
+def test_filtered_read(storage):
+    storage.write('programmes', [
+        {'sno': '1', 'level': 'UG', 'programme_name': 'Physics'},
+        {'sno': '2', 'level': 'PG', 'programme_name': 'Physics'},
+        {'sno': '3', 'level': 'UG', 'programme_name': 'History'}],
+        ['sno', 'level', 'programme_name'])
+    assert [row['sno'] for row in storage.read('programmes', {'level': 'UG'})] == ['1', '3']
+
+
+def test_another_worker_sees_writes(storage):
+    other = create_storage(app_module.app.config)
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    assert _departments(other) == ['Physics']
+    signature = storage.signature('departments')
+    other.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    assert storage.signature('departments') != signature
+    assert _departments(storage) == ['Physics', 'Botany']
+
+
+def test_read_hands_out_a_copy(storage):
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    storage.read('departments').clear()
+    assert _departments(storage) == ['Physics']
+
+
+def test_migrate_sqlite_copies_every_csv(tmp_path, monkeypatch):
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    CsvStorage(app_module.app.config).write(
+        'departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    result = app_module.app.test_cli_runner().invoke(args=['migrate-sqlite'])
+    assert result.exit_code == 0
+    assert _departments(SqliteStorage(app_module.app.config)) == ['Physics']
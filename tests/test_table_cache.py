@@ -0,0 +1,84 @@
+# TableCache: parsed tables are reused while their file is unchanged and
+# parsed again once anything rewrites or appends to it.
+import os
+
+from table_cache import TableCache
+
+
+class Loader:
+    # Counts parses; a table is its file's lines
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, filepath):
+        self.calls += 1
+        with open(filepath, encoding='utf-8') as file:
+            return file.read().splitlines()
+
+
+def _write(path, text):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(text)
+
+
+def test_unchanged_file_is_parsed_once(tmp_path):
+    path = str(tmp_path / 'table.csv')
+    _write(path, 'a\nb\n')
+    cache, loader = TableCache(), Loader()
+    assert cache.get(path, loader) == ['a', 'b']
+    assert cache.get(path, loader) == ['a', 'b']
+    assert loader.calls == 1
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_outside_change_forces_a_parse(tmp_path):
+    path = str(tmp_path / 'table.csv')
+    _write(path, 'a\n')
+    cache, loader = TableCache(), Loader()
+    cache.get(path, loader)
+    version = cache.version(path)
+    _write(path, 'a\nlonger\n')
+    assert cache.get(path, loader) == ['a', 'longer']
+    assert loader.calls == 2
+    assert cache.version(path) > version
+
+
+def test_missing_file_is_none(tmp_path):
+    assert TableCache().get(str(tmp_path / 'missing.csv'), Loader()) is None
+
+
+def test_put_replaces_rows_and_bumps_version(tmp_path):
+    path = str(tmp_path / 'table.csv')
+    _write(path, 'a\n')
+    cache, loader = TableCache(), Loader()
+    cache.get(path, loader)
+    version = cache.version(path)
+    _write(path, 'b\n')
+    cache.put(path, ['b'])
+    assert cache.get(path, loader) == ['b']
+    assert loader.calls == 1
+    assert cache.version(path) > version
+
+
+def test_least_recently_used_table_is_evicted(tmp_path):
+    paths = [str(tmp_path / ('t%d.csv' % number)) for number in range(3)]
+    for path in paths:
+        _write(path, 'row\n')
+    cache, loader = TableCache(max_tables=2), Loader()
+    for path in paths:
+        cache.get(path, loader)
+    assert cache.stats()['tables'] == 2 and cache.stats()['evictions'] == 1
+    cache.get(paths[0], loader)
+    assert loader.calls == 4
+
+
+def test_storage_sees_outside_edits(tmp_path, monkeypatch):
+    import app as app_module
+    from storage import CsvStorage
+    monkeypatch.setitem(app_module.app.config, 'DATA_FOLDER', str(tmp_path))
+    storage = CsvStorage(app_module.app.config)
+    _write(os.path.join(tmp_path, 'departments.csv'), 'sno,department_name\n1,Physics\n')
+    assert [row['department_name'] for row in storage.read('departments')] == ['Physics']
+    _write(os.path.join(tmp_path, 'departments.csv'),
+           'sno,department_name\n1,Physics\n2,Chemistry\n')
+    assert len(storage.read('departments')) == 2
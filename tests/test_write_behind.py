@@ -0,0 +1,158 @@
+# Write-behind: a queued write is answered at once, seen by every read in
+# this process straight away and on disk once the writer thread gets to it.
+# Writes it cannot land are kept in a dead-letter log.
+import json
+import threading
+
+import pytest
+
+import app as app_module
+import write_behind
+from storage import StaleRecordError, create_storage
+
+FIELDNAMES = ['sno', 'department_name']
+
+
+@pytest.fixture(params=['csv', 'sqlite'])
+def queued(request, tmp_path):
+    # A storage whose writer waits long enough for a test to look at disk
+    # before anything lands, and a second one standing in for another worker
+    config = dict(app_module.app.config, DATA_FOLDER=str(tmp_path), STORAGE_BACKEND=request.param,
+                  SQLITE_PATH=None, FSYNC_WRITES=False, WRITE_DURABILITY='interval',
+                  WRITE_BEHIND_INTERVAL_MS=300)
+    storage = create_storage(config)
+    storage.write('departments', [{'sno': '1', 'department_name': 'Physics'}], FIELDNAMES)
+    yield storage, create_storage(dict(config, WRITE_DURABILITY='synchronous'))
+    storage.close()
+
+
+def _names(storage):
+    return [row['department_name'] for row in storage.read('departments')]
+
+
+def test_queued_writes_are_read_back_before_they_land(queued):
+    storage, other = queued
+    physics = storage.read('departments')[0]
+    version = storage.version('departments')
+    record_id = storage.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    storage.update('departments', physics['id'], {'sno': '1', 'department_name': 'Maths'},
+                   FIELDNAMES)
+    assert storage.version('departments') != version
+    # Checked before this storage reads: SQLite reads wait for the queue
+    assert _names(other) == ['Physics']
+    assert _names(storage) == ['Maths', 'Botany']
+    assert storage.get('departments', record_id)['department_name'] == 'Botany'
+    assert [row['department_name'] for row in storage.query('departments', 0, 10,
+                                                            sort='department_name')[0]] \
+        == ['Botany', 'Maths']
+
+    assert storage.flush(timeout=10)
+    assert _names(other) == ['Maths', 'Botany']
+    assert other.get('departments', physics['id'])['rev'] == '2'
+
+
+def test_stale_rev_is_refused_in_the_request(queued):
+    storage, _ = queued
+    physics = storage.read('departments')[0]
+    storage.update('departments', physics['id'], {'sno': '1', 'department_name': 'Maths'},
+                   FIELDNAMES, rev=physics['rev'])
+    with pytest.raises(StaleRecordError):
+        storage.delete('departments', physics['id'], FIELDNAMES, rev=physics['rev'])
+    storage.delete('departments', 'no-such-id', FIELDNAMES)
+    assert not storage.delete('departments', 'no-such-id', FIELDNAMES)
+
+
+def test_conflict_with_another_worker_reaches_the_request(queued):
+    storage, other = queued
+    physics = storage.read('departments')[0]
+    # An edit made against a rev is on disk when the request returns...
+    storage.update('departments', physics['id'], {'sno': '1', 'department_name': 'Maths'},
+                   FIELDNAMES, rev=physics['rev'])
+    assert not storage.write_behind.pending('departments')
+    assert _names(other) == ['Maths']
+    # ...so another worker's edit against the same rev is refused there
+    with pytest.raises(StaleRecordError):
+        other.update('departments', physics['id'], {'sno': '1', 'department_name': 'Botany'},
+                     FIELDNAMES, rev=physics['rev'])
+    # and the same the other way round
+    other.update('departments', physics['id'], {'sno': '1', 'department_name': 'Zoology'},
+                 FIELDNAMES, rev='2')
+    with pytest.raises(StaleRecordError):
+        storage.delete('departments', physics['id'], FIELDNAMES, rev='2')
+    assert _names(storage) == ['Zoology']
+
+
+def test_close_writes_out_the_queue(queued):
+    storage, other = queued
+    storage.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    assert storage.close(timeout=10)
+    assert _names(other) == ['Physics', 'Botany']
+
+
+def test_failed_batch_is_retried_without_writing_twice(queued, monkeypatch):
+    storage, other = queued
+    monkeypatch.setattr(write_behind, 'RETRY_DELAY', 0)
+    apply_batch = storage._apply_batch
+    calls = []
+
+    def flaky(table, ops, landed=()):
+        # Land the batch, then fail as if the process lost the reply
+        results = apply_batch(table, ops, landed)
+        calls.append(len(ops))
+        if len(calls) == 1:
+            raise OSError('disk went away')
+        return results
+
+    monkeypatch.setattr(storage, '_apply_batch', flaky)
+    storage.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    assert storage.flush(timeout=10)
+    # The retry finds the row already stored and has nothing left to write
+    assert calls == [1]
+    assert _names(other) == ['Physics', 'Botany']
+    # The retry lands the batch again without taking it off the totals twice
+    assert storage.dashboard()['departments'] == 2
+
+
+def _dead_letters(storage):
+    with open(storage.dead_letter_path(), encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+def test_batch_that_keeps_failing_goes_to_the_dead_letter_log(queued, monkeypatch):
+    storage, other = queued
+    monkeypatch.setattr(write_behind, 'RETRY_DELAY', 0)
+    calls = []
+
+    def broken(table, ops, landed=()):
+        calls.append(len(ops))
+        raise OSError('disk went away')
+
+    monkeypatch.setattr(storage, '_apply_batch', broken)
+    storage.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    assert storage.flush(timeout=10)
+    assert len(calls) == app_module.app.config['WRITE_BEHIND_MAX_ATTEMPTS']
+    assert storage.write_behind.failed == 1
+    [letter] = _dead_letters(storage)
+    assert (letter['action'], letter['row']['department_name'], letter['error']) == \
+        ('append', 'Botany', 'disk went away')
+    # Dropped from what this process shows, and never stored
+    assert _names(storage) == ['Physics'] and _names(other) == ['Physics']
+    assert storage.dashboard()['departments'] == 1
+
+
+def test_close_gives_up_after_its_timeout(queued, monkeypatch):
+    storage, _ = queued
+    apply_batch = storage._apply_batch
+    release = threading.Event()
+
+    def stuck(table, ops, landed=()):
+        release.wait(10)
+        return apply_batch(table, ops, landed)
+
+    monkeypatch.setattr(storage, '_apply_batch', stuck)
+    storage.append('departments', {'sno': '2', 'department_name': 'Botany'}, FIELDNAMES)
+    try:
+        assert not storage.close(timeout=0.5)
+        assert [letter['row']['department_name'] for letter in _dead_letters(storage)] == ['Botany']
+    finally:
+        release.set()
@@ -0,0 +1,180 @@
+import logging
+import threading
+import time
+
+from metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait before retrying a batch whose write failed
+RETRY_DELAY = 1.0
+
+
+class WriteBehindQueue:
+    # Queued table writes that a dedicated thread applies in batches.
+    #
+    # Storage checks each write against the table as readers currently see
+    # it, then put()s it here and answers the request straight away. Until
+    # the writer thread has applied an op, pending() and latest() let
+    # readers lay it over the stored table, so a user sees their own change
+    # on the page they are redirected to.
+    #
+    # The writer hands each table's backlog to apply_batch(table, ops,
+    # retry) in order, one batch per table at a time. Ops stay pending until
+    # their batch has been written, so nothing is dropped from the overlay
+    # before it is on disk. A batch that raises is retried after RETRY_DELAY
+    # with retry=True (apply_batch must skip ops that already landed), up
+    # to max_attempts tries in all; then its ops are handed to
+    # give_up(table, ops, error), counted in failed and dropped.
+    # gather is how long the writer lets a burst build up before each
+    # round: 0 writes (and fsyncs) whatever is queued as soon as it wakes,
+    # a longer wait means fewer, larger commits.
+    #
+    # put() blocks while max_pending ops are waiting. flush() waits for
+    # queued ops to land; close() flushes and stops the thread, and hands
+    # whatever its timeout left queued to give_up() too.
+
+    def __init__(self, apply_batch, gather=0.0, max_pending=10000, max_attempts=5, give_up=None):
+        self.apply_batch = apply_batch
+        self.gather = gather
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.give_up = give_up
+        self.batches = 0
+        self.ops = 0
+        self.failed = 0
+        self.lock = threading.RLock()
+        self._changed = threading.Condition(self.lock)
+        self._pending = {}    # table -> [(seq, op)], oldest first
+        self._latest = {}     # table -> {record id: row, or None once deleted}
+        self._submitted = {}  # table -> ops ever queued
+        self._count = 0
+        self._seq = 0
+        self._closing = False
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+
+    def put(self, table, op):
+        # op is (action, record id, stored row or None, fieldnames, rev)
+        with self._changed:
+            while self._count >= self.max_pending and not self._closing:
+                self._changed.wait()
+            if self._closing:
+                raise RuntimeError('write-behind queue is closed')
+            self._seq += 1
+            self._pending.setdefault(table, []).append((self._seq, op))
+            self._latest.setdefault(table, {})[op[1]] = op[2]
+            self._submitted[table] = self._submitted.get(table, 0) + 1
+            self._count += 1
+            self._changed.notify_all()
+
+    def pending(self, table):
+        # Ops queued for table and not yet written, oldest first
+        with self.lock:
+            return tuple(self._pending.get(table, ()))
+
+    def latest(self, table, record_id):
+        # (True, row) if a pending op set the record (row is None if it
+        # deleted it), otherwise (False, None)
+        with self.lock:
+            rows = self._latest.get(table)
+            if rows is None or record_id not in rows:
+                return False, None
+            return True, rows[record_id]
+
+    def submitted(self, table):
+        with self.lock:
+            return self._submitted.get(table, 0)
+
+    def flush(self, table=None, timeout=None):
+        # Wait until everything queued (for table, or at all) is written;
+        # returns False on timeout
+        if threading.current_thread() is self._thread:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._changed:
+            while self._pending.get(table) if table is not None else self._count:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._changed.wait(remaining)
+        return True
+
+    def close(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        flushed = self.flush(timeout=timeout)
+        with self._changed:
+            self._closing = True
+            left = [] if flushed else [(table, [op for _, op in batch])
+                                       for table, batch in self._pending.items() if batch]
+            self._changed.notify_all()
+        for table, ops in left:
+            # The writer may yet land some of these before the process exits
+            logger.error('%d queued op(s) to %s not written before close', len(ops), table)
+            self._give_up(table, ops, 'still queued when the queue was closed')
+        self._thread.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return flushed
+
+    def _run(self):
+        while True:
+            with self._changed:
+                while not self._count and not self._closing:
+                    self._changed.wait()
+                if not self._count:
+                    return
+            if self.gather:
+                time.sleep(self.gather)
+            with self.lock:
+                backlog = [(table, list(ops)) for table, ops in self._pending.items() if ops]
+            for table, batch in backlog:
+                self._write(table, batch)
+
+    def _write(self, table, batch):
+        ops = [op for _, op in batch]
+        results = None
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with registry.phase('write_behind'):
+                    results = self.apply_batch(table, ops, attempt > 1)
+                break
+            except Exception as error:
+                if attempt == self.max_attempts:
+                    logger.exception('writing %d queued op(s) to %s failed %d times; giving up',
+                                     len(ops), table, attempt)
+                    registry.count('idms_write_behind_failed_total', len(ops), table=table)
+                    self._give_up(table, ops, error)
+                    break
+                logger.exception('writing %d queued op(s) to %s failed; retrying', len(ops), table)
+                time.sleep(RETRY_DELAY)
+        for op, result in zip(ops, results or ()):
+            if result is False or isinstance(result, Exception):
+                # Another process changed or removed the record after the
+                # request was answered
+                logger.warning('queued %s of %s record %s was not applied: %r',
+                               op[0], table, op[1], result)
+                registry.count('idms_write_behind_dropped_total', table=table)
+        if results is not None:
+            registry.count('idms_write_behind_ops_total', len(ops), table=table)
+        with self._changed:
+            remaining = self._pending[table][len(batch):]
+            self._pending[table] = remaining
+            latest = {}
+            for _, op in remaining:
+                latest[op[1]] = op[2]
+            self._latest[table] = latest
+            self._count -= len(batch)
+            self.batches += 1
+            if results is None:
+                self.failed += len(batch)
+            else:
+                self.ops += len(batch)
+            self._changed.notify_all()
+
+    def _give_up(self, table, ops, error):
+        if self.give_up is None:
+            return
+        try:
+            self.give_up(table, ops, error)
+        except Exception:
+            # The writer thread has to keep going whatever happens here
+            logger.exception('recording %d failed op(s) to %s failed', len(ops), table)